@@ -1,59 +1,227 @@
 import random
+import hashlib
 import os
 import logging
 import time
-from typing import List
-import requests
+import asyncio
+import threading
+from typing import AsyncIterator, List, Optional, Tuple
+from pydantic import ValidationError
+import re
 import json
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from .llm_cache import llm_cache, LLM_CACHE_ENABLED
+from .ollama_client import ollama, OllamaError
+from .ollama_monitor import monitor
+from .schemas import TranscriptAnalysis
+from . import cancellation, metrics
+from .cancellation import JobCancelled
 
 logger = logging.getLogger(__name__)
 
-# Get Ollama URL from environment
-OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
 DEFAULT_MODEL = "vatistasdim/boXai"
+# Context window requested from Ollama. Carefull with vram limit
+OLLAMA_NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', '2048'))
+# Tokens kept free for the instructions and the generated answer
+PROMPT_RESERVE_TOKENS = int(os.getenv('PROMPT_RESERVE_TOKENS', '768'))
+# Concurrent chunk summaries sent to Ollama when a transcript is too long for one prompt
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '2'))
+# "structured" asks for the summary and questions as one JSON generation, "separate" makes two calls
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'structured')
+# Rough characters per token for French/English text
+CHARS_PER_TOKEN = 3.5
 
-def call_ollama(prompt: str, model: str = DEFAULT_MODEL) -> str:
-    """Call the self-hosted Ollama LLM"""
+# Recently condensed transcripts, so the summary and question prompts share the map step
+_condensed_cache = OrderedDict()
+_CONDENSED_CACHE_SIZE = 16
+_condensed_cache_lock = threading.Lock()
+
+def _ollama_options() -> dict:
+    return {
+        "temperature": 0.3,
+        "top_p": 0.9,
+        "num_ctx": OLLAMA_NUM_CTX
+    }
+
+def call_ollama(prompt: str, model: str = DEFAULT_MODEL, use_cache: bool = True, format=None) -> str:
+    """Call the self-hosted Ollama LLM, serving identical requests from the response cache.
+
+    format is passed to Ollama to constrain the output ("json" or a JSON schema).
+    """
+    options = _ollama_options()
+    generate = lambda: _generate(prompt, model, options, format)
+    if not LLM_CACHE_ENABLED:
+        return generate()
+    cache_options = {**options, "format": format} if format else options
+    return llm_cache.get_or_generate(model, prompt, cache_options, generate, bypass=not use_cache)
+
+async def acall_ollama(prompt: str, model: str = DEFAULT_MODEL, use_cache: bool = True) -> str:
+    """Async version of call_ollama for use inside async endpoints"""
+    options = _ollama_options()
+    agenerate = lambda: _agenerate(prompt, model, options)
+    if not LLM_CACHE_ENABLED:
+        return await agenerate()
+    return await llm_cache.aget_or_generate(model, prompt, options, agenerate, bypass=not use_cache)
+
+async def astream_ollama(prompt: str, model: str = DEFAULT_MODEL, use_cache: bool = True) -> AsyncIterator[str]:
+    """Yield response tokens as Ollama produces them; the full text is cached once the stream completes.
+
+    A cached response is replayed as a single token.
+    """
+    options = _ollama_options()
+    if LLM_CACHE_ENABLED and use_cache:
+        cached = await asyncio.to_thread(llm_cache.lookup, model, prompt, options)
+        if cached:
+            yield cached
+            return
+    parts = []
+    start = time.perf_counter()
+    async for chunk in ollama.astream_generate(model, prompt, options):
+        token = chunk.get('response', '')
+        if token:
+            parts.append(token)
+            yield token
+        if chunk.get('done'):
+            metrics.observe_llm(model, time.perf_counter() - start, chunk)
+    if LLM_CACHE_ENABLED:
+        await asyncio.to_thread(llm_cache.store, model, prompt, options, "".join(parts).strip())
+
+def _generate(prompt: str, model: str, options: dict, format=None) -> str:
+    """Run one generation against Ollama"""
     try:
-        response = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "top_p": 0.9,
-                    "num_ctx": 2048 # Carefull with vram limit
-                }
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', '').strip()
-        else:
-            logger.error(f"Ollama API error: {response.status_code}")
-            return ""
-            
+        extra = {"format": format} if format else {}
+        start = time.perf_counter()
+        response = ollama.generate(model, prompt, options, **extra)
+        metrics.observe_llm(model, time.perf_counter() - start, response)
+        return response.get('response', '').strip()
+    except JobCancelled:
+        raise
+    except OllamaError as e:
+        logger.error(f"Ollama API error: {e.status_code}")
+        return ""
     except Exception as e:
         logger.error(f"Error calling Ollama: {e}")
         return ""
 
-def simple_summary(text: str, sentences: int = 2, model: str = DEFAULT_MODEL) -> str:
+async def _agenerate(prompt: str, model: str, options: dict) -> str:
+    try:
+        start = time.perf_counter()
+        response = await ollama.agenerate(model, prompt, options)
+        metrics.observe_llm(model, time.perf_counter() - start, response)
+        return response.get('response', '').strip()
+    except OllamaError as e:
+        logger.error(f"Ollama API error: {e.status_code}")
+        return ""
+    except Exception as e:
+        logger.error(f"Error calling Ollama: {e}")
+        return ""
+
+async def agenerate_in_context(prompt: str, model: str = DEFAULT_MODEL, context: list = None, keep_alive: str = None) -> dict:
+    """Uncached generation continuing from the context of an earlier one; returns Ollama's whole response, {} on failure"""
+    extra = {"context": context} if context else {}
+    if keep_alive:
+        extra["keep_alive"] = keep_alive
+    try:
+        start = time.perf_counter()
+        response = await ollama.agenerate(model, prompt, _ollama_options(), **extra)
+        metrics.observe_llm(model, time.perf_counter() - start, response)
+        return response
+    except OllamaError as e:
+        logger.error(f"Ollama API error: {e.status_code}")
+        return {}
+    except Exception as e:
+        logger.error(f"Error calling Ollama: {e}")
+        return {}
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used to budget prompts against num_ctx"""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def transcript_token_budget() -> int:
+    """Tokens of transcript that fit in one prompt next to the instructions and answer"""
+    return max(256, OLLAMA_NUM_CTX - PROMPT_RESERVE_TOKENS)
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Split text on sentence boundaries into chunks of at most max_tokens"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    chunks, current = [], ""
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        # Sentences longer than a whole chunk are cut on word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+def summarize_chunk(chunk: str, index: int, total: int, model: str = DEFAULT_MODEL) -> str:
+    """Map step: summarize one part of a long transcript"""
+    prompt = f"""Voici la partie {index} sur {total} d'une transcription. Résumez-la en quelques phrases en conservant les idées principales, les définitions et les exemples importants. Le résumé doit être en français et ne doit pas inclure d'autres instructions ou commentaires.
+
+    Texte: {chunk}
+
+    Résumé:"""
+    return call_ollama(prompt, model)
+
+def condense_transcript(text: str, model: str = DEFAULT_MODEL) -> str:
+    """Return text that fits in one prompt: the transcript itself, or its chunk summaries reduced until they fit.
+
+    Chunks are summarized concurrently. Results are memoized so the summary and
+    question prompts of the same transcript share the map step.
+    """
+    budget = transcript_token_budget()
+    if estimate_tokens(text) <= budget:
+        return text
+    key = (hashlib.sha256(text.encode()).hexdigest(), model)
+    with _condensed_cache_lock:
+        if key in _condensed_cache:
+            _condensed_cache.move_to_end(key)
+            return _condensed_cache[key]
+
+    level = 0
+    while estimate_tokens(text) > budget:
+        chunks = split_into_chunks(text, budget)
+        level += 1
+        logger.info(f"Condensing transcript level {level}: {len(chunks)} chunks of up to {budget} tokens")
+        with ThreadPoolExecutor(max_workers=max(1, SUMMARY_CONCURRENCY)) as pool:
+            # Chunk summaries run under the job's cancellation token so a cancel aborts them too
+            summarize = cancellation.bind(lambda args: summarize_chunk(args[1], args[0] + 1, len(chunks), model))
+            partials = list(pool.map(summarize, enumerate(chunks)))
+        partials = [p for p in partials if p]
+        condensed = "\n\n".join(partials)
+        # Stop when the LLM is unavailable or no longer shrinks the text
+        if not partials or len(condensed) >= len(text):
+            logger.warning("Transcript could not be condensed further, truncating to the context budget")
+            return text[:int(budget * CHARS_PER_TOKEN)]
+        text = condensed
+
+    with _condensed_cache_lock:
+        _condensed_cache[key] = text
+        if len(_condensed_cache) > _CONDENSED_CACHE_SIZE:
+            _condensed_cache.popitem(last=False)
+    return text
+
+@metrics.span("summary")
+def simple_summary(text: str, sentences: int = 2, model: str = DEFAULT_MODEL, use_cache: bool = True) -> str:
     """Generate a summary using self-hosted LLM"""
     if not text or text.startswith('['):
         return "No summary available"
     
-    # Try LLM first
-    prompt = f"""Veuillez fournir un résumé personnalisé du texte suivant en quelques phrases. Le résumé doit capturer les points clés et les idées principales du texte. Limitez le résumé à {sentences} phrases maximum. Le résumé doit être en français et ne doit pas inclure d'autres instructions ou commentaires.
-
-    Texte: {text}
-
-    Résumé:"""
+    # Long transcripts are summarized per chunk first, then reduced here
+    text = condense_transcript(text, model)
     
-    llm_summary = call_ollama(prompt, model)
+    # Try LLM first
+    llm_summary = call_ollama(summary_prompt(text, sentences), model, use_cache=use_cache)
     
     if llm_summary:
         return llm_summary
@@ -61,11 +229,21 @@ def simple_summary(text: str, sentences: int = 2, model: str = DEFAULT_MODEL) ->
     # Fallback
     return "No summary available"
 
-def generate_questions(text: str, num: int = 3, model: str = DEFAULT_MODEL, existing_questions: List[str] = None) -> List[str]:
+def summary_prompt(text: str, sentences: int = 2) -> str:
+    return f"""Veuillez fournir un résumé personnalisé du texte suivant en quelques phrases. Le résumé doit capturer les points clés et les idées principales du texte. Limitez le résumé à {sentences} phrases maximum. Le résumé doit être en français et ne doit pas inclure d'autres instructions ou commentaires.
+
+    Texte: {text}
+
+    Résumé:"""
+
+@metrics.span("questions")
+def generate_questions(text: str, num: int = 3, model: str = DEFAULT_MODEL, existing_questions: List[str] = None, use_cache: bool = True) -> List[str]:
     """Generate questions using self-hosted LLM"""
     if not text or text.startswith('['):
         return []
     existing_questions = existing_questions or []
+    # Long transcripts are represented by their chunk summaries
+    text = condense_transcript(text, model)
     existing_block = ""
     if existing_questions:
         existing_block = (
@@ -83,7 +261,7 @@ def generate_questions(text: str, num: int = 3, model: str = DEFAULT_MODEL, exis
 
     Questions:"""
     
-    llm_response = call_ollama(prompt, model)
+    llm_response = call_ollama(prompt, model, use_cache=use_cache)
     
     if llm_response:
         # Parse questions from LLM response
@@ -107,122 +285,86 @@ def generate_questions(text: str, num: int = 3, model: str = DEFAULT_MODEL, exis
     # Fallback to simple method
     return ["No questions generated"]
 
-def check_ollama_status() -> bool:
-    """Check if Ollama service is available"""
+@metrics.span("structured_analysis")
+def structured_analysis(text: str, num: int = 3, sentences: int = 2, model: str = DEFAULT_MODEL) -> Optional[TranscriptAnalysis]:
+    """Summary and questions from one JSON-constrained generation, or None if the output doesn't validate"""
+    prompt = f"""Analysez le texte suivant et répondez uniquement avec un objet JSON contenant deux champs :
+    - "summary" : un résumé en français de {sentences} phrases maximum qui capture les points clés et les idées principales ;
+    - "questions" : une liste d'exactement {num} questions réfléchies et variées, en français, qui aideraient quelqu'un à comprendre les concepts clés. Chaque question se termine par un point d'interrogation.
+
+    Texte: {text}"""
+
+    response = call_ollama(prompt, model, format=TranscriptAnalysis.model_json_schema())
+    if not response:
+        return None
     try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
-        return response.status_code == 200
-    except:
-        return False
+        analysis = TranscriptAnalysis.model_validate_json(response)
+    except ValidationError as e:
+        logger.warning(f"Structured analysis did not match the schema: {e}")
+        return None
+
+    questions = [q.strip() for q in analysis.questions if q.strip().endswith('?')][:num]
+    if not analysis.summary.strip() or not questions:
+        return None
+    return TranscriptAnalysis(summary=analysis.summary.strip(), questions=questions)
+
+def analyze_transcript(text: str, num: int = 3, sentences: int = 2, model: str = DEFAULT_MODEL) -> Tuple[str, List[str]]:
+    """Summary and questions for a transcript.
+
+    In structured mode both come from a single generation; otherwise, or when that
+    output is unusable, the separate summary and question calls are used.
+    """
+    if not text or text.startswith('['):
+        return "No summary available", []
+    text = condense_transcript(text, model)
+
+    if ANALYSIS_MODE == "structured":
+        analysis = structured_analysis(text, num, sentences, model)
+        if analysis:
+            return analysis.summary, analysis.questions
+        logger.warning("Falling back to separate summary and question generation")
+
+    return simple_summary(text, sentences, model), generate_questions(text, num, model)
+
+def check_ollama_status() -> bool:
+    """Check if Ollama service is available, from the background monitor's cached state"""
+    return monitor.is_reachable()
 
 def ensure_model_available(model: str = DEFAULT_MODEL) -> bool:
-    """Ensure the specified model is pulled and available"""
-    max_retries = 3
-    retry_delay = 5
-    
-    for attempt in range(max_retries):
-        try:
-            # Check if model exists
-            logger.info(f"Checking if model {model} is available (attempt {attempt + 1}/{max_retries})")
-            response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=10)
-            
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_names = [m.get('name', '') for m in models]
-                
-                # Check for exact match or partial match
-                for model_name in model_names:
-                    if model in model_name or model_name.startswith(model):
-                        logger.info(f"Model {model} is available as {model_name}")
-                        return True
-            
-            # If model not found and this is the first attempt, try to pull it
-            if attempt == 0:
-                logger.info(f"Model {model} not found, attempting to pull...")
-                try:
-                    pull_response = requests.post(
-                        f"{OLLAMA_URL}/api/pull",
-                        json={"name": model, "stream": False},
-                        timeout=600  # 10 minutes for model download
-                    )
-                    
-                    if pull_response.status_code == 200:
-                        logger.info(f"Model {model} pull completed successfully")
-                        # Wait a bit for the model to be fully loaded
-                        time.sleep(3)
-                        continue  # Retry checking if model is available
-                    else:
-                        logger.error(f"Failed to pull model {model}: {pull_response.status_code}")
-                except requests.exceptions.Timeout:
-                    logger.warning(f"Model pull timed out, will retry checking availability")
-                except Exception as e:
-                    logger.error(f"Error pulling model {model}: {e}")
-            
-            # Wait before retrying
-            if attempt < max_retries - 1:
-                logger.info(f"Waiting {retry_delay} seconds before retry...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-                
-        except Exception as e:
-            logger.error(f"Error checking model availability: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                retry_delay *= 2
-    
-    logger.error(f"Model {model} is not available after {max_retries} attempts")
+    """Ensure the specified model is pulled and available. Concurrent pulls of one model are shared."""
+    if monitor.ensure_pulled(model):
+        logger.info(f"Model {model} is available")
+        return True
+    logger.error(f"Model {model} is not available")
     return False
 
-def answer_question(text: str, question: str, model: str = DEFAULT_MODEL) -> str:
+def answer_question(text: str, question: str, model: str = DEFAULT_MODEL, use_cache: bool = True) -> str:
     """Answer a question based on the provided text using the self-hosted LLM"""
     if not text or text.startswith('[') or not question:
         return "Aucune réponse disponible."
-    prompt = f"""Vous êtes un assistant IA. Utilisez le texte ci-dessous pour répondre à la question de l'utilisateur. Si la réponse n'est pas dans le texte, dites-le explicitement. Répondez en français.
+    answer = call_ollama(answer_prompt(text, question), model, use_cache=use_cache)
+    return answer if answer else "Aucune réponse disponible."
+
+def answer_prompt(text: str, question: str) -> str:
+    return f"""Vous êtes un assistant IA. Utilisez le texte ci-dessous pour répondre à la question de l'utilisateur. Si la réponse n'est pas dans le texte, dites-le explicitement. Répondez en français.
 
     Texte: {text}
 
     Question: {question}
 
     Réponse:"""
-    
-    answer = call_ollama(prompt, model)
+
+async def aanswer_question(text: str, question: str, model: str = DEFAULT_MODEL, use_cache: bool = True) -> str:
+    """Async version of answer_question that doesn't hold a threadpool worker during generation"""
+    if not text or text.startswith('[') or not question:
+        return "Aucune réponse disponible."
+    answer = await acall_ollama(answer_prompt(text, question), model, use_cache=use_cache)
     return answer if answer else "Aucune réponse disponible."
 
 def wait_for_model_ready(model: str = DEFAULT_MODEL, max_wait_time: int = 60) -> bool:
-    """Wait for model to be ready for inference"""
-    logger.info(f"Waiting for model {model} to be ready for inference...")
-    start_time = time.time()
-    
-    while time.time() - start_time < max_wait_time:
-        try:
-            # Test the model with a simple prompt
-            test_response = requests.post(
-                f"{OLLAMA_URL}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": "Hello",
-                    "stream": False
-                },
-                timeout=10
-            )
-            
-            if test_response.status_code == 200:
-                result = test_response.json()
-                if result.get('response'):
-                    logger.info(f"Model {model} is ready for inference")
-                    return True
-            elif test_response.status_code == 404:
-                logger.warning(f"Model {model} not found, waiting...")
-            else:
-                logger.warning(f"Model test failed with status {test_response.status_code}")
-                
-        except Exception as e:
-            logger.warning(f"Model readiness test failed: {e}. This is expected if the model is still loading or downloading.")
-        
-        finally:
-            # Wait before the next check
-            logger.info(f"Waiting 2 seconds before checking model {model} readiness again...")
-            time.sleep(2)
-    
+    """Wait for model to be loaded for inference; returns at once when Ollama already has it warm"""
+    if monitor.ensure_loaded(model, timeout=max_wait_time):
+        logger.info(f"Model {model} is ready for inference")
+        return True
     logger.error(f"Model {model} was not ready after {max_wait_time} seconds. Aborting")
     return False
@@ -0,0 +1,32 @@
+import os
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# zstd level for transcripts and segments; higher compresses smaller and writes slower, reads are unaffected
+ZSTD_LEVEL = int(os.getenv('BLOB_ZSTD_LEVEL', '9'))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    logger.info("zstandard not installed, transcripts are compressed with zlib")
+
+
+def pack(text: str) -> tuple:
+    """(codec, compressed bytes) of a string; zstd when available, else zlib"""
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def unpack(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Transcript is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown blob codec {codec!r}")
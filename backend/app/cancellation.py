@@ -0,0 +1,133 @@
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint once the file being processed was cancelled or deleted"""
+
+
+class CancellationToken:
+    """Cooperative cancellation flag for one file's processing.
+
+    Work checks it at checkpoints; blocking calls (like an open Ollama stream)
+    register callbacks that abort them as soon as cancel() is called.
+    """
+
+    def __init__(self, audio_id: int):
+        self.audio_id = audio_id
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancellation callback for audio_id {self.audio_id} failed: {e}")
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run callback when the token is cancelled (now, if it already is); returns an unregister function"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class CancellationRegistry:
+    """Tokens of the files currently being processed, by audio id"""
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def token(self, audio_id: int) -> CancellationToken:
+        with self._lock:
+            if audio_id not in self._tokens:
+                self._tokens[audio_id] = CancellationToken(audio_id)
+            return self._tokens[audio_id]
+
+    def cancel(self, audio_id: int, reason: str = "Cancelled") -> bool:
+        """Cancel a file's processing; returns whether work for it was in flight"""
+        with self._lock:
+            token = self._tokens.get(audio_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        logger.info(f"Cancelled processing of audio_id {audio_id}: {reason}")
+        return True
+
+    def is_cancelled(self, audio_id: int) -> bool:
+        with self._lock:
+            token = self._tokens.get(audio_id)
+        return token is not None and token.cancelled
+
+    def release(self, audio_id: int):
+        with self._lock:
+            self._tokens.pop(audio_id, None)
+
+
+_current = contextvars.ContextVar("cancellation_token", default=None)
+
+
+def current() -> Optional[CancellationToken]:
+    """Token of the job running in this context, if any"""
+    return _current.get()
+
+
+@contextmanager
+def scope(token: Optional[CancellationToken]):
+    """Make token the current one, so deep calls (e.g. Ollama requests) can honour it"""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def checkpoint():
+    """Stop here if the current job was cancelled"""
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap fn so it runs in the caller's context (its token, and its job's timing spans), e.g. when handed to a thread pool"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+# Process-wide registry shared by the job workers and the API
+cancellations = CancellationRegistry()
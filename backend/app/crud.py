@@ -1,23 +1,22 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-
-def generate_unique_filename(db: Session, filename: str) -> str:
-    """Generate a unique filename by appending a number if the filename already exists"""
-    base_filename = filename
-    counter = 1
-    
-    while db.query(models.AudioFile).filter(models.AudioFile.filename == filename).first():
-        name, ext = base_filename.rsplit('.', 1) if '.' in base_filename else (base_filename, '')
-        filename = f"{name}_{counter}.{ext}" if ext else f"{name}_{counter}"
-        counter += 1
-    
-    return filename
+import os
+import json
+import uuid
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session, defer
+from datetime import datetime
+from . import models, schemas, search_index
+from .progress import progress_bus
+from .cancellation import cancellations
+
+def new_storage_key(filename: str) -> str:
+    """Random name for the upload on disk, keeping the extension so ffmpeg can sniff the format"""
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{uuid.uuid4().hex}{ext if ext[1:].isalnum() else ''}"
 
 def create_audio_file(db: Session, filename: str, file_size: int = None, selected_model: str = None) -> models.AudioFile:
-    unique_filename = generate_unique_filename(db, filename)
-    
     db_obj = models.AudioFile(
-        filename=unique_filename,
+        filename=filename,
+        storage_key=new_storage_key(filename),
         file_size=file_size,
         selected_model=selected_model,
         processing_stage="uploading",
@@ -28,14 +27,64 @@ def create_audio_file(db: Session, filename: str, file_size: int = None, selecte
     db.refresh(db_obj)
     return db_obj
 
-def list_audio_files(db: Session):
-    return db.query(models.AudioFile).all()
+def create_audio_files(db: Session, uploads: list, selected_model: str = None) -> list:
+    """Create the rows of several saved uploads in one transaction.
+
+    Each upload is a dict with filename, storage_key, file_size and content_hash.
+    """
+    objs = [
+        models.AudioFile(
+            selected_model=selected_model,
+            processing_stage="uploading",
+            progress_percentage=0,
+            **upload
+        )
+        for upload in uploads
+    ]
+    db.add_all(objs)
+    db.commit()
+    for obj in objs:
+        db.refresh(obj)
+    return objs
+
+# Analysis columns, left out of file listings; transcripts are in transcript_blobs and never loaded there
+LARGE_COLUMNS = ("summary", "questions")
+
+def list_audio_files(db: Session, limit: int = None, after: tuple = None, stages: list = None,
+                     uploaded_after: datetime = None, uploaded_before: datetime = None, exclude_stages: list = None):
+    """List files newest first without loading their transcripts or analysis text.
+
+    after is the (uploaded_at, id) of the last row of the previous page.
+    """
+    table = models.AudioFile
+    query = db.query(table).options(*(defer(getattr(table, column)) for column in LARGE_COLUMNS))
+    if stages:
+        query = query.filter(table.processing_stage.in_(stages))
+    if exclude_stages:
+        query = query.filter(table.processing_stage.not_in(exclude_stages))
+    if uploaded_after:
+        query = query.filter(table.uploaded_at >= uploaded_after)
+    if uploaded_before:
+        query = query.filter(table.uploaded_at < uploaded_before)
+    if after:
+        uploaded_at, last_id = after
+        query = query.filter(or_(table.uploaded_at < uploaded_at, and_(table.uploaded_at == uploaded_at, table.id < last_id)))
+    query = query.order_by(table.uploaded_at.desc(), table.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
   
 def get_audio_file(db: Session, audio_id: int):
     return db.query(models.AudioFile).filter(models.AudioFile.id == audio_id).first()
 
 def update_progress(db: Session, audio_id: int, stage: str, progress: int):
-    """Update processing stage and progress percentage"""
+    """Publish processing stage and progress; the row is only written when the stage changes"""
+    if cancellations.is_cancelled(audio_id):
+        return None
+    previous = progress_bus.latest(audio_id)
+    progress_bus.publish(audio_id, stage, progress)
+    if previous and previous["processing_stage"] == stage:
+        return None
     obj = get_audio_file(db, audio_id)
     if obj:
         obj.processing_stage = stage
@@ -53,6 +102,34 @@ def update_audio_duration(db: Session, audio_id: int, duration: float):
         db.refresh(obj)
     return obj
 
+def update_transcription(db: Session, audio_id: int, transcription: str, segments: str = None, language: str = None,
+                         vad_skipped_ratio: float = None):
+    """Store the transcript once Whisper is done, before the LLM stage runs"""
+    obj = get_audio_file(db, audio_id)
+    if obj:
+        obj.transcription = transcription
+        obj.word_count = len(transcription.split())
+        obj.segments = segments
+        obj.language = language
+        obj.vad_skipped_ratio = vad_skipped_ratio
+        db.commit()
+        db.refresh(obj)
+    return obj
+
+def add_stage_timings(db: Session, audio_id: int, timings: dict):
+    """Merge seconds spent per stage into the file's timings; stages that run again (retries) add up"""
+    if not timings:
+        return None
+    obj = get_audio_file(db, audio_id)
+    if obj:
+        merged = json.loads(obj.stage_timings) if obj.stage_timings else {}
+        for stage, seconds in timings.items():
+            merged[stage] = round(merged.get(stage, 0) + seconds, 3)
+        obj.stage_timings = json.dumps(merged)
+        db.commit()
+        db.refresh(obj)
+    return obj
+
 def update_analysis(db: Session, audio_id: int, *, transcription: str, summary: str, questions: str):
     obj = get_audio_file(db, audio_id)
     if obj:
@@ -62,6 +139,30 @@ def update_analysis(db: Session, audio_id: int, *, transcription: str, summary:
         obj.questions = questions
         obj.processing_stage = "complete"
         obj.progress_percentage = 100
+        search_index.index_document(db, audio_id, transcription, summary, questions)
+        db.commit()
+        db.refresh(obj)
+        progress_bus.publish(audio_id, "complete", 100)
+    return obj
+
+def _reindex(db: Session, obj: models.AudioFile):
+    if obj.processing_stage == "complete":
+        search_index.index_document(db, obj.id, obj.transcription, obj.summary, obj.questions)
+
+def update_summary(db: Session, audio_id: int, summary: str):
+    obj = get_audio_file(db, audio_id)
+    if obj:
+        obj.summary = summary
+        _reindex(db, obj)
+        db.commit()
+        db.refresh(obj)
+    return obj
+
+def update_questions(db: Session, audio_id: int, questions: str):
+    obj = get_audio_file(db, audio_id)
+    if obj:
+        obj.questions = questions
+        _reindex(db, obj)
         db.commit()
         db.refresh(obj)
     return obj
@@ -76,21 +177,143 @@ def update_error_state(db: Session, audio_id: int, error_message: str):
         obj.questions = "Unable to generate questions due to error"
         db.commit()
         db.refresh(obj)
+        progress_bus.publish(audio_id, "error", obj.progress_percentage or 0)
     return obj
 
 def stop_ollama_process(audio_id: int):
-    """Placeholder function to stop Ollama process for a specific file"""
-    # TODO: Logic to stop Ollama process
-    pass
+    """Abort the file's Ollama generations: its open streams are closed and the model slot is freed"""
+    cancellations.cancel(audio_id, "Processing stopped")
 
 def stop_whisper_process(audio_id: int):
-    """Placeholder function to stop Whisper process for a specific file"""
-    # TODO: Logic to stop Whisper process
-    pass
+    """Stop the file's transcription at its next checkpoint; queued parallel segments are dropped"""
+    cancellations.cancel(audio_id, "Processing stopped")
+
+def cancel_processing(db: Session, audio_id: int, reason: str = "Cancelled by user"):
+    """Mark a file and its unfinished jobs cancelled so workers skip or abandon them"""
+    db.query(models.Job).filter(
+        models.Job.audio_id == audio_id, models.Job.status.in_(("queued", "running"))
+    ).update({"status": "cancelled", "error": reason, "finished_at": datetime.utcnow()}, synchronize_session=False)
+    obj = get_audio_file(db, audio_id)
+    if obj:
+        obj.processing_stage = "cancelled"
+    db.commit()
+    stop_whisper_process(audio_id)
+    stop_ollama_process(audio_id)
+    progress_bus.publish(audio_id, "cancelled", obj.progress_percentage if obj else 0)
+    return obj
 
 def delete_audio_file(db: Session, audio_id: int):
     """Delete audio file record from the database"""
     obj = get_audio_file(db, audio_id)
     if obj:
+        db.query(models.Job).filter(models.Job.audio_id == audio_id).delete()
+        db.query(models.TranscriptChunk).filter(models.TranscriptChunk.audio_id == audio_id).delete()
+        search_index.remove_document(db, audio_id)
         db.delete(obj)
         db.commit()
+        progress_bus.publish(audio_id, "deleted", 0)
+        progress_bus.forget(audio_id)
+
+def create_job(db: Session, audio_id: int, file_path: str, estimated_cost: float = 0, selected_model: str = None,
+               num_questions: int = 3, auto_generate_questions: bool = True, stage: str = "transcription") -> models.Job:
+    job = models.Job(
+        audio_id=audio_id,
+        stage=stage,
+        status="queued",
+        estimated_cost=estimated_cost,
+        file_path=file_path,
+        selected_model=selected_model,
+        num_questions=num_questions,
+        auto_generate_questions=auto_generate_questions
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: int):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def list_unfinished_jobs(db: Session):
+    """Jobs that were queued or running when the process last stopped"""
+    return db.query(models.Job).filter(models.Job.status.in_(("queued", "running"))).all()
+
+def update_job(db: Session, job_id: int, **fields):
+    """Update job fields, stamping start and finish times on status changes"""
+    job = get_job(db, job_id)
+    if job:
+        status = fields.get("status")
+        if status == "running":
+            job.started_at = datetime.utcnow()
+            job.attempts = (job.attempts or 0) + 1
+        elif status in ("done", "failed", "cancelled"):
+            job.finished_at = datetime.utcnow()
+        for key, value in fields.items():
+            setattr(job, key, value)
+        db.commit()
+        db.refresh(job)
+    return job
+
+def get_cached_transcription(db: Session, audio_hash: str, whisper_model: str, llm_model: str = None):
+    """Find a cached result for identical audio, preferring one analyzed with the same LLM"""
+    query = db.query(models.TranscriptionCache).filter(
+        models.TranscriptionCache.audio_hash == audio_hash,
+        models.TranscriptionCache.whisper_model == whisper_model
+    )
+    exact = query.filter(models.TranscriptionCache.llm_model == llm_model).first()
+    return exact or query.first()
+
+def save_cached_transcription(db: Session, audio: models.AudioFile, whisper_model: str, llm_model: str, include_analysis: bool = True):
+    """Store the results of a completed file so identical uploads can reuse them"""
+    entry = db.query(models.TranscriptionCache).filter(
+        models.TranscriptionCache.audio_hash == audio.content_hash,
+        models.TranscriptionCache.whisper_model == whisper_model,
+        models.TranscriptionCache.llm_model == llm_model
+    ).first()
+    if not entry:
+        entry = models.TranscriptionCache(audio_hash=audio.content_hash, whisper_model=whisper_model, llm_model=llm_model)
+        db.add(entry)
+    entry.transcription = audio.transcription
+    entry.segments = audio.segments
+    entry.language = audio.language
+    entry.summary = audio.summary if include_analysis else None
+    entry.questions = audio.questions if include_analysis else None
+    db.commit()
+    return entry
+
+def get_processed_duplicate(db: Session, content_hash: str, exclude_id: int):
+    """An earlier file with the same audio whose probed duration can be reused"""
+    return db.query(models.AudioFile).filter(
+        models.AudioFile.content_hash == content_hash,
+        models.AudioFile.id != exclude_id,
+        models.AudioFile.audio_duration.isnot(None)
+    ).order_by(models.AudioFile.id).first()
+
+def record_cache_hit(db: Session, entry: models.TranscriptionCache):
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_hit_at = datetime.utcnow()
+    db.commit()
+
+def transcription_cache_totals(db: Session) -> dict:
+    entries = db.query(func.count(models.TranscriptionCache.id), func.sum(models.TranscriptionCache.hit_count)).one()
+    return {"entries": entries[0] or 0, "total_hits": entries[1] or 0}
+
+def purge_transcription_cache(db: Session, audio_hash: str = None) -> int:
+    """Delete cached results, for one audio hash or all of them"""
+    query = db.query(models.TranscriptionCache)
+    if audio_hash:
+        query = query.filter(models.TranscriptionCache.audio_hash == audio_hash)
+    deleted = query.delete()
+    db.commit()
+    return deleted
+
+def replace_transcript_chunks(db: Session, audio_id: int, chunks: list):
+    """Swap the retrieval passages of a file in one transaction"""
+    db.query(models.TranscriptChunk).filter(models.TranscriptChunk.audio_id == audio_id).delete()
+    db.add_all(chunks)
+    db.commit()
+
+def get_transcript_chunks(db: Session, audio_id: int):
+    return db.query(models.TranscriptChunk).filter(
+        models.TranscriptChunk.audio_id == audio_id
+    ).order_by(models.TranscriptChunk.position).all()
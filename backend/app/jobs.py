@@ -0,0 +1,308 @@
+import os
+import itertools
+import logging
+import queue
+import threading
+import time
+import traceback
+from sqlalchemy.orm import Session
+from . import crud, models
+from .database import SessionLocal
+from . import cancellation, pcm, metrics
+from .cancellation import cancellations, JobCancelled
+from .transcription import (extract_audio_duration, run_transcription_stage, run_batch_transcription_stage, run_analysis_stage,
+                            WHISPER_BATCH_SIZE, BATCH_MAX_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Number of concurrent Whisper and Ollama jobs
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '1'))
+LLM_WORKERS = int(os.getenv('LLM_WORKERS', '1'))
+
+_STOP = float("inf")
+
+
+class JobScheduler:
+    """In-process scheduler running persisted jobs shortest-first on bounded worker pools"""
+
+    def __init__(self, session_factory=SessionLocal, transcription_workers: int = TRANSCRIPTION_WORKERS, llm_workers: int = LLM_WORKERS):
+        self._session_factory = session_factory
+        self._workers = {"transcription": transcription_workers, "analysis": llm_workers}
+        self._queues = {stage: queue.PriorityQueue() for stage in self._workers}
+        self._counter = itertools.count()
+        self._threads = []
+        self._running = {stage: 0 for stage in self._workers}
+        # When each queued job was put in its queue, to measure how long it waited
+        self._enqueued_at = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Resume unfinished jobs and start the worker threads"""
+        if self._threads:
+            return
+        self.resume_pending()
+        for stage, count in self._workers.items():
+            for i in range(count):
+                thread = threading.Thread(target=self._work, args=(stage,), name=f"{stage}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Job scheduler started with {self._workers['transcription']} transcription and {self._workers['analysis']} LLM workers")
+
+    def stop(self):
+        for stage, q in self._queues.items():
+            for _ in range(self._workers[stage]):
+                q.put((_STOP, next(self._counter), None))
+        self._threads = []
+
+    def submit(self, db: Session, audio: models.AudioFile, path: str, selected_model: str = None,
+               num_questions: int = 3, auto_generate_questions: bool = True) -> models.Job:
+        """Persist a job for an uploaded file and queue it by its audio duration"""
+        with metrics.record_timings() as timings:
+            duration = extract_audio_duration(path)
+        if duration > 0:
+            crud.update_audio_duration(db, audio.id, duration)
+        crud.add_stage_timings(db, audio.id, timings.as_dict())
+        crud.update_progress(db, audio.id, "queued", 0)
+        job = crud.create_job(
+            db,
+            audio.id,
+            path,
+            estimated_cost=duration,
+            selected_model=selected_model,
+            num_questions=num_questions,
+            auto_generate_questions=auto_generate_questions
+        )
+        self._enqueue(job)
+        return job
+
+    def submit_analysis(self, db: Session, audio: models.AudioFile, selected_model: str = None,
+                        num_questions: int = 3, auto_generate_questions: bool = True) -> models.Job:
+        """Queue only the LLM stage for a file whose transcript is already known"""
+        crud.update_progress(db, audio.id, "queued", 75)
+        job = crud.create_job(
+            db,
+            audio.id,
+            None,
+            estimated_cost=audio.word_count or 0,
+            selected_model=selected_model,
+            num_questions=num_questions,
+            auto_generate_questions=auto_generate_questions,
+            stage="analysis"
+        )
+        self._enqueue(job)
+        return job
+
+    def resume_pending(self):
+        """Requeue jobs left queued or running by a previous process"""
+        db = self._session_factory()
+        try:
+            for job in crud.list_unfinished_jobs(db):
+                if job.stage == "transcription" and not (job.file_path and os.path.exists(job.file_path)):
+                    logger.warning(f"Cannot resume job {job.id}: audio file {job.file_path} is gone")
+                    crud.update_job(db, job.id, status="failed", error="Audio file missing on restart")
+                    crud.update_error_state(db, job.audio_id, "Audio file missing on restart")
+                    continue
+                if job.status == "running":
+                    crud.update_job(db, job.id, status="queued")
+                logger.info(f"Resuming {job.stage} job {job.id} for audio_id {job.audio_id}")
+                self._enqueue(job)
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                stage: {"workers": self._workers[stage], "queued": self._queues[stage].qsize(), "running": self._running[stage]}
+                for stage in self._workers
+            }
+
+    def _enqueue(self, job: models.Job):
+        self._enqueued_at[job.id] = time.monotonic()
+        self._queues[job.stage].put((job.estimated_cost or 0, next(self._counter), job.id))
+
+    def _work(self, stage: str):
+        q = self._queues[stage]
+        while True:
+            cost, _, job_id = q.get()
+            if cost == _STOP:
+                return
+            batch = [job_id] + (self._take_short_jobs(q, cost) if stage == "transcription" else [])
+            with self._lock:
+                self._running[stage] += len(batch)
+            try:
+                if len(batch) > 1:
+                    self._run_batch(batch)
+                else:
+                    self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {batch} crashed: {e}")
+                logger.error(f"Full traceback: {traceback.format_exc()}")
+            finally:
+                with self._lock:
+                    self._running[stage] -= len(batch)
+
+    def _take_short_jobs(self, q: queue.PriorityQueue, cost: float) -> list:
+        """More queued short files to transcribe along with one of cost seconds.
+
+        The queue is shortest-first, so the files that fit in one Whisper window are at its head.
+        """
+        if WHISPER_BATCH_SIZE <= 1 or not 0 < cost <= BATCH_MAX_SECONDS:
+            return []
+        job_ids = []
+        while len(job_ids) < WHISPER_BATCH_SIZE - 1:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+            if not 0 < item[0] <= BATCH_MAX_SECONDS:
+                q.put(item)
+                break
+            job_ids.append(item[2])
+        return job_ids
+
+    def _run(self, job_id: int):
+        db = self._session_factory()
+        audio_id = stage = None
+        enqueued_at = self._enqueued_at.pop(job_id, None)
+        timings = metrics.StageTimings()
+        try:
+            audio_id = self._register(db, job_id)
+            job = self._start(db, job_id)
+            if not job:
+                return
+            stage = job.stage
+
+            with metrics.record_timings() as timings:
+                if enqueued_at is not None:
+                    metrics.observe_queue_wait(stage, time.monotonic() - enqueued_at)
+                # Deleting or cancelling the file cancels this token; the stages stop at their next checkpoint
+                with cancellation.scope(cancellations.token(audio_id)):
+                    outcome = self._run_stage(db, job)
+            metrics.JOBS.labels(stage, outcome).inc()
+        except JobCancelled as e:
+            logger.info(f"Job {job_id} for audio_id {audio_id} cancelled: {e}")
+            db.rollback()
+            crud.update_job(db, job_id, status="cancelled", error=str(e))
+            metrics.JOBS.labels(stage, "cancelled").inc()
+        except Exception as e:
+            logger.error(f"Job {job_id} for audio_id {audio_id} crashed: {e}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            db.rollback()
+            self._fail(db, job_id, audio_id, e)
+            metrics.JOBS.labels(stage, "failed").inc()
+        finally:
+            if audio_id is not None:
+                cancellations.release(audio_id)
+            if stage is not None:
+                crud.add_stage_timings(db, audio_id, timings.as_dict())
+            db.close()
+
+    def _fail(self, db: Session, job_id: int, audio_id: int, error: Exception):
+        """Mark a crashed job failed and its file in error, so neither stays running until a restart"""
+        crud.update_job(db, job_id, status="failed", error=str(error))
+        if audio_id is not None:
+            crud.update_error_state(db, audio_id, str(error))
+
+    def _register(self, db: Session, job_id: int):
+        """Register the cancellation token of a job's file before the job is marked running.
+
+        A /cancel from then on either finds the job still queued in the database or reaches the token.
+        """
+        job = crud.get_job(db, job_id)
+        if not job:
+            return None
+        cancellations.token(job.audio_id)
+        return job.audio_id
+
+    def _start(self, db: Session, job_id: int):
+        """Load a queued job and mark it running; None when it was cancelled, finished or its file deleted"""
+        job = crud.get_job(db, job_id)
+        if not job or job.status not in ("queued", "running"):
+            if job and job.status == "cancelled":
+                self._discard_upload(job)
+            return None
+        if not crud.get_audio_file(db, job.audio_id):
+            crud.update_job(db, job.id, status="failed", error="Audio file record deleted")
+            return None
+        return crud.update_job(db, job.id, status="running")
+
+    def _run_batch(self, job_ids: list):
+        """Transcribe several short files in one pass over the resident Whisper model"""
+        db = self._session_factory()
+        jobs, waits, registered = [], {}, []
+        try:
+            for job_id in job_ids:
+                enqueued_at = self._enqueued_at.pop(job_id, None)
+                # The token also lets /cancel and deletes reach files waiting in the batch
+                registered.append(self._register(db, job_id))
+                job = self._start(db, job_id)
+                if job:
+                    jobs.append(job)
+                    if enqueued_at is not None:
+                        waits[job.audio_id] = time.monotonic() - enqueued_at
+                        metrics.observe_queue_wait("transcription", waits[job.audio_id])
+            logger.info(f"Transcribing jobs {[job.id for job in jobs]} as one batch")
+
+            with metrics.record_timings() as timings:
+                outcomes = run_batch_transcription_stage(db, [(job.audio_id, job.file_path) for job in jobs])
+            for job in jobs:
+                outcome = outcomes.get(job.audio_id, "failed")
+                if outcome == "done":
+                    self._hand_over_to_analysis(db, job)
+                elif outcome == "cancelled":
+                    crud.update_job(db, job.id, status="cancelled", error="Processing stopped")
+                else:
+                    crud.update_job(db, job.id, status="failed", error="Transcription failed")
+                metrics.JOBS.labels("transcription", outcome).inc()
+                # Each file in the batch spent the batch's stage times
+                crud.add_stage_timings(db, job.audio_id, {
+                    **timings.as_dict(),
+                    **({"queue_wait_transcription": round(waits[job.audio_id], 3)} if job.audio_id in waits else {}),
+                })
+        except Exception as e:
+            logger.error(f"Batch {job_ids} crashed: {e}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            db.rollback()
+            # Files already handed over to analysis are queued again; the others stop here
+            for job in jobs:
+                if crud.get_job(db, job.id).status == "running":
+                    self._fail(db, job.id, job.audio_id, e)
+                    metrics.JOBS.labels("transcription", "failed").inc()
+        finally:
+            for audio_id in registered:
+                if audio_id is not None:
+                    cancellations.release(audio_id)
+            db.close()
+
+    def _hand_over_to_analysis(self, db: Session, job: models.Job):
+        """Requeue a transcribed file for the LLM pool, shortest transcript first"""
+        audio = crud.get_audio_file(db, job.audio_id)
+        job = crud.update_job(db, job.id, stage="analysis", status="queued", estimated_cost=audio.word_count or 0)
+        self._enqueue(job)
+
+    def _discard_upload(self, job: models.Job):
+        """Delete the upload of a job cancelled before it started"""
+        if job.stage == "transcription" and job.file_path:
+            pcm.remove(job.file_path)
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+    def _run_stage(self, db: Session, job: models.Job) -> str:
+        """Run the job's stage and return its outcome: done or failed"""
+        if job.stage == "transcription":
+            if not run_transcription_stage(db, job.audio_id, job.file_path):
+                crud.update_job(db, job.id, status="failed", error="Transcription failed")
+                return "failed"
+            cancellation.checkpoint()
+            self._hand_over_to_analysis(db, job)
+            return "done"
+
+        if run_analysis_stage(db, job.audio_id, job.selected_model, job.num_questions, job.auto_generate_questions):
+            crud.update_job(db, job.id, status="done")
+            return "done"
+        crud.update_job(db, job.id, status="failed", error="Analysis failed")
+        return "failed"
+
+
+# Process-wide scheduler used by the API
+scheduler = JobScheduler()
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from . import models
+from .cancellation import JobCancelled
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Seconds before a cached response expires (0 keeps responses forever)
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+# Entries kept in SQLite and in the in-memory LRU front
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '512'))
+# Run the SQLite eviction pass every this many stores
+_EVICTION_INTERVAL = 100
+# Result of an in-flight generation whose owner was cancelled; its waiters claim the key again
+_RELEASED = object()
+
+
+def _settle(pending: Future, result=None, error: BaseException = None):
+    """Complete an in-flight future unless it already is"""
+    try:
+        if error is not None:
+            pending.set_exception(error)
+        else:
+            pending.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def cache_key(model: str, prompt: str, options: dict) -> str:
+    """Hash of everything that determines a generation"""
+    payload = json.dumps({"model": model, "prompt": prompt, "options": options}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed LLM response cache with an in-memory LRU front and request coalescing"""
+
+    def __init__(self, session_factory=SessionLocal, ttl: int = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 memory_entries: int = LLM_CACHE_MEMORY_ENTRIES):
+        self._session_factory = session_factory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stores = 0
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0}
+
+    def get_or_generate(self, model: str, prompt: str, options: dict, generate: Callable[[], str], bypass: bool = False) -> str:
+        """Return the cached response for (model, prompt, options) or generate it once.
+
+        Concurrent callers with the same key wait for the first generation instead of
+        running their own; if its caller is cancelled, one of them takes over the generation.
+        With bypass the cache is not read, but the fresh response is stored.
+        """
+        key = cache_key(model, prompt, options)
+        while True:
+            cached, pending, leader = self._claim(key, bypass)
+            if cached is not None:
+                return cached
+            if leader:
+                break
+            response = pending.result()
+            if response is not _RELEASED:
+                return response
+
+        try:
+            response = None if bypass else self._db_get(key)
+            generated = response is None
+            if generated:
+                response = generate()
+            self._finish(key, model, response, pending, generated, bypass)
+            return response
+        except BaseException as e:
+            self._fail(key, pending, e)
+            raise
+
+    async def aget_or_generate(self, model: str, prompt: str, options: dict, agenerate: Callable[[], Awaitable[str]], bypass: bool = False) -> str:
+        """Async version of get_or_generate; coalesces with sync callers of the same key"""
+        key = cache_key(model, prompt, options)
+        while True:
+            cached, pending, leader = self._claim(key, bypass)
+            if cached is not None:
+                return cached
+            if leader:
+                break
+            # Shielded so a waiter that goes away (e.g. a disconnected client) doesn't cancel the shared future
+            response = await asyncio.shield(asyncio.wrap_future(pending))
+            if response is not _RELEASED:
+                return response
+
+        try:
+            response = None if bypass else await asyncio.to_thread(self._db_get, key)
+            generated = response is None
+            if generated:
+                response = await agenerate()
+            await asyncio.to_thread(self._finish, key, model, response, pending, generated, bypass)
+            return response
+        except BaseException as e:
+            self._fail(key, pending, e)
+            raise
+
+    def lookup(self, model: str, prompt: str, options: dict):
+        """Cached response for the request, or None"""
+        key = cache_key(model, prompt, options)
+        with self._lock:
+            cached = self._memory_get(key)
+        if cached is not None:
+            return cached
+        cached = self._db_get(key)
+        if cached is not None:
+            with self._lock:
+                self._memory_put(key, cached)
+        return cached
+
+    def store(self, model: str, prompt: str, options: dict, response: str):
+        """Save a response produced outside get_or_generate, e.g. a completed stream"""
+        if not response:
+            return
+        key = cache_key(model, prompt, options)
+        self._db_put(key, model, response)
+        with self._lock:
+            self._memory_put(key, response)
+
+    def _claim(self, key: str, bypass: bool):
+        """Look the key up in memory, or join/start the in-flight generation for it.
+
+        Returns (cached response, pending future, whether this caller must generate).
+        """
+        with self._lock:
+            if bypass:
+                self._stats["bypassed"] += 1
+            else:
+                cached = self._memory_get(key)
+                if cached is not None:
+                    self._stats["memory_hits"] += 1
+                    return cached, None, False
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self._stats["coalesced"] += 1
+                return None, pending, False
+            pending = Future()
+            self._inflight[key] = pending
+            return None, pending, True
+
+    def _finish(self, key: str, model: str, response: str, pending: Future, generated: bool, bypass: bool):
+        # Empty strings mean the call failed; don't pin failures in the cache
+        if generated and response:
+            self._db_put(key, model, response)
+        with self._lock:
+            if not bypass:
+                self._stats["misses" if generated else "db_hits"] += 1
+            if response:
+                self._memory_put(key, response)
+            self._inflight.pop(key, None)
+        _settle(pending, response)
+
+    def _fail(self, key: str, pending: Future, error: BaseException):
+        """Hand a generation error to the waiters; a cancelled caller only releases the key to them"""
+        with self._lock:
+            self._inflight.pop(key, None)
+        if isinstance(error, Exception) and not isinstance(error, JobCancelled):
+            _settle(pending, error=error)
+        else:
+            _settle(pending, _RELEASED)
+
+    def _memory_get(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        response, created = entry
+        if self.ttl and time.time() - created > self.ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return response
+
+    def _memory_put(self, key: str, response: str):
+        self._memory[key] = (response, time.time())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key: str):
+        db = self._session_factory()
+        try:
+            entry = db.query(models.LLMResponseCache).filter(models.LLMResponseCache.key == key).first()
+            if not entry:
+                return None
+            if self.ttl and entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                db.delete(entry)
+                db.commit()
+                return None
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_accessed_at = datetime.utcnow()
+            db.commit()
+            return entry.response
+        finally:
+            db.close()
+
+    def _db_put(self, key: str, model: str, response: str):
+        db = self._session_factory()
+        try:
+            entry = db.query(models.LLMResponseCache).filter(models.LLMResponseCache.key == key).first()
+            now = datetime.utcnow()
+            if not entry:
+                entry = models.LLMResponseCache(key=key, model=model, hit_count=0)
+                db.add(entry)
+            entry.response = response
+            entry.created_at = now
+            entry.last_accessed_at = now
+            db.commit()
+            self._stores += 1
+            if self._stores % _EVICTION_INTERVAL == 0:
+                self._evict(db)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not store LLM response in cache: {e}")
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        """Drop expired rows, then the least recently used ones beyond max_entries"""
+        table = models.LLMResponseCache
+        if self.ttl:
+            db.query(table).filter(table.created_at < datetime.utcnow() - timedelta(seconds=self.ttl)).delete()
+        count = db.query(table).count()
+        if self.max_entries and count > self.max_entries:
+            stale = db.query(table.key).order_by(table.last_accessed_at).limit(count - self.max_entries).subquery()
+            db.query(table).filter(table.key.in_(stale.select())).delete(synchronize_session=False)
+        db.commit()
+
+    def stats(self) -> dict:
+        db = self._session_factory()
+        try:
+            entries = db.query(models.LLMResponseCache).count()
+        finally:
+            db.close()
+        with self._lock:
+            counters = dict(self._stats)
+            counters["memory_entries"] = len(self._memory)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["memory_hits"] + counters["db_hits"]) / lookups, 3) if lookups else 0.0
+        counters["entries"] = entries
+        return counters
+
+    def clear(self) -> int:
+        with self._lock:
+            self._memory.clear()
+        db = self._session_factory()
+        try:
+            deleted = db.query(models.LLMResponseCache).delete()
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+# Process-wide cache used by call_ollama
+llm_cache = LLMResponseCache()
@@ -1,21 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, Depends, BackgroundTasks, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Depends, Form, HTTPException, Request, Response, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from datetime import datetime
 from . import models, schemas, crud
-from .transcription import process_audio
-from .analytics import answer_question
+from .jobs import scheduler
+from .analytics import (aanswer_question, astream_ollama, answer_prompt, summary_prompt, condense_transcript, simple_summary,
+                        estimate_tokens, transcript_token_budget, DEFAULT_MODEL)
+from .ollama_client import ollama
+from .ollama_monitor import monitor
+from . import transcription_cache, retrieval, search_index, pcm, metrics
+from .llm_cache import llm_cache
+from .qa_sessions import qa_sessions
+from .progress import progress_bus, TERMINAL_STAGES
 from .database import engine, SessionLocal
-from .analytics import check_ollama_status
+from .migrations import run_migrations
+from .model_registry import registry, WHISPER_WARMUP
+from .transcription_backends import whisper_config
+from .storage import save_upload, UploadTooLarge, MAX_UPLOAD_BYTES, MAX_BATCH_FILES, MAX_BATCH_BYTES
 import shutil
 import os
 import logging
-import requests
+import threading
+import asyncio
+import json
+import base64
+import hashlib
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-models.Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 app = FastAPI(title="OratorV2 Backend")
 
@@ -24,8 +43,58 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+# Multipart framing overhead tolerated on top of the upload limits
+MULTIPART_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse uploads over the limit before the body is read.
+
+    The multipart parser buffers the whole body before save_upload sees it, so uploads
+    must declare their length: chunked uploads are refused rather than read unbounded.
+    """
+    if request.method == "POST" and request.url.path in ("/upload", "/upload/batch"):
+        limit = MAX_BATCH_BYTES if request.url.path == "/upload/batch" else MAX_UPLOAD_BYTES
+        if limit:
+            content_length = request.headers.get("content-length")
+            if not content_length or not content_length.isdigit():
+                return JSONResponse(status_code=411, content={"detail": "Uploads must send a Content-Length"})
+            if int(content_length) > limit + MULTIPART_OVERHEAD:
+                return JSONResponse(status_code=413, content={"detail": str(UploadTooLarge(limit))})
+    return await call_next(request)
+
+@app.on_event("startup")
+def warm_up_models():
+    """Keep the Whisper model resident so uploads don't pay for loading weights"""
+    registry.start_sweeper()
+    if WHISPER_WARMUP:
+        threading.Thread(target=registry.warm_up, name="whisper-warmup", daemon=True).start()
+
+@app.on_event("startup")
+def start_ollama_monitor():
+    """Track Ollama's reachability and models in the background"""
+    monitor.start()
+
+@app.on_event("startup")
+def start_scheduler():
+    """Start the worker pools and resume jobs interrupted by a restart"""
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def close_ollama_client():
+    await ollama.aclose()
+
+@app.on_event("shutdown")
+def unload_models():
+    monitor.stop()
+    ollama.close()
+    scheduler.stop()
+    registry.stop_sweeper()
+    registry.unload_all()
+
 def get_db():
     db = SessionLocal()
     try:
@@ -38,14 +107,13 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @app.post("/upload", response_model=schemas.AudioFile)
 def upload_audio(
-    background_tasks: BackgroundTasks, 
     file: UploadFile = File(...), 
     selected_model: str = Form(None),
     num_questions: int = Form(3),
     auto_generate_questions: bool = Form(True),
     db: Session = Depends(get_db)
 ):
-    # Create audio file record first to get unique filename
+    # Create audio file record first to get its storage key
     audio = crud.create_audio_file(
         db, 
         filename=file.filename, 
@@ -53,45 +121,156 @@ def upload_audio(
         selected_model=selected_model
     )
     
-    # Use the unique filename from the database record
-    filepath = os.path.join(UPLOAD_DIR, audio.filename)
-    file_size = 0
+    # Files are stored under a random key, so uploads with the same name never collide
+    filepath = os.path.join(UPLOAD_DIR, audio.storage_key)
     
-    # Save file with unique filename and get size
-    with open(filepath, "wb") as buffer:
-        content = file.file.read()
-        file_size = len(content)
-        buffer.write(content)
+    # Stream to disk in chunks, hashing and enforcing the size limit on the way
+    try:
+        file_size, content_hash = save_upload(file.file, filepath)
+    except UploadTooLarge as e:
+        crud.delete_audio_file(db, audio.id)
+        raise HTTPException(status_code=413, detail=str(e))
+    logger.info(f"Saved upload {audio.filename}: {file_size} bytes, sha256 {content_hash}")
     
-    # Update the file size in the database
+    # Update the file size and content hash in the database
     audio.file_size = file_size
+    audio.content_hash = content_hash
     db.commit()
     db.refresh(audio)
     
-    # Start background processing
-    background_tasks.add_task(process_audio, db, audio.id, filepath, selected_model, num_questions, auto_generate_questions)
+    _queue_upload(db, audio, filepath, selected_model, num_questions, auto_generate_questions)
     return audio
 
-@app.get("/files", response_model=list[schemas.AudioFile])
-def list_files(db: Session = Depends(get_db)):
-    return crud.list_audio_files(db)
+def _queue_upload(db: Session, audio: models.AudioFile, filepath: str, selected_model: str, num_questions: int,
+                  auto_generate_questions: bool):
+    """Queue a saved upload for processing, unless identical audio was processed before"""
+    # Identical audio was processed before: reuse its results instead of running the pipeline
+    cached = transcription_cache.lookup(db, audio, whisper_config().cache_key, selected_model or DEFAULT_MODEL, auto_generate_questions)
+    if cached != "miss":
+        os.remove(filepath)
+        if cached == "transcription":
+            scheduler.submit_analysis(db, audio, selected_model, num_questions, auto_generate_questions)
+        db.refresh(audio)
+        return
+    
+    # Queue for processing, shortest recordings first
+    scheduler.submit(db, audio, filepath, selected_model, num_questions, auto_generate_questions)
+    db.refresh(audio)
+
+@app.post("/upload/batch", response_model=list[schemas.AudioFile])
+def upload_audio_batch(
+    files: list[UploadFile] = File(...),
+    selected_model: str = Form(None),
+    num_questions: int = Form(3),
+    auto_generate_questions: bool = Form(True),
+    db: Session = Depends(get_db)
+):
+    """Upload many recordings in one request.
+
+    All files are saved before any row is created, so an oversized file rejects the whole batch.
+    The rows are then created in one transaction and queued together; short files are transcribed in batches.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+
+    uploads = []
+    try:
+        for file in files:
+            storage_key = crud.new_storage_key(file.filename)
+            file_size, content_hash = save_upload(file.file, os.path.join(UPLOAD_DIR, storage_key))
+            uploads.append({"filename": file.filename, "storage_key": storage_key, "file_size": file_size, "content_hash": content_hash})
+    except UploadTooLarge as e:
+        for upload in uploads:
+            os.remove(os.path.join(UPLOAD_DIR, upload["storage_key"]))
+        raise HTTPException(status_code=413, detail=f"{file.filename}: {e}")
+    logger.info(f"Saved batch of {len(uploads)} uploads, {sum(u['file_size'] for u in uploads)} bytes")
+
+    audios = crud.create_audio_files(db, uploads, selected_model)
+    for audio in audios:
+        _queue_upload(db, audio, os.path.join(UPLOAD_DIR, audio.storage_key), selected_model, num_questions, auto_generate_questions)
+    return audios
+
+# Default and maximum page sizes of /files
+FILES_PAGE_SIZE = int(os.getenv('FILES_PAGE_SIZE', '50'))
+FILES_MAX_PAGE_SIZE = 500
+
+def _with_live_progress(audio: models.AudioFile, schema=schemas.AudioFile):
+    """The stored row with the percentage from the progress bus, which is fresher within a stage"""
+    result = schema.model_validate(audio)
+    live = progress_bus.latest(audio.id)
+    if live:
+        result.processing_stage = live["processing_stage"]
+        result.progress_percentage = live["progress_percentage"]
+    return result
+
+def _encode_cursor(audio: models.AudioFile) -> str:
+    """Opaque cursor pointing just after this row in the newest-first ordering"""
+    raw = json.dumps([audio.uploaded_at.isoformat(), audio.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        uploaded_at, audio_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(uploaded_at), int(audio_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _etag_response(request: Request, body: bytes, headers: dict = None) -> Response:
+    """JSON response carrying an ETag of its body; 304 when the client already has this version"""
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    # no-cache makes browsers revalidate with If-None-Match instead of reusing a stale copy
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+_summary_list = TypeAdapter(list[schemas.AudioFileSummary])
+
+@app.get("/files", response_model=list[schemas.AudioFileSummary])
+def list_files(
+    request: Request,
+    limit: int = Query(FILES_PAGE_SIZE, ge=1, le=FILES_MAX_PAGE_SIZE),
+    cursor: str = None,
+    stage: list[str] = Query(None),
+    uploaded_after: datetime = None,
+    uploaded_before: datetime = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List files newest first, without transcripts. Pass the X-Next-Cursor header back as cursor for the next page.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    audios = crud.list_audio_files(db, limit=limit, after=after, stages=stage,
+                                   uploaded_after=uploaded_after, uploaded_before=uploaded_before)
+    headers = {"X-Next-Cursor": _encode_cursor(audios[-1])} if len(audios) == limit else {}
+    items = [_with_live_progress(audio, schemas.AudioFileSummary) for audio in audios]
+    return _etag_response(request, _summary_list.dump_json(items), headers)
   
 @app.get("/files/{audio_id}", response_model=schemas.AudioFile)
-def get_file(audio_id: int, db: Session = Depends(get_db)):
+def get_file(audio_id: int, request: Request, db: Session = Depends(get_db)):
     audio = crud.get_audio_file(db, audio_id)
     if not audio:
         raise HTTPException(status_code=404, detail="File not found")
-    return audio
+    return _etag_response(request, _with_live_progress(audio).model_dump_json().encode())
+
+@app.get("/search")
+def search_files(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0),
+                 db: Session = Depends(get_db)):
+    """
+    Full-text search over transcripts, summaries and questions, best matches first with highlighted snippets.
+    """
+    started = time.perf_counter()
+    results = search_index.search(db, q, limit=limit, offset=offset)
+    return {"query": q, "results": results, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
 
 @app.get("/models")
 def get_available_models():
     """Get list of available Ollama models"""
     try:
-        ollama_url = os.getenv('OLLAMA_URL', 'http://localhost:11434')
-        response = requests.get(f"{ollama_url}/api/tags", timeout=10)
+        # Read the monitor's cached state instead of probing Ollama on every request
+        data = monitor.snapshot()
         
-        if response.status_code == 200:
-            data = response.json()
+        if data["reachable"]:
             models = []
 
             # Fetch models from local Ollama API
@@ -138,44 +317,268 @@ def get_available_models():
             "ollama_available": False
         }
 
+@app.get("/cache/transcriptions")
+def get_transcription_cache_stats(db: Session = Depends(get_db)):
+    """Hit rates and size of the content-addressed transcription cache"""
+    return transcription_cache.stats(db)
+
+@app.delete("/cache/transcriptions")
+def purge_transcription_cache(audio_hash: str = None, db: Session = Depends(get_db)):
+    """Purge cached results for one audio hash, or the whole cache"""
+    deleted = transcription_cache.purge(db, audio_hash)
+    return {"deleted": deleted}
+
+@app.get("/cache/llm")
+def get_llm_cache_stats():
+    """Hit rates and size of the LLM response cache"""
+    return llm_cache.stats()
+
+@app.delete("/cache/llm")
+def purge_llm_cache():
+    return {"deleted": llm_cache.clear()}
+
 @app.get("/files/{audio_id}/progress")
 def get_file_progress(audio_id: int, db: Session = Depends(get_db)):
     """Get processing progress for a specific file"""
     audio = crud.get_audio_file(db, audio_id)
     if not audio:
         raise HTTPException(status_code=404, detail="File not found")
+    live = progress_bus.latest(audio_id) or {}
     
     return {
         "id": audio.id,
-        "processing_stage": audio.processing_stage,
-        "progress_percentage": audio.progress_percentage,
+        "processing_stage": live.get("processing_stage", audio.processing_stage),
+        "progress_percentage": live.get("progress_percentage", audio.progress_percentage),
         "filename": audio.filename
     }
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Seconds between keep-alive comments on idle progress streams
+PROGRESS_KEEPALIVE = 15
+
+async def _progress_events(audio_id: int = None, initial: list = None):
+    """Yield progress events for one file or all files: current state first, then live changes.
+
+    A single-file stream ends once the file completes, fails or is deleted.
+    """
+    async with progress_bus.subscribe(audio_id) as queue:
+        for event in initial or []:
+            yield event
+            if audio_id is not None and event["processing_stage"] in TERMINAL_STAGES:
+                return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=PROGRESS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield event
+            if audio_id is not None and event["processing_stage"] in TERMINAL_STAGES:
+                return
+
+def _initial_progress(db: Session, audio_id: int = None) -> list:
+    """Current progress to replay to a new subscriber, falling back to the DB for files the bus hasn't seen.
+
+    Without an audio_id only unfinished files are replayed; the client has the rest from /files.
+    """
+    if audio_id is not None:
+        audios = [crud.get_audio_file(db, audio_id)]
+    else:
+        audios = crud.list_audio_files(db, exclude_stages=list(TERMINAL_STAGES))
+    events = []
+    for audio in audios:
+        if audio:
+            events.append(progress_bus.latest(audio.id) or {
+                "id": audio.id,
+                "processing_stage": audio.processing_stage,
+                "progress_percentage": audio.progress_percentage,
+            })
+    return events
+
+async def _progress_sse(audio_id: int, initial: list):
+    async for event in _progress_events(audio_id, initial):
+        # SSE comments keep proxies from closing an idle connection
+        yield _sse("progress", event) if event else ": keep-alive\n\n"
+
+@app.get("/progress/stream")
+async def stream_all_progress(db: Session = Depends(get_db)):
+    """Stream stage and percentage changes of every file as Server-Sent Events"""
+    initial = await run_in_threadpool(_initial_progress, db)
+    return _sse_response(_progress_sse(None, initial))
+
+@app.get("/files/{audio_id}/progress/stream")
+async def stream_file_progress(audio_id: int, db: Session = Depends(get_db)):
+    """Stream one file's progress as Server-Sent Events until it completes or fails"""
+    initial = await run_in_threadpool(_initial_progress, db, audio_id)
+    if not initial:
+        raise HTTPException(status_code=404, detail="File not found")
+    return _sse_response(_progress_sse(audio_id, initial))
+
+@app.websocket("/ws/progress")
+async def progress_websocket(websocket: WebSocket, audio_id: int = None):
+    """Push progress events over a WebSocket, for one file when audio_id is given or for all files"""
+    await websocket.accept()
+    db = SessionLocal()
+    try:
+        initial = await run_in_threadpool(_initial_progress, db, audio_id)
+    finally:
+        db.close()
+    try:
+        async for event in _progress_events(audio_id, initial):
+            if event:
+                await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @app.get("/status")
 def get_status():
     """Get system status including LLM availability"""
-    from .analytics import check_ollama_status
+    ollama_state = monitor.snapshot()
     
     return {
         "status": "running",
-        "llm_available": check_ollama_status(),
-        "ollama_url": os.getenv('OLLAMA_URL', 'http://localhost:11434')
+        "llm_available": ollama_state["reachable"],
+        "ollama_url": ollama.base_url,
+        "ollama_models": ollama_state["models"],
+        "ollama_loaded_models": ollama_state["loaded"],
+        "ollama_checked_at": ollama_state["last_checked"],
+        "whisper_models": registry.status(),
+        "jobs": scheduler.stats(),
+        "qa_sessions": qa_sessions.stats()
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """Stage timings, audio throughput, LLM tokens and queue waits in the Prometheus text format"""
+    body, content_type = metrics.exposition()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/files/{audio_id}/ask")
-def ask_question(audio_id: int, question: str = Form(...), db: Session = Depends(get_db)):
+async def ask_question(audio_id: int, question: str = Form(...), no_cache: bool = Form(False), db: Session = Depends(get_db)):
     """
     Answer a question about the transcribed text for a given audio file.
     """
-    audio = crud.get_audio_file(db, audio_id)
+    audio = await run_in_threadpool(crud.get_audio_file, db, audio_id)
     if not audio or not audio.transcription:
         raise HTTPException(status_code=404, detail="Transcription not found")
-    answer = answer_question(audio.transcription, question)
+    # Only the passages relevant to the question go into the prompt
+    context = await run_in_threadpool(retrieval.build_context, db, audio_id, question)
+    # Generation is awaited on the pooled async client instead of blocking a worker thread
+    answer = await aanswer_question(context or audio.transcription, question, use_cache=not no_cache)
     return {"answer": answer}
 
+async def _stream_tokens(prompt: str, model: str, use_cache: bool, on_complete=None):
+    """Relay Ollama tokens as SSE 'token' events, then a 'done' event with the full text"""
+    parts = []
+    try:
+        async for token in astream_ollama(prompt, model, use_cache=use_cache):
+            parts.append(token)
+            yield _sse("token", {"token": token})
+    except Exception as e:
+        logger.error(f"Streaming generation failed: {e}")
+        yield _sse("error", {"detail": str(e)})
+        return
+    text = "".join(parts).strip()
+    if on_complete and text:
+        await run_in_threadpool(on_complete, text)
+    yield _sse("done", {"text": text})
+
+@app.post("/files/{audio_id}/ask/stream")
+async def ask_question_stream(audio_id: int, question: str = Form(...), no_cache: bool = Form(False), db: Session = Depends(get_db)):
+    """
+    Stream the answer to a question as Server-Sent Events while Ollama generates it.
+    """
+    audio = await run_in_threadpool(crud.get_audio_file, db, audio_id)
+    if not audio or not audio.transcription or audio.transcription.startswith('['):
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    context = await run_in_threadpool(retrieval.build_context, db, audio_id, question)
+    prompt = answer_prompt(context or audio.transcription, question)
+    return _sse_response(_stream_tokens(prompt, DEFAULT_MODEL, not no_cache))
+
+@app.post("/files/{audio_id}/sessions")
+async def open_qa_session(audio_id: int, db: Session = Depends(get_db)):
+    """
+    Start a conversation about a transcript; follow-up questions reuse the Ollama context instead of resending it.
+    """
+    audio = await run_in_threadpool(crud.get_audio_file, db, audio_id)
+    text = audio.transcription if audio else None
+    if not text or text.startswith('['):
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    model = audio.selected_model or DEFAULT_MODEL
+    # A transcript that fits in one prompt is the conversation's prefix; longer ones get the passages for each question
+    if estimate_tokens(text) <= transcript_token_budget():
+        return qa_sessions.open(audio_id, text, model).describe()
+    return qa_sessions.open(audio_id, "", model, retrieve=_session_passages(audio_id)).describe()
+
+def _session_passages(audio_id: int):
+    """Retrieve the passages of a file for one question, in a session of its own since the request's is closed by then"""
+    def retrieve(question: str) -> str:
+        db = SessionLocal()
+        try:
+            return retrieval.build_context(db, audio_id, question)
+        finally:
+            db.close()
+    return retrieve
+
+@app.post("/sessions/{session_id}/ask")
+async def ask_in_session(session_id: str, question: str = Form(...)):
+    """
+    Answer a question within a session, continuing from the previous answers.
+    """
+    session = qa_sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"session_id": session_id, **await qa_sessions.ask(session, question)}
+
+@app.delete("/sessions/{session_id}")
+def close_qa_session(session_id: str):
+    if not qa_sessions.close(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"message": "Session closed"}
+
+def _save_summary(audio_id: int, summary: str):
+    db = SessionLocal()
+    try:
+        crud.update_summary(db, audio_id, summary)
+    finally:
+        db.close()
+
+@app.post("/files/{audio_id}/regenerate_summary")
+def regenerate_summary(audio_id: int, db: Session = Depends(get_db)):
+    """
+    Generate a fresh summary for a transcribed file and store it.
+    """
+    audio = crud.get_audio_file(db, audio_id)
+    if not audio or not audio.transcription:
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    model = audio.selected_model or DEFAULT_MODEL
+    summary = simple_summary(audio.transcription, model=model, use_cache=False)
+    crud.update_summary(db, audio_id, summary)
+    return {"summary": summary}
+
+@app.post("/files/{audio_id}/regenerate_summary/stream")
+async def regenerate_summary_stream(audio_id: int, db: Session = Depends(get_db)):
+    """
+    Stream a fresh summary as Server-Sent Events; it is stored once generation completes.
+    """
+    audio = await run_in_threadpool(crud.get_audio_file, db, audio_id)
+    if not audio or not audio.transcription or audio.transcription.startswith('['):
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    model = audio.selected_model or DEFAULT_MODEL
+    # Long transcripts still need the map step before the final summary can stream
+    text = await run_in_threadpool(condense_transcript, audio.transcription, model)
+    # A regenerated summary should be new, so the response cache is only written
+    return _sse_response(_stream_tokens(summary_prompt(text), model, False, lambda summary: _save_summary(audio_id, summary)))
+
 @app.post("/files/{audio_id}/generate_questions")
-def generate_more_questions(audio_id: int, num_questions: int = 3, db: Session = Depends(get_db)):
+def generate_more_questions(audio_id: int, num_questions: int = 3, no_cache: bool = False, db: Session = Depends(get_db)):
     """
     Generate more questions for an existing audio file and append them to the database.
     """
@@ -187,15 +590,24 @@ def generate_more_questions(audio_id: int, num_questions: int = 3, db: Session =
     if audio.questions:
         existing = [q.strip() for q in audio.questions.split("\n") if q.strip()]
     from .analytics import generate_questions
-    new_questions = generate_questions(audio.transcription, num=num_questions, existing_questions=existing)
+    new_questions = generate_questions(audio.transcription, num=num_questions, existing_questions=existing, use_cache=not no_cache)
     # Append only unique questions
     unique_new = [q for q in new_questions if q not in existing]
     all_questions = existing + unique_new
-    audio.questions = "\n".join([f"{i+1}. {q}" for i, q in enumerate(all_questions)])
-    db.commit()
-    db.refresh(audio)
+    crud.update_questions(db, audio_id, "\n".join([f"{i+1}. {q}" for i, q in enumerate(all_questions)]))
     return {"questions": unique_new}
 
+@app.post("/files/{audio_id}/cancel")
+def cancel_file(audio_id: int, db: Session = Depends(get_db)):
+    """Stop processing a file: queued work is skipped and running work stops at its next checkpoint"""
+    audio = crud.get_audio_file(db, audio_id)
+    if not audio:
+        raise HTTPException(status_code=404, detail="File not found")
+    if audio.processing_stage in TERMINAL_STAGES:
+        raise HTTPException(status_code=409, detail=f"File is not being processed ({audio.processing_stage})")
+    crud.cancel_processing(db, audio_id)
+    return {"id": audio_id, "processing_stage": "cancelled"}
+
 @app.delete("/files/{audio_id}")
 def delete_file(audio_id: int, db: Session = Depends(get_db)):
     """Delete a file and its associated data"""
@@ -208,11 +620,13 @@ def delete_file(audio_id: int, db: Session = Depends(get_db)):
     crud.stop_whisper_process(audio_id)
     
     # Delete the file from the uploads directory
-    file_path = os.path.join(UPLOAD_DIR, audio.filename)
+    file_path = os.path.join(UPLOAD_DIR, audio.storage_key)
     if os.path.exists(file_path):
         os.remove(file_path)
+    pcm.remove(file_path)
     
     # Remove the file record from the database
     crud.delete_audio_file(db, audio_id)
+    qa_sessions.close_file(audio_id)
     
     return {"message": "File deleted successfully"}
@@ -0,0 +1,105 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Seconds, from a quick cache hit up to a long recording on CPU
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+STAGE_SECONDS = Histogram(
+    "audio_stage_duration_seconds", "Time spent in each processing stage", ["stage"], buckets=STAGE_BUCKETS)
+QUEUE_WAIT_SECONDS = Histogram(
+    "job_queue_wait_seconds", "Time jobs waited for a worker", ["stage"], buckets=STAGE_BUCKETS)
+AUDIO_SECONDS = Counter(
+    "audio_transcribed_seconds", "Seconds of audio transcribed")
+REAL_TIME_FACTOR = Histogram(
+    "transcription_real_time_factor", "Transcription time divided by the audio duration",
+    buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5))
+LLM_SECONDS = Histogram(
+    "llm_request_duration_seconds", "Ollama generation latency", ["model"], buckets=STAGE_BUCKETS)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt tokens per Ollama generation", ["model"], buckets=TOKEN_BUCKETS)
+LLM_RESPONSE_TOKENS = Histogram(
+    "llm_response_tokens", "Generated tokens per Ollama generation", ["model"], buckets=TOKEN_BUCKETS)
+JOBS = Counter(
+    "processing_jobs", "Finished jobs by stage and outcome", ["stage", "outcome"])
+
+
+class StageTimings:
+    """Seconds per stage collected for one job; spans in worker threads add to it too"""
+
+    def __init__(self):
+        self._seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {stage: round(seconds, 3) for stage, seconds in self._seconds.items()}
+
+
+_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def record_timings():
+    """Collect the spans run in this context, e.g. to store them on the file being processed"""
+    timings = StageTimings()
+    reset = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(reset)
+
+
+def _add(stage: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block (or, as a decorator, a function) into the stage histogram and the current job's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        _add(stage, elapsed)
+
+
+def observe_queue_wait(stage: str, seconds: float):
+    QUEUE_WAIT_SECONDS.labels(stage).observe(seconds)
+    _add(f"queue_wait_{stage}", seconds)
+
+
+def observe_transcription(audio_seconds: float, elapsed: float):
+    """Count transcribed audio and how much faster than real time it went"""
+    if audio_seconds <= 0:
+        return
+    AUDIO_SECONDS.inc(audio_seconds)
+    REAL_TIME_FACTOR.observe(elapsed / audio_seconds)
+
+
+def observe_llm(model: str, elapsed: float, response: Optional[dict]):
+    """Latency and token counts of one Ollama generation, from the counts Ollama reports"""
+    LLM_SECONDS.labels(model).observe(elapsed)
+    _add("llm", elapsed)
+    if response:
+        if response.get("prompt_eval_count") is not None:
+            LLM_PROMPT_TOKENS.labels(model).observe(response["prompt_eval_count"])
+        if response.get("eval_count") is not None:
+            LLM_RESPONSE_TOKENS.labels(model).observe(response["eval_count"])
+
+
+def exposition() -> tuple:
+    """Body and content type of the Prometheus text format"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,232 @@
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Integer, LargeBinary, MetaData,
+                        PrimaryKeyConstraint, String, Table, UniqueConstraint, inspect, select, text)
+from sqlalchemy.engine import Connection, Engine
+from . import blobs, search_index
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String),
+    Column("applied_at", DateTime),
+)
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_indexes(conn: Connection, table: str, indexes: list, unique: bool = False):
+    """CREATE INDEX for the (name, column) pairs the database doesn't have yet"""
+    existing = {i["name"] for i in inspect(conn).get_indexes(table)}
+    for name, column in indexes:
+        if name not in existing:
+            conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({column})"))
+
+
+# Schema of the first release, frozen here: later model changes belong in new migrations, not in this DDL
+_baseline = MetaData()
+Table(
+    "audio_files", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("filename", String, index=True),
+    Column("uploaded_at", DateTime),
+    Column("transcription", String),
+    Column("language", String),
+    Column("summary", String),
+    Column("questions", String),
+    Column("word_count", Integer),
+    Column("processing_stage", String),
+    Column("progress_percentage", Integer),
+    Column("file_size", BigInteger),
+    Column("audio_duration", Float),
+    Column("selected_model", String),
+)
+Table(
+    "jobs", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("audio_id", Integer, ForeignKey("audio_files.id"), index=True),
+    Column("stage", String),
+    Column("status", String, index=True),
+    Column("estimated_cost", Float),
+    Column("file_path", String),
+    Column("selected_model", String),
+    Column("num_questions", Integer),
+    Column("auto_generate_questions", Boolean),
+    Column("attempts", Integer),
+    Column("error", String),
+    Column("created_at", DateTime),
+    Column("started_at", DateTime),
+    Column("finished_at", DateTime),
+)
+Table(
+    "transcription_cache", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("audio_hash", String, index=True),
+    Column("whisper_model", String),
+    Column("llm_model", String),
+    Column("transcription", String),
+    Column("segments", String),
+    Column("language", String),
+    Column("summary", String),
+    Column("questions", String),
+    Column("hit_count", Integer),
+    Column("created_at", DateTime),
+    Column("last_hit_at", DateTime),
+    UniqueConstraint("audio_hash", "whisper_model", "llm_model"),
+)
+Table(
+    "transcript_chunks", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("audio_id", Integer, ForeignKey("audio_files.id"), index=True),
+    Column("position", Integer),
+    Column("text", String),
+    Column("start", Float),
+    Column("end", Float),
+    Column("embedding", LargeBinary),
+    Column("term_counts", String),
+    Column("token_count", Integer),
+)
+Table(
+    "llm_response_cache", _baseline,
+    Column("key", String, primary_key=True),
+    Column("model", String, index=True),
+    Column("response", String),
+    Column("hit_count", Integer),
+    Column("created_at", DateTime, index=True),
+    Column("last_accessed_at", DateTime, index=True),
+)
+
+
+def baseline(conn: Connection):
+    """Tables of the first release; existing tables are left as they are"""
+    _baseline.create_all(bind=conn)
+
+
+def audio_file_columns(conn: Connection):
+    """Columns added to audio_files since the first release"""
+    _add_column(conn, "audio_files", "segments", "VARCHAR")
+    _add_column(conn, "audio_files", "content_hash", "VARCHAR")
+    _add_column(conn, "audio_files", "storage_key", "VARCHAR")
+    # Uploads made before storage keys were stored under their filename
+    conn.execute(text("UPDATE audio_files SET storage_key = filename WHERE storage_key IS NULL"))
+
+
+def audio_file_indexes(conn: Connection):
+    """Indexes used by the file listing filters and ordering, and the storage key uniqueness"""
+    _create_indexes(conn, "audio_files", [("ix_audio_files_uploaded_at", "uploaded_at"),
+                                          ("ix_audio_files_processing_stage", "processing_stage"),
+                                          ("ix_audio_files_content_hash", "content_hash")])
+    _create_indexes(conn, "audio_files", [("ix_audio_files_storage_key", "storage_key")], unique=True)
+
+
+def full_text_search(conn: Connection):
+    """Full-text index over transcripts, summaries and questions, filled from the files processed so far"""
+    search_index.create_index(conn)
+    search_index.rebuild(conn)
+
+
+def vad_skipped_ratio(conn: Connection):
+    _add_column(conn, "audio_files", "vad_skipped_ratio", "FLOAT")
+
+
+def stage_timings(conn: Connection):
+    _add_column(conn, "audio_files", "stage_timings", "VARCHAR")
+
+
+_transcript_blobs = Table(
+    "transcript_blobs", MetaData(),
+    Column("audio_id", Integer, ForeignKey(_baseline.tables["audio_files"].c.id)),
+    Column("kind", String),
+    Column("codec", String),
+    Column("size", Integer),
+    Column("data", LargeBinary),
+    PrimaryKeyConstraint("audio_id", "kind"),
+)
+
+
+def transcript_blobs(conn: Connection):
+    """Move transcripts and segments out of audio_files into compressed rows of transcript_blobs"""
+    _transcript_blobs.create(conn, checkfirst=True)
+    columns = {c["name"] for c in inspect(conn).get_columns("audio_files")}
+    for kind in ("transcription", "segments"):
+        if kind not in columns:
+            continue
+        rows = conn.execute(text(f"SELECT id, {kind} FROM audio_files WHERE {kind} IS NOT NULL")).all()
+        for audio_id, value in rows:
+            codec, data = blobs.pack(value)
+            conn.execute(_transcript_blobs.insert().values(
+                audio_id=audio_id, kind=kind, codec=codec, size=len(value), data=data))
+        # Emptied here so the copy is done in one pass; drop_inline_transcripts removes the column
+        conn.execute(text(f"UPDATE audio_files SET {kind} = NULL"))
+        logger.info(f"Moved {len(rows)} {kind} values to transcript_blobs")
+    search_index.rebuild(conn)
+
+
+def transcription_cache_blobs(conn: Connection):
+    """Compress the transcripts and segments kept in transcription_cache"""
+    binary = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+    for kind in ("transcription", "segments"):
+        _add_column(conn, "transcription_cache", f"{kind}_codec", "VARCHAR")
+        _add_column(conn, "transcription_cache", f"{kind}_data", binary)
+    columns = {c["name"] for c in inspect(conn).get_columns("transcription_cache")}
+    for kind in ("transcription", "segments"):
+        if kind not in columns:
+            continue
+        rows = conn.execute(text(f"SELECT id, {kind} FROM transcription_cache WHERE {kind} IS NOT NULL")).all()
+        for entry_id, value in rows:
+            codec, data = blobs.pack(value)
+            conn.execute(text(f"UPDATE transcription_cache SET {kind}_codec = :codec, {kind}_data = :data, {kind} = NULL "
+                              "WHERE id = :id"), {"codec": codec, "data": data, "id": entry_id})
+        logger.info(f"Compressed {len(rows)} cached {kind} values")
+
+
+def drop_inline_transcripts(conn: Connection):
+    """Drop the text columns emptied by transcript_blobs and transcription_cache_blobs; VACUUM returns the space"""
+    for table in ("audio_files", "transcription_cache"):
+        columns = {c["name"] for c in inspect(conn).get_columns(table)}
+        for column in ("transcription", "segments"):
+            if column in columns:
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+
+# Ordered (version, name, migration); append new migrations, never edit applied ones
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline", baseline),
+    (2, "audio_file_columns", audio_file_columns),
+    (3, "audio_file_indexes", audio_file_indexes),
+    (4, "full_text_search", full_text_search),
+    (5, "vad_skipped_ratio", vad_skipped_ratio),
+    (6, "stage_timings", stage_timings),
+    (7, "transcript_blobs", transcript_blobs),
+    (8, "transcription_cache_blobs", transcription_cache_blobs),
+    (9, "drop_inline_transcripts", drop_inline_transcripts),
+]
+
+
+def current_version(engine: Engine) -> int:
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        versions = conn.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def run_migrations(engine: Engine) -> int:
+    """Apply pending migrations in order, each in its own transaction; returns the schema version"""
+    version = current_version(engine)
+    for number, name, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        logger.info(f"Applying migration {number} ({name})")
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+        version = number
+    return version
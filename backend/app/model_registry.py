@@ -0,0 +1,187 @@
+import os
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from . import metrics
+from .transcription_backends import WhisperConfig, get_backend, whisper_config
+
+logger = logging.getLogger(__name__)
+
+# Seconds a model may stay unused before it is unloaded (0 disables idle eviction)
+MODEL_IDLE_TIMEOUT = int(os.getenv('WHISPER_MODEL_IDLE_TIMEOUT', '1800'))
+# Upper bound for the memory used by resident models in MB (0 means unlimited)
+MODEL_MEMORY_LIMIT_MB = int(os.getenv('WHISPER_MODEL_MEMORY_LIMIT_MB', '0'))
+# Load the default model when the API starts
+WHISPER_WARMUP = os.getenv('WHISPER_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+
+
+def _load_whisper_model(config: WhisperConfig):
+    """Load a model with the backend it names"""
+    return get_backend(config.backend).load(config.model_size, config.device, config.compute_type)
+
+
+def _model_memory_bytes(config: WhisperConfig, model) -> int:
+    """Memory held by a model, as its backend measures or estimates it"""
+    try:
+        return get_backend(config.backend).memory_bytes(model, config)
+    except Exception:
+        return 0
+
+
+def _release_device_memory():
+    """Return cached CUDA memory to the driver after unloading a model"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+class _ResidentModel:
+    def __init__(self, key, model, memory_bytes: int):
+        self.key = key
+        self.model = model
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.last_used_at = self.loaded_at
+        self.in_use = 0
+
+
+class ModelRegistry:
+    """Keeps Whisper models resident across jobs, keyed by their WhisperConfig"""
+
+    def __init__(self, idle_timeout: int = MODEL_IDLE_TIMEOUT, memory_limit_mb: int = MODEL_MEMORY_LIMIT_MB, loader=_load_whisper_model):
+        self.idle_timeout = idle_timeout
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self._loader = loader
+        self._models = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def use(self, config: WhisperConfig = None):
+        """Borrow a resident model, the configured one by default, loading it on first use. Models in use are never evicted."""
+        entry = self._acquire(config or whisper_config())
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used_at = time.time()
+
+    def _acquire(self, key) -> _ResidentModel:
+        with self._lock:
+            entry = self._models.get(key)
+            if entry:
+                entry.in_use += 1
+                entry.last_used_at = time.time()
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model; the others wait and reuse it
+        with metrics.span("model_load"), load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry:
+                    entry.in_use += 1
+                    entry.last_used_at = time.time()
+                    return entry
+
+            logger.info(f"Loading Whisper model {key.model_size} with {key.backend} on {key.device} ({key.compute_type})")
+            start = time.time()
+            model = self._loader(key)
+            entry = _ResidentModel(key, model, _model_memory_bytes(key, model))
+            logger.info(f"Whisper model {key.model_size} loaded in {time.time() - start:.1f}s ({entry.memory_bytes / 1024 / 1024:.0f} MB)")
+
+            with self._lock:
+                entry.in_use += 1
+                self._models[key] = entry
+                evicted = self._enforce_memory_limit()
+        if evicted:
+            _release_device_memory()
+        return entry
+
+    def _enforce_memory_limit(self) -> list:
+        """Unload least recently used idle models until under the memory cap. Caller holds the lock."""
+        evicted = []
+        if not self.memory_limit_bytes:
+            return evicted
+        idle = sorted((e for e in self._models.values() if e.in_use == 0), key=lambda e: e.last_used_at)
+        while idle and sum(e.memory_bytes for e in self._models.values()) > self.memory_limit_bytes:
+            entry = idle.pop(0)
+            del self._models[entry.key]
+            evicted.append(entry.key)
+            logger.info(f"Evicted Whisper model {entry.key} to stay under memory limit")
+        return evicted
+
+    def evict_idle(self) -> list:
+        """Unload models that have not been used for longer than the idle timeout"""
+        if not self.idle_timeout:
+            return []
+        now = time.time()
+        with self._lock:
+            expired = [key for key, e in self._models.items()
+                       if e.in_use == 0 and now - e.last_used_at > self.idle_timeout]
+            for key in expired:
+                del self._models[key]
+                logger.info(f"Evicted idle Whisper model {key}")
+        if expired:
+            _release_device_memory()
+        return expired
+
+    def unload_all(self):
+        with self._lock:
+            self._models.clear()
+        _release_device_memory()
+
+    def warm_up(self, config: WhisperConfig = None):
+        """Load a model ahead of the first job so uploads only pay for inference"""
+        config = config or whisper_config()
+        try:
+            with self.use(config):
+                pass
+        except Exception as e:
+            logger.warning(f"Whisper warm-up failed for {config.model_size} on {config.device}: {e}")
+
+    def start_sweeper(self):
+        """Start the background thread that unloads idle models"""
+        if not self.idle_timeout or (self._sweeper and self._sweeper.is_alive()):
+            return
+        self._stop.clear()
+        interval = max(1, min(60, self.idle_timeout // 2))
+
+        def sweep():
+            while not self._stop.wait(interval):
+                self.evict_idle()
+
+        self._sweeper = threading.Thread(target=sweep, name="whisper-model-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def status(self) -> list:
+        """Describe the resident models for the /status endpoint"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "backend": e.key.backend,
+                    "model_size": e.key.model_size,
+                    "device": e.key.device,
+                    "compute_type": e.key.compute_type,
+                    "memory_mb": round(e.memory_bytes / 1024 / 1024, 1),
+                    "in_use": e.in_use,
+                    "loaded_at": e.loaded_at,
+                    "idle_seconds": round(now - e.last_used_at, 1),
+                }
+                for e in self._models.values()
+            ]
+
+
+# Process-wide registry shared by all transcription jobs
+registry = ModelRegistry()
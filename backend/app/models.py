@@ -1,20 +1,135 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Float, BigInteger, Boolean, ForeignKey, UniqueConstraint, LargeBinary
+from sqlalchemy.orm import relationship, attribute_keyed_dict
 from .database import Base
+from . import blobs
 from datetime import datetime
 
+class CompressedText:
+    """String attribute kept compressed in the <name>_data and <name>_codec columns of its table"""
+
+    def __set_name__(self, owner, name):
+        self.data, self.codec = f"{name}_data", f"{name}_codec"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        data = getattr(obj, self.data)
+        return blobs.unpack(getattr(obj, self.codec), data) if data is not None else None
+
+    def __set__(self, obj, value):
+        codec, data = blobs.pack(value) if value is not None else (None, None)
+        setattr(obj, self.codec, codec)
+        setattr(obj, self.data, data)
+
 class AudioFile(Base):
     __tablename__ = "audio_files"
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
-    transcription = Column(String, nullable=True)
+    uploaded_at = Column(DateTime, default=datetime.utcnow, index=True)
     language = Column(String, nullable=True)
     summary = Column(String, nullable=True)
     questions = Column(String, nullable=True)
     word_count = Column(Integer, default=0)
-    processing_stage = Column(String, default="uploading")  # uploading, downloading_model, transcribing, analyzing, complete, error
+    processing_stage = Column(String, default="uploading", index=True)  # uploading, queued, downloading_model, transcribing, analyzing, complete, error, cancelled
     progress_percentage = Column(Integer, default=0)
     file_size = Column(BigInteger, nullable=True)  # File size in bytes
     audio_duration = Column(Float, nullable=True)  # Duration in seconds
     selected_model = Column(String, nullable=True)  # LLM model used for analysis
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 of the uploaded audio
+    storage_key = Column(String, nullable=True, unique=True, index=True)  # Name of the upload on disk, independent of filename
+    vad_skipped_ratio = Column(Float, nullable=True)  # Fraction of the audio VAD kept away from Whisper
+    stage_timings = Column(String, nullable=True)  # JSON of seconds spent per processing stage
+    # Transcript and segments live compressed in transcript_blobs, loaded only when read
+    blobs = relationship("TranscriptBlob", collection_class=attribute_keyed_dict("kind"), cascade="all, delete-orphan")
+
+    def _get_blob(self, kind: str):
+        blob = self.blobs.get(kind)
+        return blobs.unpack(blob.codec, blob.data) if blob else None
+
+    def _set_blob(self, kind: str, value: str):
+        if value is None:
+            self.blobs.pop(kind, None)
+            return
+        blob = self.blobs.get(kind)
+        if blob is None:
+            blob = self.blobs[kind] = TranscriptBlob(kind=kind)
+        blob.codec, blob.data = blobs.pack(value)
+        blob.size = len(value)
+
+    transcription = property(lambda self: self._get_blob("transcription"),
+                             lambda self, value: self._set_blob("transcription", value))
+    # JSON list of timestamped transcript segments
+    segments = property(lambda self: self._get_blob("segments"),
+                        lambda self, value: self._set_blob("segments", value))
+
+class TranscriptBlob(Base):
+    __tablename__ = "transcript_blobs"
+
+    audio_id = Column(Integer, ForeignKey("audio_files.id"), primary_key=True)
+    kind = Column(String, primary_key=True)  # transcription, segments
+    codec = Column(String)  # zstd, zlib
+    size = Column(Integer)  # Uncompressed length in characters
+    data = Column(LargeBinary)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_id = Column(Integer, ForeignKey("audio_files.id"), index=True)
+    stage = Column(String, default="transcription")  # transcription, analysis
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed, cancelled
+    estimated_cost = Column(Float, default=0)  # Audio seconds for transcription, words for analysis
+    file_path = Column(String, nullable=True)
+    selected_model = Column(String, nullable=True)
+    num_questions = Column(Integer, default=3)
+    auto_generate_questions = Column(Boolean, default=True)
+    attempts = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class TranscriptionCache(Base):
+    __tablename__ = "transcription_cache"
+    __table_args__ = (UniqueConstraint("audio_hash", "whisper_model", "llm_model"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_hash = Column(String, index=True)
+    whisper_model = Column(String)
+    llm_model = Column(String)
+    transcription_codec = Column(String, nullable=True)  # zstd, zlib
+    transcription_data = Column(LargeBinary, nullable=True)
+    segments_codec = Column(String, nullable=True)
+    segments_data = Column(LargeBinary, nullable=True)
+    transcription = CompressedText()
+    segments = CompressedText()  # JSON list of timestamped transcript segments
+    language = Column(String, nullable=True)
+    summary = Column(String, nullable=True)
+    questions = Column(String, nullable=True)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+
+class TranscriptChunk(Base):
+    __tablename__ = "transcript_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_id = Column(Integer, ForeignKey("audio_files.id"), index=True)
+    position = Column(Integer)  # Order of the passage in the transcript
+    text = Column(String)
+    start = Column(Float, nullable=True)  # Seconds, when segment timestamps are known
+    end = Column(Float, nullable=True)
+    embedding = Column(LargeBinary, nullable=True)  # float32 vector from the embedding model
+    term_counts = Column(String, nullable=True)  # JSON token -> occurrences, for BM25
+    token_count = Column(Integer, nullable=True)
+
+class LLMResponseCache(Base):
+    __tablename__ = "llm_response_cache"
+
+    key = Column(String, primary_key=True)  # SHA-256 of model, prompt and sampling options
+    model = Column(String, index=True)
+    response = Column(String)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
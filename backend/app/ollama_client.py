@@ -0,0 +1,335 @@
+import os
+import json
+import random
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Callable, List
+import httpx
+from . import cancellation
+from .cancellation import JobCancelled
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+# Connection pool shared by every Ollama call
+OLLAMA_MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '16'))
+# Generations allowed in flight per model, so the GPU isn't oversubscribed
+OLLAMA_MAX_INFLIGHT_PER_MODEL = int(os.getenv('OLLAMA_MAX_INFLIGHT_PER_MODEL', '2'))
+OLLAMA_MAX_RETRIES = int(os.getenv('OLLAMA_MAX_RETRIES', '2'))
+OLLAMA_RETRY_BACKOFF = float(os.getenv('OLLAMA_RETRY_BACKOFF', '0.5'))
+# Generation timeout: a base plus an allowance per 1000 prompt tokens and per 100 generated tokens
+OLLAMA_BASE_TIMEOUT = float(os.getenv('OLLAMA_BASE_TIMEOUT', '30'))
+OLLAMA_TIMEOUT_PER_1K_PROMPT_TOKENS = float(os.getenv('OLLAMA_TIMEOUT_PER_1K_PROMPT_TOKENS', '10'))
+OLLAMA_TIMEOUT_PER_100_OUTPUT_TOKENS = float(os.getenv('OLLAMA_TIMEOUT_PER_100_OUTPUT_TOKENS', '5'))
+# Longest silence tolerated between streamed tokens (covers prompt prefill before the first one)
+OLLAMA_STREAM_READ_TIMEOUT = float(os.getenv('OLLAMA_STREAM_READ_TIMEOUT', '120'))
+
+# Status codes worth retrying: overload and transient server errors
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_DEFAULT_OUTPUT_TOKENS = 512
+
+
+class OllamaError(Exception):
+    """Raised when Ollama answers with an error status"""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"Ollama API error {status_code}: {message}".strip())
+        self.status_code = status_code
+
+
+def generation_timeout(prompt: str, options: dict = None) -> float:
+    """Timeout sized to the prompt length and the expected output length"""
+    prompt_tokens = len(prompt) / 3.5
+    output_tokens = (options or {}).get("num_predict") or _DEFAULT_OUTPUT_TOKENS
+    if output_tokens < 0:
+        output_tokens = _DEFAULT_OUTPUT_TOKENS
+    return (OLLAMA_BASE_TIMEOUT
+            + OLLAMA_TIMEOUT_PER_1K_PROMPT_TOKENS * prompt_tokens / 1000
+            + OLLAMA_TIMEOUT_PER_100_OUTPUT_TOKENS * output_tokens / 100)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, OLLAMA_RETRY_BACKOFF * (2 ** attempt))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, OllamaError):
+        return error.status_code in _RETRYABLE_STATUS
+    # A read timeout means Ollama was busy generating; retrying would only pile up more work
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout))
+
+
+def _check(response: httpx.Response) -> httpx.Response:
+    if response.status_code != 200:
+        raise OllamaError(response.status_code, response.text[:200])
+    return response
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class FairSlots:
+    """Counting semaphore shared by threads and coroutines that grants slots in arrival order.
+
+    A released slot is handed straight to the oldest waiter, so neither kind of caller can starve the other.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._held = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def enqueue(self, wake: Callable[[], None]):
+        """Take a free slot (returns None) or queue up; wake is called from the releasing thread once granted"""
+        with self._lock:
+            if self._held < self.size and not self._waiters:
+                self._held += 1
+                return None
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            return waiter
+
+    def withdraw(self, waiter: _Waiter):
+        """Give up waiting; a slot granted in the meantime is passed on"""
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        self.release()
+
+    def release(self):
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._held -= 1
+                    return
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+            try:
+                waiter.wake()
+                return
+            except RuntimeError:
+                # The waiter's event loop is closed; the slot goes to the next one
+                continue
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class OllamaClient:
+    """Pooled sync and async client for the Ollama HTTP API"""
+
+    def __init__(self, base_url: str = OLLAMA_URL, max_connections: int = OLLAMA_MAX_CONNECTIONS,
+                 max_inflight_per_model: int = OLLAMA_MAX_INFLIGHT_PER_MODEL, max_retries: int = OLLAMA_MAX_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.max_inflight_per_model = max_inflight_per_model
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = None
+        self._async_client = None
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, limits=self._limits, timeout=OLLAMA_BASE_TIMEOUT)
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(base_url=self.base_url, limits=self._limits, timeout=OLLAMA_BASE_TIMEOUT)
+            return self._async_client
+
+    def _slot(self, model: str) -> FairSlots:
+        with self._lock:
+            if model not in self._slots:
+                self._slots[model] = FairSlots(self.max_inflight_per_model)
+            return self._slots[model]
+
+    @contextmanager
+    def model_slot(self, model: str):
+        """Hold one of the model's generation slots; a cancelled job stops waiting for one"""
+        slots = self._slot(model)
+        granted = threading.Event()
+        waiter = slots.enqueue(granted.set)
+        try:
+            while waiter and not granted.wait(0.2):
+                cancellation.checkpoint()
+        except BaseException:
+            slots.withdraw(waiter)
+            raise
+        try:
+            yield
+        finally:
+            slots.release()
+
+    @asynccontextmanager
+    async def amodel_slot(self, model: str):
+        """Async version of model_slot, queued in the same per-model line as sync callers"""
+        slots = self._slot(model)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        waiter = slots.enqueue(lambda: loop.call_soon_threadsafe(_resolve, granted))
+        try:
+            if waiter:
+                await granted
+        except BaseException:
+            slots.withdraw(waiter)
+            raise
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def request(self, method: str, path: str, json: dict = None, timeout: float = None, retries: int = None) -> httpx.Response:
+        """Send a request, retrying connection failures and overload responses with jittered backoff"""
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                return _check(self.client.request(method, path, json=json, timeout=timeout or OLLAMA_BASE_TIMEOUT))
+            except Exception as e:
+                if attempt >= retries or not _is_retryable(e):
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Ollama {method} {path} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def arequest(self, method: str, path: str, json: dict = None, timeout: float = None, retries: int = None) -> httpx.Response:
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                return _check(await self.async_client.request(method, path, json=json, timeout=timeout or OLLAMA_BASE_TIMEOUT))
+            except Exception as e:
+                if attempt >= retries or not _is_retryable(e):
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Ollama {method} {path} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def generate(self, model: str, prompt: str, options: dict = None, timeout: float = None, retries: int = None, **extra) -> dict:
+        """Run a generation and return Ollama's JSON response.
+
+        Inside a cancellable job the generation is streamed, so cancelling the job closes
+        the connection (Ollama stops generating) and frees the model slot right away.
+        """
+        token = cancellation.current()
+        if token is not None:
+            return self._generate_cancellable(token, model, prompt, options, **extra)
+        payload = {"model": model, "prompt": prompt, "stream": False, "options": options or {}, **extra}
+        with self.model_slot(model):
+            response = self.request("POST", "/api/generate", json=payload,
+                                    timeout=timeout or generation_timeout(prompt, options), retries=retries)
+        return response.json()
+
+    def _generate_cancellable(self, token: cancellation.CancellationToken, model: str, prompt: str, options: dict = None, **extra) -> dict:
+        payload = {"model": model, "prompt": prompt, "stream": True, "options": options or {}, **extra}
+        with self.model_slot(model):
+            for attempt in range(self.max_retries + 1):
+                token.raise_if_cancelled()
+                try:
+                    return self._stream_until_done(token, payload)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    token.raise_if_cancelled()
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    delay = _backoff_delay(attempt)
+                    logger.warning(f"Ollama POST /api/generate failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+
+    def _stream_until_done(self, token: cancellation.CancellationToken, payload: dict) -> dict:
+        """Read a streamed generation into one response dict, aborting the connection on cancellation"""
+        timeout = httpx.Timeout(OLLAMA_BASE_TIMEOUT, read=OLLAMA_STREAM_READ_TIMEOUT)
+        parts = []
+        with self.client.stream("POST", "/api/generate", json=payload, timeout=timeout) as response:
+            # Closing the response from the cancelling thread unblocks the read below
+            unregister = token.on_cancel(response.close)
+            try:
+                if response.status_code != 200:
+                    response.read()
+                    _check(response)
+                for line in response.iter_lines():
+                    token.raise_if_cancelled()
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(500, chunk["error"])
+                    parts.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        return {**chunk, "response": "".join(parts)}
+            finally:
+                unregister()
+        token.raise_if_cancelled()
+        raise httpx.RemoteProtocolError("Ollama closed the stream before it was done")
+
+    async def agenerate(self, model: str, prompt: str, options: dict = None, timeout: float = None, retries: int = None, **extra) -> dict:
+        payload = {"model": model, "prompt": prompt, "stream": False, "options": options or {}, **extra}
+        async with self.amodel_slot(model):
+            response = await self.arequest("POST", "/api/generate", json=payload,
+                                           timeout=timeout or generation_timeout(prompt, options), retries=retries)
+        return response.json()
+
+    async def astream_generate(self, model: str, prompt: str, options: dict = None, **extra) -> AsyncIterator[dict]:
+        """Stream a generation, yielding each JSON chunk Ollama sends until the one marked done"""
+        payload = {"model": model, "prompt": prompt, "stream": True, "options": options or {}, **extra}
+        timeout = httpx.Timeout(OLLAMA_BASE_TIMEOUT, read=OLLAMA_STREAM_READ_TIMEOUT)
+        async with self.amodel_slot(model):
+            async with self.async_client.stream("POST", "/api/generate", json=payload, timeout=timeout) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    _check(response)
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(500, chunk["error"])
+                    yield chunk
+                    if chunk.get("done"):
+                        return
+
+    def tags(self, timeout: float = 10) -> List[dict]:
+        """Models pulled into Ollama"""
+        return self.request("GET", "/api/tags", timeout=timeout).json().get("models", [])
+
+    async def atags(self, timeout: float = 10) -> List[dict]:
+        return (await self.arequest("GET", "/api/tags", timeout=timeout)).json().get("models", [])
+
+    def pull(self, model: str, timeout: float = 600) -> dict:
+        return self.request("POST", "/api/pull", json={"name": model, "stream": False}, timeout=timeout, retries=0).json()
+
+    def embed(self, model: str, texts: List[str], timeout: float = 60) -> List[List[float]]:
+        return self.request("POST", "/api/embed", json={"model": model, "input": texts}, timeout=timeout).json().get("embeddings", [])
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client:
+            client.close()
+
+    async def aclose(self):
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client:
+            await client.aclose()
+
+
+# Process-wide client so every call reuses the same connection pool and model limits
+ollama = OllamaClient()
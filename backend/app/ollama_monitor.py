@@ -0,0 +1,158 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List
+from .ollama_client import ollama, OllamaError
+from .cancellation import JobCancelled
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background refreshes of Ollama's state
+OLLAMA_MONITOR_INTERVAL = float(os.getenv('OLLAMA_MONITOR_INTERVAL', '15'))
+# How long Ollama keeps a model loaded after we warm it
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+# Result of a pull or warm-up whose leader was cancelled; its waiters start it again
+_RELEASED = object()
+
+
+def _matches(model: str, name: str) -> bool:
+    """Same loose matching as before: 'llama3.2:1b' matches itself, 'smollm' matches 'smollm:latest'"""
+    return model in name or name.startswith(model)
+
+
+class OllamaMonitor:
+    """Tracks Ollama reachability, pulled models and loaded models in the background.
+
+    Callers read the cached state instantly; pulls and warm-ups are deduplicated so
+    several jobs needing the same model share one request.
+    """
+
+    def __init__(self, interval: float = OLLAMA_MONITOR_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._state = {"reachable": False, "models": [], "loaded": [], "last_checked": None, "last_error": None}
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ollama-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.interval):
+                return
+
+    def refresh(self) -> dict:
+        """Probe Ollama once and update the shared state"""
+        try:
+            models = [m.get('name', '') for m in ollama.tags(timeout=5)]
+            try:
+                loaded = [m.get('name', '') for m in ollama.request("GET", "/api/ps", timeout=5, retries=0).json().get('models', [])]
+            except OllamaError:
+                loaded = []  # Older Ollama versions have no /api/ps
+            update = {"reachable": True, "models": models, "loaded": loaded, "last_error": None}
+        except Exception as e:
+            update = {"reachable": False, "loaded": [], "last_error": str(e)}
+        with self._lock:
+            if update["reachable"] != self._state["reachable"]:
+                logger.info(f"Ollama is {'reachable' if update['reachable'] else 'unreachable'}")
+            self._state.update(update)
+            self._state["last_checked"] = time.time()
+            return dict(self._state)
+
+    def snapshot(self) -> dict:
+        """Current state; probes once if the monitor has not run yet"""
+        with self._lock:
+            checked = self._state["last_checked"] is not None
+            state = dict(self._state)
+        return state if checked else self.refresh()
+
+    def is_reachable(self) -> bool:
+        return self.snapshot()["reachable"]
+
+    def _find(self, model: str, names: List[str]) -> bool:
+        return any(_matches(model, name) for name in names)
+
+    def is_pulled(self, model: str) -> bool:
+        return self._find(model, self.snapshot()["models"])
+
+    def is_loaded(self, model: str) -> bool:
+        return self._find(model, self.snapshot()["loaded"])
+
+    def _once(self, key, action) -> bool:
+        """Run action for key unless the same action is already running, in which case wait for it.
+
+        If the job running the action is cancelled, one of the waiters takes it over.
+        """
+        while True:
+            with self._lock:
+                pending = self._pending.get(key)
+                leader = pending is None
+                if leader:
+                    pending = self._pending[key] = Future()
+            if leader:
+                break
+            result = pending.result()
+            if result is not _RELEASED:
+                return result
+        # Anything but a result or an Ollama error (a cancelled job) releases the key to the waiters
+        result = _RELEASED
+        try:
+            result = action()
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Ollama {key[0]} of {key[1]} failed: {e}")
+            result = False
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.set_result(result)
+        return result
+
+    def ensure_pulled(self, model: str, timeout: float = 600) -> bool:
+        """Pull the model unless it is already present; concurrent callers share one pull"""
+        if self.is_pulled(model):
+            return True
+
+        def pull():
+            logger.info(f"Model {model} not found, pulling...")
+            ollama.pull(model, timeout=timeout)
+            self.refresh()
+            return self.is_pulled(model)
+
+        return self._once(("pull", model), pull)
+
+    def ensure_loaded(self, model: str, timeout: float = 60) -> bool:
+        """Load the model into memory unless Ollama already has it warm"""
+        if self.is_loaded(model):
+            return True
+
+        def warm():
+            # An empty prompt makes Ollama load the model without generating anything
+            ollama.generate(model, "", timeout=timeout, retries=0, keep_alive=OLLAMA_KEEP_ALIVE)
+            self.refresh()
+            return True
+
+        return self._once(("load", model), warm)
+
+    def prepare(self, model: str) -> bool:
+        """Make sure the model can serve requests; instant when it is already pulled and warm"""
+        if not self.is_reachable():
+            return False
+        return self.ensure_pulled(model) and self.ensure_loaded(model)
+
+
+# Process-wide monitor shared by the pipeline and the API
+monitor = OllamaMonitor()
@@ -0,0 +1,93 @@
+import os
+import glob
+import logging
+import subprocess
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper's input format: 16 kHz mono float32
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 4
+# Where decoded PCM is cached; next to the upload when unset (point it at a tmpfs to keep it in RAM)
+PCM_CACHE_DIR = os.getenv('PCM_CACHE_DIR', '')
+
+
+def pcm_path(path: str) -> str:
+    """Location of the decoded PCM cache for an upload"""
+    if PCM_CACHE_DIR:
+        return os.path.join(PCM_CACHE_DIR, os.path.basename(path) + ".f32")
+    return path + ".f32"
+
+
+def decode(path: str) -> str:
+    """Decode an upload to raw 16 kHz mono float32 PCM once and return the cache file path.
+
+    ffmpeg writes to a temporary file that is renamed when complete, so an interrupted
+    decode is never mistaken for a cached one.
+    """
+    dest = pcm_path(path)
+    if os.path.exists(dest):
+        return dest
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    partial = dest + ".part"
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-threads", "0", "-i", path,
+           "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-y", partial]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        _remove(partial)
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='replace').strip()}") from e
+    os.replace(partial, dest)
+    logger.info(f"Decoded {path} to {dest} ({duration(dest):.1f}s of audio)")
+    return dest
+
+
+def open_pcm(cache_path: str) -> np.ndarray:
+    """Read-only memory map of a decoded PCM file; samples are paged in from disk as they are read"""
+    if os.path.getsize(cache_path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(cache_path, dtype=np.float32, mode="r")
+
+
+def load(path: str) -> np.ndarray:
+    """Memory-mapped PCM for an upload, decoding it first if needed"""
+    return open_pcm(decode(path))
+
+
+def duration(cache_path: str) -> float:
+    """Seconds of audio in a decoded PCM file, from its size alone"""
+    return os.path.getsize(cache_path) / BYTES_PER_SAMPLE / SAMPLE_RATE
+
+
+def cached_duration(path: str) -> float:
+    """Duration of an upload if it has been decoded already, else 0"""
+    cache = pcm_path(path)
+    return duration(cache) if os.path.exists(cache) else 0.0
+
+
+def variant_path(path: str, variant: str) -> str:
+    """Cache file for derived PCM of an upload, e.g. its speech-only version"""
+    return pcm_path(path)[:-len(".f32")] + f".{variant}.f32"
+
+
+def save_variant(path: str, variant: str, audio: np.ndarray) -> str:
+    """Write derived PCM next to the upload's cache so worker processes can map it by path"""
+    dest = variant_path(path, variant)
+    np.ascontiguousarray(audio, dtype=np.float32).tofile(dest)
+    return dest
+
+
+def remove(path: str):
+    """Delete an upload's PCM cache and derived variants, if any"""
+    cache = pcm_path(path)
+    for file_path in [cache, cache + ".part"] + glob.glob(glob.escape(cache[:-len(".f32")]) + ".*.f32"):
+        _remove(file_path)
+
+
+def _remove(file_path: str):
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            logger.error(f"Failed to delete {file_path}: {e}")
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Stages after which a file stops producing progress events
+TERMINAL_STAGES = {"complete", "error", "cancelled", "deleted"}
+# Events buffered per subscriber before the oldest are dropped for a slow client
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class ProgressBus:
+    """In-memory fan-out of progress events from pipeline workers to API subscribers.
+
+    Workers publish from any thread; each subscriber gets an asyncio queue fed on its
+    own event loop. The latest event per file is kept so readers never hit the DB.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._subscribers = set()
+
+    def publish(self, audio_id: int, stage: str, progress: int, **extra) -> dict:
+        """Record a file's stage and percentage and push it to every interested subscriber"""
+        event = {"id": audio_id, "processing_stage": stage, "progress_percentage": progress, "timestamp": time.time(), **extra}
+        with self._lock:
+            self._latest[audio_id] = event
+            subscribers = list(self._subscribers)
+        for loop, queue, wanted in subscribers:
+            if wanted is None or wanted == audio_id:
+                try:
+                    loop.call_soon_threadsafe(_offer, queue, event)
+                except RuntimeError:
+                    pass  # The subscriber's loop is closed; it unsubscribes on its way out
+        return event
+
+    def latest(self, audio_id: int) -> Optional[dict]:
+        with self._lock:
+            event = self._latest.get(audio_id)
+        return dict(event) if event else None
+
+    def snapshot(self, audio_id: int = None) -> list:
+        """Latest event of one file, or of every file seen since startup"""
+        with self._lock:
+            if audio_id is None:
+                events = list(self._latest.values())
+            else:
+                events = [self._latest[audio_id]] if audio_id in self._latest else []
+        return [dict(e) for e in events]
+
+    def forget(self, audio_id: int):
+        """Drop a deleted file's state"""
+        with self._lock:
+            self._latest.pop(audio_id, None)
+
+    @asynccontextmanager
+    async def subscribe(self, audio_id: int = None):
+        """Queue receiving events for one file (or all files) while the context is open"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue, audio_id)
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _offer(queue: asyncio.Queue, event: dict):
+    """Enqueue without blocking, dropping the oldest event when a client falls behind"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+# Process-wide bus shared by the workers and the API
+progress_bus = ProgressBus()
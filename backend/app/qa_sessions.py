@@ -0,0 +1,172 @@
+import os
+import time
+import uuid
+import array
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+from .analytics import DEFAULT_MODEL, OLLAMA_NUM_CTX, agenerate_in_context, answer_prompt, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Seconds a session may stay unused before it is dropped
+QA_SESSION_IDLE_TIMEOUT = int(os.getenv('QA_SESSION_IDLE_TIMEOUT', '1800'))
+# Memory budget for all sessions' Ollama contexts and transcript prefixes, in MB
+QA_SESSION_MEMORY_MB = float(os.getenv('QA_SESSION_MEMORY_MB', '64'))
+# How long Ollama keeps the model (and the session's KV cache) loaded after each answer
+QA_SESSION_KEEP_ALIVE = os.getenv('QA_SESSION_KEEP_ALIVE', '30m')
+# Room left in the context window for each follow-up answer; once it is gone the conversation restarts from the transcript
+QA_ANSWER_TOKENS = int(os.getenv('QA_ANSWER_TOKENS', '256'))
+
+NO_ANSWER = "Aucune réponse disponible."
+
+
+def follow_up_prompt(question: str, passages: str = None) -> str:
+    if passages:
+        return f"""Nouveaux extraits du même texte:
+    {passages}
+
+    Question suivante, à partir de ces extraits et des précédents: {question}
+
+    Réponse:"""
+    return f"""Question suivante, toujours à partir du même texte: {question}
+
+    Réponse:"""
+
+
+class QASession:
+    """A conversation about one transcript; follow-ups continue from the Ollama context of the previous answer.
+
+    Transcripts too long for one prompt have no prefix: retrieve returns the passages relevant to each question instead.
+    """
+
+    def __init__(self, audio_id: int, prefix: str, model: str, retrieve: Callable[[str], str] = None):
+        self.id = uuid.uuid4().hex
+        self.audio_id = audio_id
+        self.prefix = prefix
+        self.model = model
+        self.retrieve = retrieve
+        self.context = None  # Token ids of the conversation so far, as returned by Ollama
+        self.turns = 0
+        self.created_at = time.time()
+        self.last_used_at = self.created_at
+        self.lock = asyncio.Lock()
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.prefix) + (self.context.itemsize * len(self.context) if self.context else 0)
+
+    def next_prompt(self, question: str, passages: str = None) -> str:
+        """The transcript (or the passages) on the first turn or once the context is full, only the new text afterwards"""
+        added = estimate_tokens(question) + (estimate_tokens(passages) if passages else 0)
+        if self.context is not None and len(self.context) + added + QA_ANSWER_TOKENS <= OLLAMA_NUM_CTX:
+            return follow_up_prompt(question, passages)
+        if self.context is not None:
+            logger.info(f"Session {self.id} filled the context window, starting again from the transcript")
+        self.context = None
+        return answer_prompt(passages if self.retrieve else self.prefix, question)
+
+    def describe(self) -> dict:
+        return {
+            "session_id": self.id,
+            "audio_id": self.audio_id,
+            "model": self.model,
+            "mode": "retrieval" if self.retrieve else "transcript",
+            "turns": self.turns,
+            "context_tokens": len(self.context) if self.context else 0,
+            "idle_seconds": round(time.time() - self.last_used_at, 1),
+        }
+
+
+class QASessionStore:
+    """Open Q&A sessions, dropped after an idle timeout or least recently used first beyond the memory budget.
+
+    Expiry is checked whenever a session is opened or looked up, so no background thread is needed.
+    """
+
+    def __init__(self, idle_timeout: int = QA_SESSION_IDLE_TIMEOUT, memory_mb: float = QA_SESSION_MEMORY_MB,
+                 keep_alive: str = QA_SESSION_KEEP_ALIVE):
+        self.idle_timeout = idle_timeout
+        self.memory_limit_bytes = int(memory_mb * 1024 * 1024)
+        self.keep_alive = keep_alive
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, audio_id: int, prefix: str, model: str = DEFAULT_MODEL, retrieve: Callable[[str], str] = None) -> QASession:
+        session = QASession(audio_id, prefix, model, retrieve)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict()
+        logger.info(f"Opened Q&A session {session.id} for audio_id {audio_id}")
+        return session
+
+    def get(self, session_id: str) -> Optional[QASession]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session:
+                session.last_used_at = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def close_file(self, audio_id: int) -> int:
+        """Drop every session about a file, e.g. when it is deleted"""
+        with self._lock:
+            ids = [sid for sid, s in self._sessions.items() if s.audio_id == audio_id]
+            for sid in ids:
+                del self._sessions[sid]
+        return len(ids)
+
+    def _evict(self):
+        """Drop expired sessions, then the least recently used idle ones until under budget. Caller holds the lock."""
+        now = time.time()
+        if self.idle_timeout:
+            for sid in [sid for sid, s in self._sessions.items() if now - s.last_used_at > self.idle_timeout]:
+                del self._sessions[sid]
+                logger.info(f"Q&A session {sid} expired")
+        total = sum(s.memory_bytes for s in self._sessions.values())
+        # Oldest first; the session being answered is never evicted mid-question
+        for sid, session in list(self._sessions.items()):
+            if total <= self.memory_limit_bytes or len(self._sessions) <= 1:
+                break
+            if session.lock.locked():
+                continue
+            total -= session.memory_bytes
+            del self._sessions[sid]
+            logger.info(f"Evicted Q&A session {sid} to stay under the memory budget")
+
+    async def ask(self, session: QASession, question: str) -> dict:
+        """Answer a question in the session; only the new question is prefilled after the first turn"""
+        async with session.lock:
+            passages = await asyncio.to_thread(session.retrieve, question) if session.retrieve else None
+            prompt = session.next_prompt(question, passages)
+            context = list(session.context) if session.context is not None else None
+            response = await agenerate_in_context(prompt, session.model, context, self.keep_alive)
+            answer = response.get("response", "").strip()
+            if not answer:
+                # A failed turn keeps the previous context, so the next question continues from the last answer
+                return {"answer": NO_ANSWER, "turn": session.turns, "prompt_tokens": None}
+            if response.get("context"):
+                session.context = array.array("i", response["context"])
+            session.turns += 1
+            session.last_used_at = time.time()
+        with self._lock:
+            self._evict()
+        return {"answer": answer, "turn": session.turns, "prompt_tokens": response.get("prompt_eval_count")}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_mb": round(sum(s.memory_bytes for s in self._sessions.values()) / 1024 / 1024, 2),
+            }
+
+
+# Process-wide session store used by the API
+qa_sessions = QASessionStore()
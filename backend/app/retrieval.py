@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import math
+import logging
+import unicodedata
+from collections import Counter
+from typing import List
+import numpy as np
+from sqlalchemy.orm import Session
+from . import crud, models
+from .ollama_client import ollama
+
+logger = logging.getLogger(__name__)
+
+# Passage size and overlap in words
+PASSAGE_WORDS = int(os.getenv('RETRIEVAL_PASSAGE_WORDS', '120'))
+PASSAGE_OVERLAP = int(os.getenv('RETRIEVAL_PASSAGE_OVERLAP', '20'))
+# Passages placed in the /ask prompt
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '4'))
+# Optional local embedding model served by Ollama (e.g. nomic-embed-text); BM25 only when unset
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', '')
+# Weight of the embedding similarity in the hybrid score
+EMBEDDING_WEIGHT = float(os.getenv('RETRIEVAL_EMBEDDING_WEIGHT', '0.5'))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_STOPWORDS = {
+    "le", "la", "les", "de", "des", "du", "un", "une", "et", "en", "est", "que", "qui", "dans", "pour",
+    "pas", "sur", "au", "aux", "ce", "ces", "il", "elle", "on", "nous", "vous", "ils", "se", "sa", "son",
+    "the", "a", "an", "of", "and", "to", "in", "is", "it", "that", "for", "on", "with", "as", "what",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-folded word tokens without stopwords"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r"\w+", text) if t not in _STOPWORDS and len(t) > 1]
+
+
+def split_passages(transcription: str, segments: list = None) -> List[dict]:
+    """Cut a transcript into overlapping word windows, keeping timestamps when segments are known"""
+    if segments:
+        words = [(w, seg["start"], seg["end"]) for seg in segments for w in seg["text"].split()]
+    else:
+        words = [(w, None, None) for w in transcription.split()]
+
+    passages = []
+    step = max(1, PASSAGE_WORDS - PASSAGE_OVERLAP)
+    for start in range(0, len(words), step):
+        window = words[start:start + PASSAGE_WORDS]
+        passages.append({
+            "text": " ".join(w for w, _, _ in window),
+            "start": window[0][1],
+            "end": window[-1][2],
+        })
+        if start + PASSAGE_WORDS >= len(words):
+            break
+    return passages
+
+
+def embed_texts(texts: List[str]) -> List[np.ndarray]:
+    """Embed texts with the local Ollama embedding model, or return [] when none is configured"""
+    if not EMBEDDING_MODEL or not texts:
+        return []
+    try:
+        return [np.asarray(v, dtype=np.float32) for v in ollama.embed(EMBEDDING_MODEL, texts)]
+    except Exception as e:
+        logger.error(f"Error computing embeddings: {e}")
+    return []
+
+
+def index_transcript(db: Session, audio_id: int) -> int:
+    """Chunk a completed transcript and store its passages, their term counts (and embeddings) for retrieval"""
+    audio = crud.get_audio_file(db, audio_id)
+    if not audio or not audio.transcription or audio.transcription.startswith('['):
+        return 0
+    segments = json.loads(audio.segments) if audio.segments else None
+    passages = split_passages(audio.transcription, segments)
+    embeddings = embed_texts([p["text"] for p in passages])
+    if len(embeddings) != len(passages):
+        embeddings = [None] * len(passages)
+    tokens = [tokenize(p["text"]) for p in passages]
+    crud.replace_transcript_chunks(db, audio_id, [
+        models.TranscriptChunk(
+            audio_id=audio_id,
+            position=i,
+            text=p["text"],
+            start=p["start"],
+            end=p["end"],
+            embedding=vector.tobytes() if vector is not None else None,
+            term_counts=json.dumps(Counter(words)),
+            token_count=len(words)
+        )
+        for i, (p, vector, words) in enumerate(zip(passages, embeddings, tokens))
+    ])
+    logger.info(f"Indexed {len(passages)} passages for audio_id {audio_id}")
+    return len(passages)
+
+
+def bm25_scores(query_tokens: List[str], term_counts: List[dict], lengths: List[int]) -> np.ndarray:
+    """Okapi BM25 score of each document for the query, from the term counts stored at indexing time"""
+    n = len(term_counts)
+    scores = np.zeros(n, dtype=np.float32)
+    if not n or not query_tokens:
+        return scores
+    avg_len = sum(lengths) / n or 1.0
+    for term in set(query_tokens):
+        doc_freq = sum(1 for tf in term_counts if term in tf)
+        if not doc_freq:
+            continue
+        idf = math.log(1 + (n - doc_freq + 0.5) / (doc_freq + 0.5))
+        for i, tf in enumerate(term_counts):
+            freq = tf.get(term, 0)
+            if freq:
+                scores[i] += idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / avg_len))
+    return scores
+
+
+def search(db: Session, audio_id: int, question: str, top_k: int = RETRIEVAL_TOP_K) -> List[models.TranscriptChunk]:
+    """Return the passages most relevant to the question, in transcript order"""
+    chunks = crud.get_transcript_chunks(db, audio_id)
+    if not chunks and index_transcript(db, audio_id):
+        chunks = crud.get_transcript_chunks(db, audio_id)
+    if len(chunks) <= top_k:
+        return chunks
+
+    scores = bm25_scores(tokenize(question), [json.loads(c.term_counts) for c in chunks], [c.token_count for c in chunks])
+    if scores.max() > 0:
+        scores = scores / scores.max()
+
+    if all(c.embedding for c in chunks):
+        query_vectors = embed_texts([question])
+        if query_vectors:
+            matrix = np.stack([np.frombuffer(c.embedding, dtype=np.float32) for c in chunks])
+            query = query_vectors[0]
+            similarity = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-8)
+            scores = (1 - EMBEDDING_WEIGHT) * scores + EMBEDDING_WEIGHT * similarity
+
+    best = np.argsort(-scores)[:top_k]
+    return [chunks[i] for i in sorted(best)]
+
+
+def build_context(db: Session, audio_id: int, question: str, top_k: int = RETRIEVAL_TOP_K) -> str:
+    """Join the retrieved passages into the text given to the LLM"""
+    return "\n\n".join(chunk.text for chunk in search(db, audio_id, question, top_k))
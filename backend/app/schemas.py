@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
+import json
 
 class AudioFileBase(BaseModel):
     filename: str
@@ -7,19 +8,42 @@ class AudioFileBase(BaseModel):
 class AudioFileCreate(AudioFileBase):
     selected_model: str | None = None
 
-class AudioFile(AudioFileBase):
+class AudioFileSummary(AudioFileBase):
+    """File listing entry, without the transcript and analysis text"""
     id: int
     uploaded_at: datetime
-    transcription: str | None = None
     language: str | None = None
-    summary: str | None = None
-    questions: str | None = None
     word_count: int | None = None
     processing_stage: str = "uploading"
     progress_percentage: int = 0
     file_size: int | None = None
     audio_duration: float | None = None
     selected_model: str | None = None
+    content_hash: str | None = None
+    vad_skipped_ratio: float | None = None
+
+    class Config:
+        from_attributes = True
+
+class AudioFile(AudioFileSummary):
+    transcription: str | None = None
+    summary: str | None = None
+    questions: str | None = None
+    segments: list[dict] | None = None
+    stage_timings: dict[str, float] | None = None
+
+    @field_validator("segments", "stage_timings", mode="before")
+    @classmethod
+    def parse_json(cls, value):
+        """Segments and stage timings are stored as JSON strings"""
+        if isinstance(value, str):
+            return json.loads(value) if value else None
+        return value
 
     class Config:
         from_attributes = True
+
+class TranscriptAnalysis(BaseModel):
+    """JSON output expected from the single-pass analysis prompt"""
+    summary: str
+    questions: list[str]
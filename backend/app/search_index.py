@@ -0,0 +1,165 @@
+import re
+import html
+import logging
+import weakref
+from typing import List
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from . import blobs
+
+logger = logging.getLogger(__name__)
+
+# Markers around matched terms in snippets
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Placeholders the database puts around matches, replaced by the markers once the text is escaped
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+# Approximate number of words per snippet
+SNIPPET_WORDS = 24
+
+_SQLITE_DDL = [
+    # Standalone FTS5 table keyed by audio_files.id. It keeps its own uncompressed copy of the text,
+    # which snippet() needs: transcripts are stored compressed in transcript_blobs, so an
+    # external-content table can't read them and a contentless one can't make snippets.
+    "CREATE VIRTUAL TABLE IF NOT EXISTS audio_search USING fts5("
+    "transcription, summary, questions, tokenize = 'unicode61 remove_diacritics 2')",
+]
+_POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS audio_search ("
+    "audio_id INTEGER PRIMARY KEY, transcription TEXT, summary TEXT, questions TEXT, "
+    "document tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(summary, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(questions, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(transcription, '')), 'C')) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_audio_search_document ON audio_search USING GIN (document)",
+]
+
+# Engines whose index table is known to exist
+_ready = weakref.WeakSet()
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def create_index(conn: Connection):
+    """Create the full-text table for the connection's database"""
+    for statement in _POSTGRES_DDL if _dialect(conn) == "postgresql" else _SQLITE_DDL:
+        conn.execute(text(statement))
+
+
+def rebuild(conn: Connection) -> int:
+    """Index every completed file from scratch, decompressing their transcripts"""
+    conn.execute(text("DELETE FROM audio_search"))
+    if inspect(conn).has_table("transcript_blobs"):
+        transcript = ("LEFT JOIN transcript_blobs b ON b.audio_id = f.id AND b.kind = 'transcription'", "b.codec, b.data")
+    else:
+        # Databases older than the blob table; the migration that creates it rebuilds the index again
+        transcript = ("", "NULL, NULL")
+    rows = conn.execute(text(
+        f"SELECT f.id, {transcript[1]}, f.summary, f.questions FROM audio_files f {transcript[0]} "
+        "WHERE f.processing_stage = 'complete'"
+    )).all()
+    documents = [
+        {"id": audio_id, "transcription": blobs.unpack(codec, data) if data is not None else None,
+         "summary": summary, "questions": questions}
+        for audio_id, codec, data, summary, questions in rows
+    ]
+    if documents:
+        id_column = "audio_id" if _dialect(conn) == "postgresql" else "rowid"
+        conn.execute(text(
+            f"INSERT INTO audio_search ({id_column}, transcription, summary, questions) "
+            "VALUES (:id, :transcription, :summary, :questions)"
+        ), documents)
+    return len(documents)
+
+
+def _ensure_index(db: Session):
+    engine = db.get_bind().engine
+    if engine not in _ready:
+        create_index(db.connection())
+        _ready.add(engine)
+
+
+def index_document(db: Session, audio_id: int, transcription: str, summary: str, questions: str):
+    """Add or replace a file's entry; runs in the caller's transaction, which commits it"""
+    try:
+        with db.begin_nested():
+            _ensure_index(db)
+            params = {"id": audio_id, "transcription": transcription, "summary": summary, "questions": questions}
+            if _dialect(db.get_bind()) == "postgresql":
+                db.execute(text(
+                    "INSERT INTO audio_search (audio_id, transcription, summary, questions) "
+                    "VALUES (:id, :transcription, :summary, :questions) ON CONFLICT (audio_id) DO UPDATE SET "
+                    "transcription = excluded.transcription, summary = excluded.summary, questions = excluded.questions"
+                ), params)
+            else:
+                db.execute(text("DELETE FROM audio_search WHERE rowid = :id"), params)
+                db.execute(text(
+                    "INSERT INTO audio_search (rowid, transcription, summary, questions) "
+                    "VALUES (:id, :transcription, :summary, :questions)"
+                ), params)
+    except Exception as e:
+        # Search is secondary; never lose the analysis because the index couldn't be updated
+        logger.error(f"Could not index audio_id {audio_id} for search: {e}")
+
+
+def remove_document(db: Session, audio_id: int):
+    try:
+        with db.begin_nested():
+            _ensure_index(db)
+            id_column = "audio_id" if _dialect(db.get_bind()) == "postgresql" else "rowid"
+            db.execute(text(f"DELETE FROM audio_search WHERE {id_column} = :id"), {"id": audio_id})
+    except Exception as e:
+        logger.error(f"Could not remove audio_id {audio_id} from the search index: {e}")
+
+
+def fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word, the last one as a prefix.
+
+    Quoting each term keeps punctuation in user input from being parsed as FTS5 syntax.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def highlight(snippet: str) -> str:
+    """HTML-escape a snippet, then mark the matches the database delimited with placeholders"""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+
+
+def search(db: Session, query: str, limit: int = 20, offset: int = 0) -> List[dict]:
+    """Files matching the query, best first, with HTML-escaped snippets whose matches are marked"""
+    _ensure_index(db)
+    if _dialect(db.get_bind()) == "postgresql":
+        rows = db.execute(text(
+            "SELECT a.id, a.filename, a.uploaded_at, ts_rank(s.document, q) AS score, "
+            "ts_headline('simple', concat_ws(' … ', s.summary, s.questions, s.transcription), q, :options) AS snippet "
+            "FROM audio_search s JOIN audio_files a ON a.id = s.audio_id, websearch_to_tsquery('simple', :query) q "
+            "WHERE s.document @@ q ORDER BY score DESC LIMIT :limit OFFSET :offset"
+        ), {"query": query, "limit": limit, "offset": offset,
+            "options": f"StartSel={_MATCH_START}, StopSel={_MATCH_END}, MaxWords={SNIPPET_WORDS}, MinWords=8, MaxFragments=2"})
+    else:
+        match = fts_query(query)
+        if not match:
+            return []
+        # bm25 is lower for better matches; summary hits weigh twice as much as transcript hits
+        rows = db.execute(text(
+            "SELECT a.id, a.filename, a.uploaded_at, -bm25(audio_search, 1.0, 2.0, 1.0) AS score, "
+            f"snippet(audio_search, -1, :start, :end, '…', {SNIPPET_WORDS}) AS snippet "
+            "FROM audio_search JOIN audio_files a ON a.id = audio_search.rowid "
+            "WHERE audio_search MATCH :match ORDER BY bm25(audio_search, 1.0, 2.0, 1.0) LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset, "start": _MATCH_START, "end": _MATCH_END})
+    return [
+        {"id": row.id, "filename": row.filename, "uploaded_at": row.uploaded_at, "score": round(float(row.score), 4),
+         "snippet": highlight(row.snippet)}
+        for row in rows
+    ]
@@ -0,0 +1,43 @@
+import logging
+from typing import List, Tuple
+import numpy as np
+from .pcm import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+def frame_energy(audio: np.ndarray, frame_samples: int) -> np.ndarray:
+    """RMS energy of consecutive non-overlapping frames"""
+    n_frames = len(audio) // frame_samples
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(audio[:n_frames * frame_samples], dtype=np.float32).reshape(n_frames, frame_samples)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def split_at_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, target_seconds: float = 60.0,
+                     search_seconds: float = 10.0, frame_ms: int = 30) -> List[Tuple[int, int]]:
+    """Split audio into roughly target-sized pieces, cutting at the quietest frame near each boundary.
+
+    Returns (start_sample, end_sample) pairs covering the whole input.
+    """
+    total = len(audio)
+    target = int(target_seconds * sample_rate)
+    if total <= target + int(search_seconds * sample_rate):
+        return [(0, total)]
+
+    frame_samples = max(1, int(sample_rate * frame_ms / 1000))
+    energy = frame_energy(audio, frame_samples)
+    search_frames = max(1, int(search_seconds * sample_rate / frame_samples))
+
+    cuts = []
+    start = 0
+    while total - start > target + search_frames * frame_samples:
+        center = (start + target) // frame_samples
+        lo = max(start // frame_samples + 1, center - search_frames)
+        hi = min(len(energy), center + search_frames + 1)
+        cut = (lo + int(np.argmin(energy[lo:hi]))) * frame_samples if hi > lo else start + target
+        cuts.append((start, cut))
+        start = cut
+    cuts.append((start, total))
+    return cuts
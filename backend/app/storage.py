@@ -0,0 +1,48 @@
+import os
+import hashlib
+import logging
+from typing import BinaryIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Uploads are copied to disk in fixed-size chunks so memory use stays flat
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+# Largest accepted upload in bytes (0 disables the limit)
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_MB', '1024')) * 1024 * 1024
+# Most files accepted by one /upload/batch request
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', '100'))
+# Largest accepted /upload/batch request in bytes, all files together (0 disables the limit)
+MAX_BATCH_BYTES = int(os.getenv('MAX_BATCH_MB', '4096')) * 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+        self.max_bytes = max_bytes
+
+
+def save_upload(source: BinaryIO, dest_path: str, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """Stream an upload to disk, returning its size and SHA-256 computed in the same pass.
+
+    Stops reading as soon as the size limit is crossed and removes the partial file.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest_path, "wb") as buffer:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                hasher.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return size, hasher.hexdigest()
@@ -1,40 +1,147 @@
 import os
 import logging
-import traceback
-from .analytics import simple_summary, generate_questions, check_ollama_status, ensure_model_available, wait_for_model_ready
-from . import crud
+import json
+import time
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .analytics import simple_summary, analyze_transcript, check_ollama_status, ensure_model_available, wait_for_model_ready, DEFAULT_MODEL
+from . import crud, transcription_cache, retrieval
+from .model_registry import registry
+from .transcription_backends import WhisperConfig, get_backend, whisper_config, limit_cpu_threads
+from .segmentation import split_at_silence
+from . import pcm, vad, cancellation, metrics
+from .cancellation import JobCancelled
+from .pcm import SAMPLE_RATE
 from sqlalchemy.orm import Session
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# "single" transcribes the whole file at once, "parallel" splits it at silences and
+# spreads the pieces over a process pool, "auto" goes parallel for long files on CPU
+TRANSCRIPTION_MODE = os.getenv('TRANSCRIPTION_MODE', 'auto')
+PARALLEL_MIN_DURATION = float(os.getenv('PARALLEL_MIN_DURATION', '300'))
+PARALLEL_SEGMENT_SECONDS = float(os.getenv('PARALLEL_SEGMENT_SECONDS', '60'))
+WHISPER_THREADS_PER_WORKER = int(os.getenv('WHISPER_THREADS_PER_WORKER', '2'))
+PARALLEL_WORKERS = int(os.getenv('PARALLEL_WORKERS', '0')) or max(1, (os.cpu_count() or 1) // WHISPER_THREADS_PER_WORKER)
+# Queued files with at most one Whisper window of speech are decoded together, this many per pass (1 disables batching)
+WHISPER_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', '8'))
+# Whisper pads every input to a 30 s window, so anything up to that length costs one decoder pass
+BATCH_MAX_SECONDS = 30.0
+
+_segment_pool = None
+_segment_pool_lock = threading.Lock()
+
+@metrics.span("duration_probe")
 def extract_audio_duration(path: str) -> float:
-    """Extract audio duration using librosa or fallback methods"""
+    """Audio duration in seconds: exact from the decoded PCM when available, else from the container header"""
+    cached = pcm.cached_duration(path)
+    if cached:
+        return cached
     try:
-        import librosa
-        duration = librosa.get_duration(path=path)
-        return duration
-    except ImportError:
-        try:
-            # Fallback to ffprobe if librosa not available
-            import subprocess
-            result = subprocess.run([
-                'ffprobe', '-v', 'quiet', '-show_entries', 
-                'format=duration', '-of', 'csv=p=0', path
-            ], capture_output=True, text=True)
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-        except:
-            pass
+        # ffprobe only reads the header, so queueing an upload doesn't decode it
+        import subprocess
+        result = subprocess.run([
+            'ffprobe', '-v', 'quiet', '-show_entries', 
+            'format=duration', '-of', 'csv=p=0', path
+        ], capture_output=True, text=True)
+        if result.returncode == 0:
+            return float(result.stdout.strip())
     except Exception as e:
         logger.warning(f"Could not extract duration from {path}: {e}")
     
     # Return 0 if we can't determine duration
     return 0.0
 
-def transcribe_file(path: str, db: Session, audio_id: int) -> str:
-    """Transcribe audio file using Whisper AI"""
+def _transcription_result(text: str, segments: list = None, language: str = None, vad_skipped_ratio: float = None) -> dict:
+    """Whisper-style result: text plus timestamped segments and detected language"""
+    return {"text": text, "segments": segments or [], "language": language, "vad_skipped_ratio": vad_skipped_ratio}
+
+def _simplify_segments(segments: list, offset: float = 0.0) -> list:
+    """Keep only the timestamps and text of Whisper segments, shifted by offset seconds"""
+    return [
+        {"start": round(seg["start"] + offset, 2), "end": round(seg["end"] + offset, 2), "text": seg["text"].strip()}
+        for seg in segments
+    ]
+
+def _map_segments(segments: list, speech_map: vad.SpeechMap) -> list:
+    """Move segment timestamps from the speech-only audio back onto the original recording"""
+    if speech_map.is_identity:
+        return segments
+    return [
+        {**seg, "start": round(speech_map.to_original(seg["start"]), 2), "end": round(speech_map.to_original(seg["end"]), 2)}
+        for seg in segments
+    ]
+
+def _init_segment_worker(num_threads: int):
+    """Limit intra-op threads so the pool's workers don't oversubscribe the CPU"""
+    limit_cpu_threads(num_threads)
+
+def _get_segment_pool() -> ProcessPoolExecutor:
+    global _segment_pool
+    with _segment_pool_lock:
+        if _segment_pool is None:
+            _segment_pool = ProcessPoolExecutor(
+                max_workers=PARALLEL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_segment_worker,
+                initargs=(WHISPER_THREADS_PER_WORKER,)
+            )
+    return _segment_pool
+
+def _transcribe_segment(cache_path: str, start: int, end: int, config: WhisperConfig) -> dict:
+    """Transcribe one piece of audio in a pool worker, which keeps its own resident model.
+
+    The worker maps the shared PCM file itself, so only the path and sample range cross the process boundary.
+    """
+    audio = pcm.open_pcm(cache_path)[start:end]
+    with registry.use(config) as model:
+        result = get_backend(config.backend).transcribe(model, audio, config.compute_type)
+    return {"segments": _simplify_segments(result.get("segments", []), start / SAMPLE_RATE), "language": result.get("language")}
+
+def _use_parallel_transcription(duration: float) -> bool:
+    if TRANSCRIPTION_MODE == "parallel":
+        return True
+    return TRANSCRIPTION_MODE == "auto" and whisper_config().device == "cpu" and duration >= PARALLEL_MIN_DURATION
+
+def _transcribe_parallel(cache_path: str, audio, db: Session, audio_id: int) -> dict:
+    """Split the file at silences and transcribe the pieces concurrently, advancing progress per piece"""
+    pieces = split_at_silence(audio, SAMPLE_RATE, PARALLEL_SEGMENT_SECONDS)
+    logger.info(f"Transcribing {cache_path} as {len(pieces)} segments on {PARALLEL_WORKERS} workers")
+
+    pool = _get_segment_pool()
+    futures = {
+        pool.submit(_transcribe_segment, cache_path, start, end, whisper_config()): i
+        for i, (start, end) in enumerate(pieces)
+    }
+    results = [None] * len(pieces)
+    pending = set(futures)
+    try:
+        while pending:
+            # Wake up regularly so a cancelled job stops without waiting for the current pieces
+            finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[futures[future]] = future.result()
+            cancellation.checkpoint()
+            if finished:
+                crud.update_progress(db, audio_id, "transcribing", 25 + int(50 * (len(pieces) - len(pending)) / len(pieces)))
+    except JobCancelled:
+        # Pieces not yet started are dropped; running ones finish in their worker and are discarded
+        for future in pending:
+            future.cancel()
+        raise
+
+    # Stitch the pieces back together in time order
+    segments = [seg for result in results for seg in result["segments"] if seg["text"]]
+    languages = Counter(result["language"] for result in results if result["language"])
+    text = " ".join(seg["text"] for seg in segments)
+    return {"text": text, "segments": segments, "language": languages.most_common(1)[0][0] if languages else None}
+
+def transcribe_file(path: str, db: Session, audio_id: int) -> dict:
+    """Transcribe audio file with the configured Whisper backend"""
     try:
         # Update progress - starting transcription
         crud.update_progress(db, audio_id, "transcribing", 25)
@@ -42,25 +149,47 @@ def transcribe_file(path: str, db: Session, audio_id: int) -> str:
         # Check if file exists
         if not os.path.exists(path):
             logger.error(f"Audio file not found: {path}")
-            return f"[Error: File not found - {os.path.basename(path)}]"
+            return _transcription_result(f"[Error: File not found - {os.path.basename(path)}]")
         
         # Check if file is empty
         if os.path.getsize(path) == 0:
             logger.error(f"Audio file is empty: {path}")
-            return f"[Error: Empty file - {os.path.basename(path)}]"
+            return _transcription_result(f"[Error: Empty file - {os.path.basename(path)}]")
         
         logger.info(f"Starting transcription of {path}")
-        import whisper
-        
-        # Load model with GPU support
-        model = whisper.load_model("base", device="cuda")
-        logger.info("Whisper model loaded successfully with GPU support")
         
-        # Update progress - model loaded
-        crud.update_progress(db, audio_id, "transcribing", 50)
-        
-        # Transcribe
-        result = model.transcribe(path, fp16=True)
+        # Whisper reads the PCM decoded once for this upload rather than running ffmpeg again
+        cache_path = pcm.decode(path)
+        audio = pcm.open_pcm(cache_path)
+        audio_seconds = len(audio) / SAMPLE_RATE
+        # Only speech goes to Whisper; the map puts timestamps back on the original timeline
+        with metrics.span("vad"):
+            audio, speech_map = vad.strip_silence(audio)
+        cancellation.checkpoint()
+        if len(audio) == 0:
+            logger.warning(f"No speech found in {path}")
+            return _transcription_result(f"[No speech detected in {os.path.basename(path)}]", vad_skipped_ratio=speech_map.skipped_ratio)
+        if not speech_map.is_identity:
+            cache_path = pcm.save_variant(path, "speech", audio)
+            audio = pcm.open_pcm(cache_path)
+        start = time.perf_counter()
+        if _use_parallel_transcription(len(audio) / SAMPLE_RATE):
+            # Workers load their own models, so this span includes their first load
+            with metrics.span("transcribe"):
+                result = _transcribe_parallel(cache_path, audio, db, audio_id)
+        else:
+            # Borrow the resident model instead of loading weights for every file
+            config = whisper_config()
+            with registry.use(config) as model:
+                # Update progress - model loaded
+                crud.update_progress(db, audio_id, "transcribing", 50)
+                
+                # Transcribe
+                start = time.perf_counter()
+                with metrics.span("transcribe"):
+                    result = get_backend(config.backend).transcribe(model, audio, config.compute_type)
+            result["segments"] = _simplify_segments(result.get("segments", []))
+        metrics.observe_transcription(audio_seconds, time.perf_counter() - start)
         text = result.get("text", "").strip()
         
         # Update progress - transcription complete
@@ -68,79 +197,242 @@ def transcribe_file(path: str, db: Session, audio_id: int) -> str:
         
         if text:
             logger.info(f"Transcription successful. Length: {len(text)} characters")
-            return text
+            return _transcription_result(text, _map_segments(result["segments"], speech_map), result.get("language"),
+                                         speech_map.skipped_ratio)
         else:
             logger.warning(f"Transcription returned empty text for {path}")
-            return f"[No speech detected in {os.path.basename(path)}]"
+            return _transcription_result(f"[No speech detected in {os.path.basename(path)}]", vad_skipped_ratio=speech_map.skipped_ratio)
             
+    except JobCancelled:
+        raise
     except ImportError as e:
         logger.error(f"Whisper not installed: {e}")
-        return f"[Error: Whisper AI not available - {os.path.basename(path)}]"
+        return _transcription_result(f"[Error: Whisper AI not available - {os.path.basename(path)}]")
     except Exception as e:
-        logger.error(f"Transcription failed for {path}: {str(e)}")
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        print(f"TRANSCRIPTION ERROR: {str(e)}")
-        print(f"FULL TRACEBACK: {traceback.format_exc()}")
-        return f"[Error: Transcription failed - {str(e)}]"
+        logger.exception(f"Transcription failed for {path}: {str(e)}")
+        return _transcription_result(f"[Error: Transcription failed - {str(e)}]")
 
-def process_audio(db: Session, audio_id: int, path: str, selected_model: str = None, num_questions: int = 3, auto_generate_questions: bool = True):
-    """Process audio file: transcribe and generate analytics with progress tracking"""
-    try:
-        logger.info(f"Processing audio file {path} for audio_id {audio_id} with model {selected_model}, num_questions {num_questions}, auto_generate_questions {auto_generate_questions}")
-        
-        # Extract audio duration
-        duration = extract_audio_duration(path)
+def _decode_upload(db: Session, audio_id: int, path: str):
+    """Decode once up front; the exact duration comes from the PCM length"""
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with metrics.span("decode"):
+            duration = pcm.duration(pcm.decode(path))
         if duration > 0:
             crud.update_audio_duration(db, audio_id, duration)
+
+def _store_transcription(db: Session, audio_id: int, result: dict) -> bool:
+    """Save a transcription result, or the error it carries. Returns True when analysis can follow."""
+    text = result["text"]
+    logger.info(f"Transcription completed: {len(text)} characters")
+
+    # If transcription failed, update error state and stop further processing
+    if text.strip().startswith("[Error:"):
+        crud.update_error_state(db, audio_id, text.strip())
+        return False
+
+    crud.update_transcription(db, audio_id, text, segments=json.dumps(result["segments"]), language=result["language"],
+                              vad_skipped_ratio=result["vad_skipped_ratio"])
+    return True
+
+def _remove_upload(path: str):
+    """Delete the audio file and its decoded PCM if they exist"""
+    pcm.remove(path)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+            logger.info(f"Deleted audio file {path}")
+        except Exception as e:
+            logger.error(f"Failed to delete audio file {path}: {str(e)}")
+
+@metrics.span("transcription")
+def run_transcription_stage(db: Session, audio_id: int, path: str) -> bool:
+    """Transcribe the uploaded file and store the transcript. Returns True when analysis can follow."""
+    try:
+        logger.info(f"Transcribing audio file {path} for audio_id {audio_id}")
+        _decode_upload(db, audio_id, path)
         
-        # Update progress - starting processing
-        crud.update_progress(db, audio_id, "downloading_model", 5)
-        
-        # Check Ollama status and ensure model is available
-        model_to_use = selected_model or "vatistasdim/boXai"
-        
-        if check_ollama_status():
-            logger.info("Ollama service is available")
-            crud.update_progress(db, audio_id, "downloading_model", 10)
+        # Transcribe the audio
+        cancellation.checkpoint()
+        return _store_transcription(db, audio_id, transcribe_file(path, db, audio_id))
             
-            if ensure_model_available(model_to_use):
-                logger.info(f"Model {model_to_use} is available, waiting for it to be ready...")
-                crud.update_progress(db, audio_id, "downloading_model", 20)
-                
-                if not wait_for_model_ready(model_to_use):
-                    logger.warning("Model not ready for inference, will use fallback methods")
-            else:
-                logger.warning("Could not ensure model availability, will use fallback methods")
+    except JobCancelled:
+        raise
+    except Exception as e:
+        # A failure caused by the file being deleted underneath us is a cancellation, not an error
+        cancellation.checkpoint()
+        logger.exception(f"Error transcribing audio {audio_id}: {str(e)}")
+        crud.update_error_state(db, audio_id, str(e))
+        return False
+
+    finally:
+        _remove_upload(path)
+
+def transcribe_batch(db: Session, items: list) -> dict:
+    """Transcribe several (audio_id, path) files, decoding the ones with at most 30 s of speech in one pass.
+
+    Longer files, and every file if the batched pass fails, go through transcribe_file one by one.
+    Returns a transcription result per audio id; files cancelled meanwhile are left out, and a file
+    that cannot be read gets an error result without holding up the others.
+    """
+    results, clips, single = {}, [], []
+    for audio_id, path in items:
+        if cancellation.cancellations.is_cancelled(audio_id):
+            continue
+        try:
+            crud.update_progress(db, audio_id, "transcribing", 25)
+            audio = pcm.load(path)
+            with metrics.span("vad"):
+                speech, speech_map = vad.strip_silence(audio)
+        except Exception as e:
+            # A file deleted underneath us was cancelled, not broken
+            if cancellation.cancellations.is_cancelled(audio_id):
+                continue
+            logger.error(f"Could not prepare audio {audio_id} for batched transcription: {e}")
+            results[audio_id] = _transcription_result(f"[Error: Transcription failed - {str(e)}]")
+            continue
+        if not len(speech):
+            results[audio_id] = _transcription_result(f"[No speech detected in {os.path.basename(path)}]",
+                                                      vad_skipped_ratio=speech_map.skipped_ratio)
+        elif len(speech) > BATCH_MAX_SECONDS * SAMPLE_RATE:
+            single.append((audio_id, path))
+        else:
+            clips.append((audio_id, path, len(audio) / SAMPLE_RATE, speech, speech_map))
+
+    if clips:
+        try:
+            config = whisper_config()
+            with registry.use(config) as model:
+                for audio_id, *_ in clips:
+                    crud.update_progress(db, audio_id, "transcribing", 50)
+                start = time.perf_counter()
+                with metrics.span("transcribe"):
+                    decoded = get_backend(config.backend).transcribe_batch(model, [clip[3] for clip in clips], config.compute_type)
+                elapsed = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Batched transcription of {len(clips)} files failed, transcribing them one by one: {e}")
+            single.extend((audio_id, path) for audio_id, path, *_ in clips)
         else:
-            logger.warning("Ollama service not available, will use fallback methods")
+            logger.info(f"Transcribed {len(clips)} short files in one batch in {elapsed:.1f}s")
+            total_seconds = sum(clip[2] for clip in clips)
+            for (audio_id, path, seconds, speech, speech_map), (text, language) in zip(clips, decoded):
+                metrics.observe_transcription(seconds, elapsed * seconds / total_seconds)
+                if not text:
+                    results[audio_id] = _transcription_result(f"[No speech detected in {os.path.basename(path)}]",
+                                                              vad_skipped_ratio=speech_map.skipped_ratio)
+                    continue
+                segments = [{"start": 0.0, "end": round(len(speech) / SAMPLE_RATE, 2), "text": text}]
+                results[audio_id] = _transcription_result(text, _map_segments(segments, speech_map), language,
+                                                          speech_map.skipped_ratio)
+
+    for audio_id, path in single:
+        try:
+            with cancellation.scope(cancellation.cancellations.token(audio_id)):
+                results[audio_id] = transcribe_file(path, db, audio_id)
+        except JobCancelled:
+            continue
+    return results
+
+@metrics.span("transcription")
+def run_batch_transcription_stage(db: Session, items: list) -> dict:
+    """Transcribe queued (audio_id, path) files together and store each transcript.
+
+    Returns "done", "failed" or "cancelled" per audio id, like running run_transcription_stage on each.
+    """
+    outcomes, ready = {}, []
+    try:
+        for audio_id, path in items:
+            try:
+                _decode_upload(db, audio_id, path)
+                ready.append((audio_id, path))
+            except Exception as e:
+                logger.error(f"Error decoding audio {audio_id}: {str(e)}")
+                crud.update_error_state(db, audio_id, str(e))
+                outcomes[audio_id] = "failed"
+
+        results = transcribe_batch(db, ready)
+        for audio_id, _ in ready:
+            if cancellation.cancellations.is_cancelled(audio_id) or audio_id not in results:
+                outcomes[audio_id] = "cancelled"
+                continue
+            try:
+                outcomes[audio_id] = "done" if _store_transcription(db, audio_id, results[audio_id]) else "failed"
+            except Exception as e:
+                logger.exception(f"Error storing the transcription of audio {audio_id}")
+                db.rollback()
+                crud.update_error_state(db, audio_id, str(e))
+                outcomes[audio_id] = "failed"
+        return outcomes
+
+    except Exception as e:
+        logger.exception(f"Error transcribing batch {[audio_id for audio_id, _ in items]}: {str(e)}")
+        for audio_id, _ in items:
+            if audio_id in outcomes:
+                continue
+            if cancellation.cancellations.is_cancelled(audio_id):
+                outcomes[audio_id] = "cancelled"
+            else:
+                crud.update_error_state(db, audio_id, str(e))
+                outcomes[audio_id] = "failed"
+        return outcomes
+
+    finally:
+        for _, path in items:
+            _remove_upload(path)
+
+@metrics.span("llm_prepare")
+def _prepare_llm(model: str):
+    """Make sure Ollama is up with the model pulled and loaded; analysis falls back gracefully otherwise"""
+    if check_ollama_status():
+        logger.info("Ollama service is available")
         
-        # Transcribe the audio
-        text = transcribe_file(path, db, audio_id)
-        logger.info(f"Transcription completed: {len(text)} characters")
+        if ensure_model_available(model):
+            logger.info(f"Model {model} is available, waiting for it to be ready...")
+            
+            if not wait_for_model_ready(model):
+                logger.warning("Model not ready for inference, will use fallback methods")
+        else:
+            logger.warning("Could not ensure model availability, will use fallback methods")
+    else:
+        logger.warning("Ollama service not available, will use fallback methods")
 
-        # If transcription failed, update error state and stop further processing
-        if text.strip().startswith("[Error:"):
-            crud.update_error_state(db, audio_id, text.strip())
-            return
+@metrics.span("analysis")
+def run_analysis_stage(db: Session, audio_id: int, selected_model: str = None, num_questions: int = 3, auto_generate_questions: bool = True) -> bool:
+    """Generate the summary and questions for a transcribed file"""
+    try:
+        audio = crud.get_audio_file(db, audio_id)
+        if not audio or not audio.transcription:
+            logger.error(f"No transcription to analyze for audio_id {audio_id}")
+            return False
+        text = audio.transcription
+        
+        # Update progress - preparing the LLM
+        crud.update_progress(db, audio_id, "downloading_model", 80)
+        
+        # Check Ollama status and ensure model is available
+        model_to_use = selected_model or DEFAULT_MODEL
+        
+        _prepare_llm(model_to_use)
 
         # Update progress - starting analysis
-        crud.update_progress(db, audio_id, "analyzing", 80)
+        cancellation.checkpoint()
+        crud.update_progress(db, audio_id, "analyzing", 85)
         
         # Generate analytics using LLM
-        summary = simple_summary(text, model=model_to_use)
-        logger.info(f"Generated summary: {summary}")
-        
-        crud.update_progress(db, audio_id, "analyzing", 90)
-        
-        # Generate questions
+        questions = None
         if auto_generate_questions:
-            questions_list = generate_questions(text, num=num_questions, model=model_to_use)
+            # Summary and questions in one pass over the transcript
+            summary, questions_list = analyze_transcript(text, num=num_questions, model=model_to_use)
+            logger.info(f"Generated summary: {summary}")
             logger.info(f"Generated questions: {questions_list}")
             questions = '\n'.join([f"{i+1}. {q}" for i, q in enumerate(questions_list)]) if questions_list else "No questions generated"
         else:
-            questions_list = []
+            summary = simple_summary(text, model=model_to_use)
+            logger.info(f"Generated summary: {summary}")
+        
+        crud.update_progress(db, audio_id, "analyzing", 90)
         
-        # Update database with final results
+        # Update database with final results, unless the file was cancelled meanwhile
+        cancellation.checkpoint()
         result = crud.update_analysis(
             db, 
             audio_id, 
@@ -151,23 +443,34 @@ def process_audio(db: Session, audio_id: int, path: str, selected_model: str = N
         
         if result:
             logger.info(f"Successfully processed audio_id {audio_id}")
-        else:
-            logger.error(f"Failed to update database for audio_id {audio_id}")
+            transcription_cache.store(db, audio_id, whisper_config().cache_key, model_to_use)
+            with metrics.span("index"):
+                retrieval.index_transcript(db, audio_id)
+            return True
+        logger.error(f"Failed to update database for audio_id {audio_id}")
+        return False
             
+    except JobCancelled:
+        raise
     except Exception as e:
-        logger.error(f"Error processing audio {audio_id}: {str(e)}")
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        print(f"PROCESSING ERROR: {str(e)}")
-        print(f"FULL TRACEBACK: {traceback.format_exc()}")
+        cancellation.checkpoint()
+        logger.exception(f"Error analyzing audio {audio_id}: {str(e)}")
         
         # Update to error state
         crud.update_error_state(db, audio_id, str(e))
+        return False
 
-    finally:
-        #delete the audio file if it exists
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-                logger.info(f"Deleted audio file {path}")
-            except Exception as e:
-                logger.error(f"Failed to delete audio file {path}: {str(e)}")
+def process_audio(db: Session, audio_id: int, path: str, selected_model: str = None, num_questions: int = 3, auto_generate_questions: bool = True):
+    """Process audio file: transcribe and generate analytics with progress tracking"""
+    logger.info(f"Processing audio file {path} for audio_id {audio_id} with model {selected_model}, num_questions {num_questions}, auto_generate_questions {auto_generate_questions}")
+    token = cancellation.cancellations.token(audio_id)
+    with metrics.record_timings() as timings:
+        try:
+            with cancellation.scope(token):
+                if run_transcription_stage(db, audio_id, path):
+                    run_analysis_stage(db, audio_id, selected_model, num_questions, auto_generate_questions)
+        except JobCancelled as e:
+            logger.info(f"Processing of audio_id {audio_id} stopped: {e}")
+        finally:
+            cancellation.cancellations.release(audio_id)
+    crud.add_stage_timings(db, audio_id, timings.as_dict())
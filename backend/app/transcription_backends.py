@@ -0,0 +1,215 @@
+import os
+import logging
+import threading
+import importlib.util
+from typing import NamedTuple
+import numpy as np
+from . import cancellation
+
+logger = logging.getLogger(__name__)
+
+# Speech recognition engine: "openai-whisper", "faster-whisper" (CTranslate2) or "auto" to prefer faster-whisper
+# on CPU when installed; GPUs stay on openai-whisper unless faster-whisper is asked for, as it needs cuDNN/cuBLAS
+WHISPER_BACKEND = os.getenv('WHISPER_BACKEND', 'auto')
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+# Device and compute type; "auto" picks them from the available hardware
+WHISPER_DEVICE = os.getenv('WHISPER_DEVICE', 'auto')
+WHISPER_COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', 'auto')
+# CPU threads used by one model (0 leaves the library default)
+WHISPER_CPU_THREADS = int(os.getenv('WHISPER_CPU_THREADS', '0'))
+
+# Parameters per model family, checked in order against the model name (e.g. "large-v3-turbo" is turbo)
+MODEL_PARAMETERS = (("turbo", 809e6), ("large", 1550e6), ("medium", 769e6), ("small", 244e6), ("base", 74e6), ("tiny", 39e6))
+# Weight storage per parameter for each compute type
+BYTES_PER_PARAMETER = {"float32": 4, "float16": 2, "bfloat16": 2, "int16": 2,
+                       "int8": 1, "int8_float32": 1, "int8_float16": 1, "int8_bfloat16": 1}
+
+
+def estimate_memory_bytes(model_size: str, compute_type: str) -> int:
+    """Weights of a Whisper model from its size name and compute type; 0 when the name is not recognized"""
+    name = model_size.rsplit("/", 1)[-1].lower()
+    for family, parameters in MODEL_PARAMETERS:
+        if family in name:
+            return int(parameters * BYTES_PER_PARAMETER.get(compute_type, 4))
+    return 0
+
+
+class WhisperConfig(NamedTuple):
+    """Everything needed to load a model; also the key of resident models"""
+    backend: str
+    model_size: str
+    device: str
+    compute_type: str
+
+    @property
+    def cache_key(self) -> str:
+        """Name under which transcripts from this model are cached. Compute type barely changes the text."""
+        if self.backend == OpenAIWhisperBackend.name:
+            return self.model_size
+        return f"{self.backend}:{self.model_size}"
+
+
+class TranscriptionBackend:
+    """A speech recognition engine: loads models and turns 16 kHz float32 audio into Whisper-style results"""
+    name = None
+    module = None
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    def default_compute_type(self, device: str) -> str:
+        return "float16" if device == "cuda" else "float32"
+
+    def load(self, model_size: str, device: str, compute_type: str):
+        raise NotImplementedError
+
+    def memory_bytes(self, model, config: "WhisperConfig") -> int:
+        """Memory held by a loaded model, for the registry's memory limit"""
+        return estimate_memory_bytes(config.model_size, config.compute_type)
+
+    def transcribe(self, model, audio: np.ndarray, compute_type: str) -> dict:
+        """Returns {"text", "segments", "language"} with segments carrying start, end and text"""
+        raise NotImplementedError
+
+    def transcribe_batch(self, model, clips: list, compute_type: str) -> list:
+        """(text, language) per clip of at most 30 s. Backends without batched decoding go one clip at a time."""
+        results = []
+        for clip in clips:
+            result = self.transcribe(model, clip, compute_type)
+            results.append((result["text"].strip(), result["language"]))
+        return results
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """The reference PyTorch implementation"""
+    name = "openai-whisper"
+    module = "whisper"
+
+    def load(self, model_size: str, device: str, compute_type: str):
+        import whisper
+        if device == "cpu" and _cpu_threads():
+            import torch
+            torch.set_num_threads(_cpu_threads())
+        return whisper.load_model(model_size, device=device)
+
+    def memory_bytes(self, model, config: "WhisperConfig") -> int:
+        """Measured from the PyTorch parameters and buffers, which reflect the device's actual precision"""
+        try:
+            total = sum(p.numel() * p.element_size() for p in model.parameters())
+            total += sum(b.numel() * b.element_size() for b in model.buffers())
+        except Exception:
+            total = 0
+        return total or super().memory_bytes(model, config)
+
+    def _fp16(self, model, compute_type: str) -> bool:
+        return compute_type == "float16" and model.device.type != "cpu"
+
+    def transcribe(self, model, audio: np.ndarray, compute_type: str) -> dict:
+        result = model.transcribe(audio, fp16=self._fp16(model, compute_type))
+        return {"text": result.get("text", ""), "segments": result.get("segments", []), "language": result.get("language")}
+
+    def transcribe_batch(self, model, clips: list, compute_type: str) -> list:
+        """One batched decoder pass over all clips"""
+        import torch
+        import whisper
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(np.array(clip, dtype=np.float32)), model.dims.n_mels)
+            for clip in clips
+        ]).to(model.device)
+        options = whisper.DecodingOptions(fp16=self._fp16(model, compute_type), without_timestamps=True)
+        results = whisper.decode(model, mel, options)
+        # Same silence test as whisper.transcribe: a confident "no speech" with a poor decode is dropped
+        return [("" if r.no_speech_prob > 0.6 and r.avg_logprob < -1 else r.text.strip(), r.language) for r in results]
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 port of Whisper, with int8 quantization for fast CPU inference"""
+    name = "faster-whisper"
+    module = "faster_whisper"
+
+    def default_compute_type(self, device: str) -> str:
+        return "float16" if device == "cuda" else "int8"
+
+    def load(self, model_size: str, device: str, compute_type: str):
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=_cpu_threads())
+
+    def transcribe(self, model, audio: np.ndarray, compute_type: str) -> dict:
+        pieces, info = model.transcribe(np.asarray(audio, dtype=np.float32))
+        segments = []
+        # Segments are decoded lazily, so a cancelled job stops between two of them
+        for piece in pieces:
+            cancellation.checkpoint()
+            segments.append({"start": piece.start, "end": piece.end, "text": piece.text})
+        return {"text": "".join(seg["text"] for seg in segments), "segments": segments, "language": info.language}
+
+
+BACKENDS = {backend.name: backend for backend in (OpenAIWhisperBackend(), FasterWhisperBackend())}
+
+_thread_limit = 0
+
+
+def limit_cpu_threads(num_threads: int):
+    """Cap the threads of models loaded in this process, e.g. in a parallel transcription worker"""
+    global _thread_limit
+    _thread_limit = num_threads
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+def _cpu_threads() -> int:
+    return _thread_limit or WHISPER_CPU_THREADS
+
+
+def get_backend(name: str) -> TranscriptionBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown Whisper backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def detect_device() -> str:
+    """cuda when a GPU is usable by either engine, else cpu"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+    except ImportError:
+        pass
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            return "cuda"
+    except ImportError:
+        pass
+    return "cpu"
+
+
+def resolve_config(backend: str = WHISPER_BACKEND, model_size: str = WHISPER_MODEL, device: str = WHISPER_DEVICE,
+                   compute_type: str = WHISPER_COMPUTE_TYPE) -> WhisperConfig:
+    """Fill in every "auto" setting from the installed engines and the hardware"""
+    if device == "auto":
+        device = detect_device()
+    if backend == "auto":
+        faster = BACKENDS[FasterWhisperBackend.name]
+        backend = faster.name if device == "cpu" and faster.available() else OpenAIWhisperBackend.name
+    engine = get_backend(backend)
+    if compute_type == "auto":
+        compute_type = engine.default_compute_type(device)
+    return WhisperConfig(backend, model_size, device, compute_type)
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def whisper_config() -> WhisperConfig:
+    """The configured model, resolved once per process"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = resolve_config()
+            logger.info(f"Whisper backend {_config.backend}: {_config.model_size} on {_config.device} ({_config.compute_type})")
+        return _config
@@ -0,0 +1,75 @@
+import logging
+import threading
+from sqlalchemy.orm import Session
+from . import crud, models
+
+logger = logging.getLogger(__name__)
+
+_stats = {"hits": 0, "partial_hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(kind: str):
+    with _stats_lock:
+        _stats[kind] += 1
+
+
+def lookup(db: Session, audio: models.AudioFile, whisper_model: str, llm_model: str, auto_generate_questions: bool = True) -> str:
+    """Reuse cached results for identical audio.
+
+    Returns "hit" when the file was completed from the cache, "transcription" when only
+    the transcript could be reused and the LLM stage still has to run, or "miss".
+    """
+    if not audio.content_hash:
+        return "miss"
+    entry = crud.get_cached_transcription(db, audio.content_hash, whisper_model, llm_model)
+    if not entry:
+        _count("misses")
+        return "miss"
+
+    crud.record_cache_hit(db, entry)
+    # The pipeline that would have probed the audio is skipped, so take what an earlier copy measured
+    duplicate = crud.get_processed_duplicate(db, audio.content_hash, audio.id)
+    if duplicate:
+        crud.update_audio_duration(db, audio.id, duplicate.audio_duration)
+    crud.update_transcription(db, audio.id, entry.transcription, segments=entry.segments, language=entry.language,
+                              vad_skipped_ratio=duplicate.vad_skipped_ratio if duplicate else None)
+
+    if entry.llm_model == llm_model and entry.summary and (entry.questions or not auto_generate_questions):
+        crud.update_analysis(
+            db,
+            audio.id,
+            transcription=entry.transcription,
+            summary=entry.summary,
+            questions=entry.questions if auto_generate_questions else None
+        )
+        logger.info(f"Reused cached results for audio_id {audio.id} ({audio.content_hash[:12]})")
+        _count("hits")
+        return "hit"
+
+    logger.info(f"Reused cached transcript for audio_id {audio.id} ({audio.content_hash[:12]}), analysis still required")
+    _count("partial_hits")
+    return "transcription"
+
+
+def store(db: Session, audio_id: int, whisper_model: str, llm_model: str):
+    """Cache the results of a completed file under its content hash"""
+    audio = crud.get_audio_file(db, audio_id)
+    if not audio or not audio.content_hash or audio.processing_stage != "complete":
+        return
+    # Only the transcript is worth keeping when the LLM was unavailable
+    include_analysis = bool(audio.summary) and audio.summary != "No summary available"
+    crud.save_cached_transcription(db, audio, whisper_model, llm_model, include_analysis=include_analysis)
+
+
+def stats(db: Session) -> dict:
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["partial_hits"] + counters["misses"]
+    counters["hit_rate"] = round((counters["hits"] + counters["partial_hits"]) / lookups, 3) if lookups else 0.0
+    counters.update(crud.transcription_cache_totals(db))
+    return counters
+
+
+def purge(db: Session, audio_hash: str = None) -> int:
+    return crud.purge_transcription_cache(db, audio_hash)
@@ -0,0 +1,113 @@
+import os
+import logging
+from typing import List, Tuple
+import numpy as np
+from .pcm import SAMPLE_RATE
+from .segmentation import frame_energy
+
+logger = logging.getLogger(__name__)
+
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+VAD_FRAME_MS = int(os.getenv('VAD_FRAME_MS', '30'))
+# A frame is speech when it is this many dB above the recording's noise floor
+VAD_MARGIN_DB = float(os.getenv('VAD_MARGIN_DB', '12'))
+# Frames quieter than this are never speech, whatever the noise floor
+VAD_MIN_DB = float(os.getenv('VAD_MIN_DB', '-55'))
+# Only silences at least this long are cut; shorter pauses stay so sentences keep their rhythm
+VAD_MIN_SILENCE_MS = int(os.getenv('VAD_MIN_SILENCE_MS', '1500'))
+# Audio kept on each side of a speech region so word onsets and tails aren't clipped
+VAD_PAD_MS = int(os.getenv('VAD_PAD_MS', '300'))
+# Bursts shorter than this (clicks, coughs) are not treated as speech
+VAD_MIN_SPEECH_MS = int(os.getenv('VAD_MIN_SPEECH_MS', '250'))
+# Skip the copy entirely when VAD would remove less than this fraction
+VAD_MIN_SKIP_RATIO = float(os.getenv('VAD_MIN_SKIP_RATIO', '0.05'))
+
+
+class SpeechMap:
+    """Where each kept region sits in the original audio, to map speech-only timestamps back"""
+
+    def __init__(self, regions: List[Tuple[int, int]], total_samples: int, sample_rate: int = SAMPLE_RATE):
+        self.regions = regions
+        self.total_samples = total_samples
+        self.sample_rate = sample_rate
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        # Offset of each region in the concatenated speech audio
+        self._speech_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(regions) else np.zeros(0, dtype=np.int64)
+        self._original_starts = np.array([start for start, _ in regions], dtype=np.int64)
+        self.speech_samples = int(lengths.sum())
+
+    @classmethod
+    def identity(cls, total_samples: int, sample_rate: int = SAMPLE_RATE) -> "SpeechMap":
+        return cls([(0, total_samples)] if total_samples else [], total_samples, sample_rate)
+
+    @property
+    def is_identity(self) -> bool:
+        return self.speech_samples == self.total_samples
+
+    @property
+    def skipped_ratio(self) -> float:
+        return 1 - self.speech_samples / self.total_samples if self.total_samples else 0.0
+
+    def to_original(self, seconds: float) -> float:
+        """Map a time in the speech-only audio to the same moment in the original recording"""
+        if not len(self.regions):
+            return seconds
+        sample = int(round(seconds * self.sample_rate))
+        i = max(0, int(np.searchsorted(self._speech_starts, sample, side="right")) - 1)
+        return float(self._original_starts[i] + sample - self._speech_starts[i]) / self.sample_rate
+
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS) -> List[Tuple[int, int]]:
+    """Speech regions as (start_sample, end_sample), found by frame energy against an adaptive noise floor"""
+    frame_samples = max(1, int(sample_rate * frame_ms / 1000))
+    energy = frame_energy(audio, frame_samples)
+    if not len(energy):
+        return []
+    db = 20 * np.log10(energy + 1e-10)
+    noise_floor, loud = np.percentile(db, [10, 99])
+    # Capping at the loud level keeps recordings with no pauses at all from being dropped wholesale
+    threshold = max(min(noise_floor + VAD_MARGIN_DB, loud - VAD_MARGIN_DB), VAD_MIN_DB)
+    speech = db > threshold
+
+    # Consecutive speech frames become regions
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    regions = [(int(s), int(e)) for s, e in zip(edges[::2], edges[1::2])]
+
+    # Bridge short pauses, then drop isolated blips
+    min_silence = VAD_MIN_SILENCE_MS / frame_ms
+    merged = []
+    for start, end in regions:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    min_speech = VAD_MIN_SPEECH_MS / frame_ms
+    merged = [(s, e) for s, e in merged if e - s >= min_speech]
+
+    # Pad in samples and clip; padding can make neighbours touch, so merge again
+    pad = int(sample_rate * VAD_PAD_MS / 1000)
+    total = len(audio)
+    padded = []
+    for start, end in merged:
+        start, end = max(0, start * frame_samples - pad), min(total, end * frame_samples + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+
+def strip_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Tuple[np.ndarray, SpeechMap]:
+    """Speech-only audio and the map back to original time.
+
+    The input is returned untouched (no copy) when VAD is off or would barely shorten it.
+    """
+    if not VAD_ENABLED or not len(audio):
+        return audio, SpeechMap.identity(len(audio), sample_rate)
+    speech_map = SpeechMap(detect_speech(audio, sample_rate), len(audio), sample_rate)
+    if speech_map.skipped_ratio < VAD_MIN_SKIP_RATIO:
+        return audio, SpeechMap.identity(len(audio), sample_rate)
+    logger.info(f"VAD kept {len(speech_map.regions)} speech regions, skipping {speech_map.skipped_ratio:.0%} of the audio")
+    if not speech_map.regions:
+        return np.zeros(0, dtype=np.float32), speech_map
+    return np.concatenate([audio[start:end] for start, end in speech_map.regions]), speech_map
@@ -0,0 +1,90 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.15
+
+Exits with status 1 when a metric got worse by more than the threshold.
+"""
+import sys
+import json
+import argparse
+
+# Suffixes of metrics where smaller is better, and where larger is better; other numbers are context.
+# Maximums are too noisy to gate on and are only reported.
+LOWER_IS_BETTER = ("_ms", "_seconds", "real_time_factor")
+HIGHER_IS_BETTER = ("_per_second",)
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Numeric leaves of nested results keyed by their dotted path"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def direction(metric: str) -> int:
+    """+1 when a larger value is better, -1 when smaller is better, 0 when it is not a performance metric"""
+    name = metric.rsplit(".", 1)[-1]
+    if name.startswith("max_"):
+        return 0
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.1, min_ms: float = 1.0) -> list:
+    """(metric, old, new, relative change, verdict) for every performance metric present in both runs.
+
+    Changes below min_ms (on millisecond metrics) are treated as noise whatever their relative size.
+    """
+    old, new = flatten(baseline.get("scenarios", {})), flatten(candidate.get("scenarios", {}))
+    rows = []
+    for metric in sorted(old.keys() & new.keys()):
+        sign = direction(metric)
+        if not sign:
+            continue
+        before, after = old[metric], new[metric]
+        change = (after - before) / before if before else 0.0
+        verdict = "ok"
+        noise = metric.endswith("_ms") and abs(after - before) < min_ms
+        if not noise and change * sign < -threshold:
+            verdict = "REGRESSION"
+        elif not noise and change * sign > threshold:
+            verdict = "improved"
+        rows.append((metric, before, after, change, verdict))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts (0.1 = 10%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore millisecond changes smaller than this")
+    parser.add_argument("--all", action="store_true", help="also list metrics within the threshold")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    rows = compare(baseline, candidate, args.threshold, args.min_ms)
+
+    print(f"{baseline['meta'].get('commit') or '?'} -> {candidate['meta'].get('commit') or '?'}")
+    width = max((len(row[0]) for row in rows), default=10)
+    for metric, before, after, change, verdict in rows:
+        if args.all or verdict != "ok":
+            print(f"{metric:<{width}}  {before:>12.3f}  {after:>12.3f}  {change:>+8.1%}  {verdict}")
+    regressions = sum(1 for row in rows if row[4] == "REGRESSION")
+    print(f"{len(rows)} metrics compared, {regressions} regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
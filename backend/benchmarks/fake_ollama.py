@@ -0,0 +1,209 @@
+"""Stand-in for the Ollama HTTP API with a configurable speed, so benchmarks measure our code and not a GPU.
+
+Run on its own with `python -m benchmarks.fake_ollama --port 11434 --tokens-per-second 40`.
+"""
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ("le projet avance bien mais il reste des questions sur le budget la date de livraison "
+         "et la répartition des tâches entre les équipes").split()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is expected; anything else is worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeOllama:
+    """Threaded fake Ollama server.
+
+    latency: seconds before the first token of each generation
+    tokens_per_second: generation speed once tokens flow
+    response_tokens: tokens in each plain-text answer
+    load_seconds: one-off delay the first time a model is used, like loading weights
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, tokens_per_second: float = 200,
+                 response_tokens: int = 40, load_seconds: float = 0.0, models=("vatistasdim/boXai:latest", "nomic-embed-text:latest")):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.load_seconds = load_seconds
+        self.models = list(models)
+        self.loaded = set()
+        self.stats = {"requests": 0, "generations": 0, "prompt_tokens": 0, "generated_tokens": 0}
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _handler(self))
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def _load(self, model: str):
+        """Charge load_seconds once per model"""
+        with self._lock:
+            first = model not in self.loaded
+            self.loaded.add(model)
+        if first and self.load_seconds:
+            time.sleep(self.load_seconds)
+
+    def tokens(self, request: dict) -> list:
+        """The tokens a generation answers with; JSON-constrained requests get a valid analysis"""
+        if not request.get("prompt"):
+            return []
+        if request.get("format"):
+            answer = json.dumps({
+                "summary": "Le projet avance bien. Le budget et la date de livraison restent à préciser.",
+                "questions": [f"Question {i + 1} sur le budget ?" for i in range(5)],
+            }, ensure_ascii=False)
+            # Roughly four characters per token, like a real tokenizer on JSON
+            return [answer[i:i + 4] for i in range(0, len(answer), 4)]
+        limit = request.get("options", {}).get("num_predict") or self.response_tokens
+        rng = random.Random(len(request["prompt"]))
+        return [(" " if i else "") + rng.choice(WORDS) for i in range(min(limit, self.response_tokens))]
+
+
+def _handler(fake: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, status: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, payload):
+            line = (json.dumps(payload) + "\n").encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            fake._count(requests=1)
+            if self.path == "/api/tags":
+                self._send({"models": [{"name": name} for name in fake.models]})
+            elif self.path == "/api/ps":
+                self._send({"models": [{"name": name} for name in sorted(fake.loaded)]})
+            else:
+                self._send({"error": "not found"}, 404)
+
+        def do_POST(self):
+            fake._count(requests=1)
+            request = self._read_json()
+            if self.path == "/api/generate":
+                self._generate(request)
+            elif self.path == "/api/embed":
+                fake._load(request.get("model", ""))
+                inputs = request.get("input") or []
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._send({"embeddings": [_embedding(text) for text in inputs]})
+            elif self.path == "/api/pull":
+                self._send({"status": "success"})
+            else:
+                self._send({"error": "not found"}, 404)
+
+        def _generate(self, request: dict):
+            model = request.get("model", "")
+            fake._load(model)
+            tokens = fake.tokens(request)
+            prompt_tokens = len(request.get("prompt", "")) // 4
+            fake._count(generations=1, prompt_tokens=prompt_tokens, generated_tokens=len(tokens))
+            if tokens:
+                time.sleep(fake.latency)
+            delay = 1 / fake.tokens_per_second if fake.tokens_per_second else 0
+            # Like Ollama, the returned context extends the one sent with this prompt and the answer
+            context = list(request.get("context") or []) + [1] * prompt_tokens + [2] * len(tokens)
+            final = {"model": model, "response": "", "done": True, "context": context,
+                     "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)}
+
+            if not request.get("stream", True):
+                time.sleep(delay * len(tokens))
+                self._send({**final, "response": "".join(tokens)})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for token in tokens:
+                    self._chunk({"model": model, "response": token, "done": False})
+                    time.sleep(delay)
+                self._chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client hung up (e.g. a cancelled job); a real Ollama stops generating too
+                pass
+
+    return Handler
+
+
+def _embedding(text: str, dimensions: int = 64) -> list:
+    """Deterministic unit vector from the text's words, so retrieval ranks something meaningful"""
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--load-seconds", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOllama(args.host, args.port, args.latency, args.tokens_per_second, args.response_tokens, args.load_seconds)
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
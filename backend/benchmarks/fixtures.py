@@ -0,0 +1,68 @@
+"""Synthetic recordings for benchmarks: speech-like bursts separated by pauses, written as 16-bit WAV"""
+import os
+import wave
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def speech_like(seconds: float, rng: np.random.Generator, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """A voiced burst: a few harmonics of a drifting pitch, amplitude-modulated at syllable rate"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = rng.uniform(110, 220) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * t))
+    return (0.15 * voice * syllables).astype(np.float32)
+
+
+def recording(seconds: float, speech_ratio: float = 0.7, seed: int = 0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Alternating utterances and pauses over a faint noise floor; speech_ratio is the share of utterances"""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = (rng.standard_normal(total) * 1e-3).astype(np.float32)
+    position = 0
+    while position < total:
+        utterance = rng.uniform(1.0, 4.0)
+        pause = utterance * (1 - speech_ratio) / max(speech_ratio, 1e-3) * rng.uniform(0.5, 1.5)
+        burst = speech_like(utterance, rng, sample_rate)[:total - position]
+        audio[position:position + len(burst)] += burst
+        position += len(burst) + int(pause * sample_rate)
+    return audio
+
+
+def write_wav(path: str, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> str:
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+    return path
+
+
+def make_fixture(directory: str, seconds: float, speech_ratio: float = 0.7, seed: int = 0) -> str:
+    """Path of a synthetic WAV of the given length, generated on first use"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"speech_{seconds:g}s_{int(speech_ratio * 100)}pct_{seed}.wav")
+    if not os.path.exists(path):
+        write_wav(path, recording(seconds, speech_ratio, seed))
+    return path
+
+
+WORDS = ("le projet avance bien mais il reste des questions sur le budget la date de livraison et la "
+         "répartition des tâches entre les équipes nous devons valider le planning avec le client avant "
+         "la fin du mois puis lancer les tests").split()
+
+
+def transcript(seconds: float, words_per_second: float = 2.5, seed: int = 0) -> tuple:
+    """Text and Whisper-style segments standing in for the transcript of a recording this long"""
+    rng = np.random.default_rng(seed)
+    segments, start = [], 0.0
+    while start < seconds:
+        length = min(float(rng.uniform(3, 8)), seconds - start)
+        words = rng.choice(WORDS, max(1, int(length * words_per_second)))
+        segments.append({"start": round(start, 2), "end": round(start + length, 2),
+                         "text": " ".join(words).capitalize() + "."})
+        start += length
+    return " ".join(s["text"] for s in segments), segments
@@ -0,0 +1,126 @@
+"""Run the benchmarks against a throwaway database and a fake Ollama, and write the results as JSON.
+
+    cd backend
+    python -m benchmarks.run --output bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare bench-old.json bench-new.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _floats(value: str) -> list:
+    return [float(v) for v in value.split(",") if v]
+
+
+def _ints(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks of the upload, processing and query paths")
+    parser.add_argument("--scenarios", default="upload,pipeline,listing,ask", help="comma-separated subset to run")
+    parser.add_argument("--output", help="results file (printed to stdout when omitted)")
+    parser.add_argument("--work-dir", help="where the database, uploads and fixtures go (a temporary directory by default)")
+    parser.add_argument("--uploads", type=int, default=20, help="files posted by the upload scenario")
+    parser.add_argument("--upload-seconds", type=float, default=30, help="length of each uploaded recording")
+    parser.add_argument("--lengths", type=_floats, default=[10, 60], help="recording lengths for the pipeline scenario")
+    parser.add_argument("--rows", type=_ints, default=[100, 1000, 10000], help="table sizes for the listing scenario")
+    parser.add_argument("--repeats", type=int, default=20, help="requests per measurement in the listing scenario")
+    parser.add_argument("--questions", type=int, default=20, help="questions asked by the ask scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Ollama seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="fake Ollama generation speed")
+    parser.add_argument("--response-tokens", type=int, default=40, help="tokens in each fake answer")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="fake Ollama model load time")
+    return parser.parse_args(argv)
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = [name for name in args.scenarios.split(",") if name]
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="bench-"))
+    output_path = os.path.abspath(args.output) if args.output else None
+    os.makedirs(work_dir, exist_ok=True)
+
+    from .fake_ollama import FakeOllama
+    fake = FakeOllama(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                      response_tokens=args.response_tokens, load_seconds=args.load_seconds).start()
+
+    # The app reads its configuration at import time, so set it up before importing anything from it
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ["OLLAMA_URL"] = fake.url
+    os.environ["WHISPER_WARMUP"] = "false"
+    # No job workers: uploads stay queued, so /upload is timed alone and the pipeline scenario drives the stages itself
+    os.environ["TRANSCRIPTION_WORKERS"] = "0"
+    os.environ["LLM_WORKERS"] = "0"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(work_dir)
+    from fastapi.testclient import TestClient
+    from . import scenarios
+    logging.getLogger().setLevel(logging.WARNING)
+
+    unknown = set(selected) - set(scenarios.SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    options = {
+        "upload": {"count": args.uploads, "seconds": args.upload_seconds},
+        "pipeline": {"lengths": args.lengths},
+        "listing": {"row_counts": args.rows, "repeats": args.repeats},
+        "ask": {"questions": args.questions},
+    }
+
+    results = {
+        "meta": {
+            **git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "whisper": scenarios.whisper_available(),
+            "whisper_config": scenarios.whisper_config()._asdict(),
+            "fake_ollama": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                            "response_tokens": args.response_tokens, "load_seconds": args.load_seconds},
+            "options": {name: options[name] for name in selected},
+        },
+        "scenarios": {},
+    }
+    try:
+        # Entering the client runs the app's startup, and keeps one event loop for the async Ollama client
+        with TestClient(scenarios.app) as client:
+            for name in selected:
+                print(f"Running {name}...", file=sys.stderr)
+                started = time.perf_counter()
+                results["scenarios"][name] = scenarios.SCENARIOS[name](client, work_dir, **options[name])
+                print(f"  done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        fake.stop()
+    results["meta"]["ollama_requests"] = fake.stats
+
+    output = json.dumps(results, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {output_path}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
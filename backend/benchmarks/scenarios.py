@@ -0,0 +1,225 @@
+"""Benchmark scenarios. Import only after benchmarks.run has pointed the app at its throwaway database."""
+import io
+import json
+import os
+import time
+import shutil
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert
+from fastapi.testclient import TestClient
+from app.main import UPLOAD_DIR
+from app.database import SessionLocal
+from app.model_registry import registry
+from app.transcription_backends import whisper_config, get_backend
+from app import blobs, crud, models, pcm, vad, cancellation, transcription
+from . import fixtures
+
+
+def latency_summary(samples: list) -> dict:
+    """Milliseconds statistics of a list of durations in seconds"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(ms):
+        return {"count": 0}
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def whisper_available() -> bool:
+    return get_backend(whisper_config().backend).available()
+
+
+def _reset_database():
+    db = SessionLocal()
+    try:
+        for model in (models.TranscriptChunk, models.TranscriptBlob, models.Job, models.AudioFile):
+            db.query(model).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def upload(client: TestClient, work_dir: str, count: int = 20, seconds: float = 30) -> dict:
+    """POST /upload throughput: each file is different so no transcript cache hit short-circuits the path"""
+    audio = fixtures.recording(seconds, seed=1)
+    bodies = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        fixtures.write_wav(buffer, audio + np.float32(i * 1e-4))
+        bodies.append(buffer.getvalue())
+
+    samples = []
+    started = time.perf_counter()
+    for i, body in enumerate(bodies):
+        response, elapsed = timed(client.post, "/upload", files={"file": (f"bench_{i}.wav", body, "audio/wav")},
+                                  data={"num_questions": "3"})
+        response.raise_for_status()
+        samples.append(elapsed)
+    wall = time.perf_counter() - started
+    total_bytes = sum(len(body) for body in bodies)
+    return {
+        "files": count,
+        "audio_seconds_per_file": seconds,
+        "files_per_second": round(count / wall, 3),
+        "mb_per_second": round(total_bytes / wall / 1e6, 3),
+        "latency": latency_summary(samples),
+    }
+
+
+def pipeline(client: TestClient, work_dir: str, lengths=(10, 60), selected_model: str = None) -> dict:
+    """Stage latencies of process_audio for recordings of each length.
+
+    Decoding and VAD always run for real. Without a Whisper backend installed the transcription
+    stage is reported as skipped and a synthetic transcript of matching length feeds the
+    analysis stage, so the LLM side is still measured.
+    """
+    results = {}
+    has_whisper = whisper_available()
+    if has_whisper:
+        _, results["whisper_load_seconds"] = timed(registry.warm_up)
+    db = SessionLocal()
+    try:
+        for seconds in lengths:
+            fixture = fixtures.make_fixture(os.path.join(work_dir, "fixtures"), seconds)
+            audio = crud.create_audio_file(db, os.path.basename(fixture), os.path.getsize(fixture), selected_model)
+            path = os.path.join(UPLOAD_DIR, audio.storage_key)
+            shutil.copyfile(fixture, path)
+            stages = {}
+
+            cache, stages["decode"] = timed(pcm.decode, path)
+            (speech, speech_map), stages["vad"] = timed(vad.strip_silence, pcm.open_pcm(cache))
+            token = cancellation.cancellations.token(audio.id)
+            try:
+                with cancellation.scope(token):
+                    if has_whisper:
+                        transcribed, stages["transcription"] = timed(transcription.run_transcription_stage, db, audio.id, path)
+                    else:
+                        pcm.remove(path)
+                        os.remove(path)
+                        text, segments = fixtures.transcript(seconds)
+                        crud.update_transcription(db, audio.id, text, json.dumps(segments), "fr", speech_map.skipped_ratio)
+                        transcribed = True
+                    if transcribed:
+                        _, stages["analysis"] = timed(transcription.run_analysis_stage, db, audio.id, selected_model)
+            finally:
+                cancellation.cancellations.release(audio.id)
+
+            db.refresh(audio)
+            processing = sum(stages.values())
+            results[f"{seconds:g}s"] = {
+                "stages_ms": {name: round(value * 1000, 3) for name, value in stages.items()},
+                "processing_seconds": round(processing, 3),
+                "real_time_factor": round(processing / seconds, 4),
+                "vad_skipped_ratio": round(speech_map.skipped_ratio, 4),
+                "final_stage": audio.processing_stage,
+                "transcription": whisper_config().backend if has_whisper else "skipped (no Whisper backend installed)",
+            }
+    finally:
+        db.close()
+    return results
+
+
+def _seed_rows(db, start: int, stop: int, text: str, segments: str):
+    """Insert completed files start..stop-1 in one statement per table, one minute apart"""
+    base = datetime(2024, 1, 1)
+    db.execute(insert(models.AudioFile), [{
+        "id": i + 1,
+        "filename": f"seed_{i}.wav",
+        "storage_key": f"seed_{i}.wav",
+        "uploaded_at": base + timedelta(minutes=i),
+        "summary": text[:300],
+        "questions": "1. Question ?\n2. Question ?",
+        "word_count": len(text.split()),
+        "processing_stage": "complete" if i % 10 else "error",
+        "progress_percentage": 100,
+        "audio_duration": 600.0,
+        "file_size": 10_000_000,
+    } for i in range(start, stop)])
+    values = {"transcription": text, "segments": segments}
+    packed = {kind: blobs.pack(value) for kind, value in values.items()}
+    db.execute(insert(models.TranscriptBlob), [
+        {"audio_id": i + 1, "kind": kind, "codec": codec, "size": len(values[kind]), "data": data}
+        for i in range(start, stop) for kind, (codec, data) in packed.items()
+    ])
+    db.commit()
+
+
+def listing(client: TestClient, work_dir: str, row_counts=(100, 1000, 10000), repeats: int = 20) -> dict:
+    """GET /files latency as the table grows; rows carry ten-minute transcripts like real ones"""
+    _reset_database()
+    text, segments = fixtures.transcript(600)
+    segments = json.dumps(segments)
+    results = {}
+    db = SessionLocal()
+    try:
+        seeded = 0
+        for count in row_counts:
+            _seed_rows(db, seeded, count, text, segments)
+            seeded = count
+
+            first_page = [timed(client.get, "/files")[1] for _ in range(repeats)]
+            response = client.get("/files")
+            etag = response.headers.get("etag")
+            revalidate = [timed(client.get, "/files", headers={"If-None-Match": etag})[1] for _ in range(repeats)]
+            filtered = [timed(client.get, "/files", params={"stage": "error"})[1] for _ in range(repeats)]
+
+            # Follow the cursor to the last page
+            pages, cursor, started = 0, None, time.perf_counter()
+            while True:
+                response = client.get("/files", params={"limit": 100, **({"cursor": cursor} if cursor else {})})
+                pages += 1
+                cursor = response.headers.get("x-next-cursor")
+                if not cursor:
+                    break
+            walk = time.perf_counter() - started
+
+            results[str(count)] = {
+                "first_page": latency_summary(first_page),
+                "not_modified": latency_summary(revalidate),
+                "filtered_by_stage": latency_summary(filtered),
+                "full_walk_ms": round(walk * 1000, 3),
+                "pages": pages,
+            }
+    finally:
+        db.close()
+    return results
+
+
+def ask(client: TestClient, work_dir: str, questions: int = 20, seconds: float = 1800) -> dict:
+    """/files/{id}/ask latency on a long transcript, answered without the response cache"""
+    text, segments = fixtures.transcript(seconds, seed=2)
+    db = SessionLocal()
+    try:
+        audio = crud.create_audio_file(db, "ask.wav", 0)
+        crud.update_transcription(db, audio.id, text, json.dumps(segments), "fr")
+        crud.update_progress(db, audio.id, "complete", 100)
+        audio_id = audio.id
+    finally:
+        db.close()
+
+    prompts = [f"Que dit-on sur {word} ({i}) ?" for i, word in enumerate(fixtures.WORDS * (questions // len(fixtures.WORDS) + 1))][:questions]
+    answer = lambda question: client.post(f"/files/{audio_id}/ask", data={"question": question, "no_cache": "true"})
+    # The first question also chunks and indexes the transcript for retrieval
+    response, first = timed(answer, prompts[0])
+    response.raise_for_status()
+    samples = [timed(answer, question)[1] for question in prompts[1:]]
+
+    return {
+        "transcript_words": len(text.split()),
+        "first_question_ms": round(first * 1000, 3),
+        "latency": latency_summary(samples),
+    }
+
+
+SCENARIOS = {"upload": upload, "pipeline": pipeline, "listing": listing, "ask": ask}
@@ -0,0 +1,35 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import shutil
+import tempfile
+
+# Importing app.main migrates the configured database, so point it at a throwaway file before any test does
+_database_dir = tempfile.mkdtemp(prefix="orator-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'app.db')}"
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import models
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_database_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def session_factory():
+    """sessionmaker bound to a fresh in-memory database with every table, shared across threads"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
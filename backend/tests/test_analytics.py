@@ -1,5 +1,50 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
 
+from app import analytics
+
 def test_summary():
     assert True
+
+def test_split_into_chunks_respects_budget():
+    text = " ".join(f"Phrase numéro {i} du cours." for i in range(500))
+    chunks = analytics.split_into_chunks(text, 100)
+    assert len(chunks) > 1
+    assert all(len(c) <= 100 * analytics.CHARS_PER_TOKEN for c in chunks)
+    assert " ".join(chunks) == text
+
+def test_condense_transcript_map_reduce(monkeypatch):
+    calls = []
+    def fake_call(prompt, model=analytics.DEFAULT_MODEL):
+        calls.append(prompt)
+        return "Résumé de la partie."
+    monkeypatch.setattr(analytics, "call_ollama", fake_call)
+    text = " ".join(f"Phrase numéro {i} du cours magistral." for i in range(2000))
+    condensed = analytics.condense_transcript(text, "test-model")
+    assert analytics.estimate_tokens(condensed) <= analytics.transcript_token_budget()
+    assert len(calls) > 1
+    # Memoized for the question prompt
+    made = len(calls)
+    analytics.condense_transcript(text, "test-model")
+    assert len(calls) == made
+
+def test_analyze_transcript_single_structured_call(monkeypatch):
+    calls = []
+    def fake_call(prompt, model=analytics.DEFAULT_MODEL, use_cache=True, format=None):
+        calls.append(format)
+        return '{"summary": "Un résumé.", "questions": ["Pourquoi ?", "Comment ?", "Quand ?", "Où ?"]}'
+    monkeypatch.setattr(analytics, "call_ollama", fake_call)
+    monkeypatch.setattr(analytics, "ANALYSIS_MODE", "structured")
+    summary, questions = analytics.analyze_transcript("Un court texte de cours.", num=3)
+    assert summary == "Un résumé."
+    assert questions == ["Pourquoi ?", "Comment ?", "Quand ?"]
+    assert len(calls) == 1 and calls[0] is not None
+
+def test_analyze_transcript_falls_back_on_invalid_json(monkeypatch):
+    def fake_call(prompt, model=analytics.DEFAULT_MODEL, use_cache=True, format=None):
+        return "pas du JSON" if format else "1. Quelle est l'idée principale ?"
+    monkeypatch.setattr(analytics, "call_ollama", fake_call)
+    monkeypatch.setattr(analytics, "ANALYSIS_MODE", "structured")
+    summary, questions = analytics.analyze_transcript("Un court texte de cours.", num=1)
+    assert summary == "1. Quelle est l'idée principale ?"
+    assert questions == ["Quelle est l'idée principale ?"]
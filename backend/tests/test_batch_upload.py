@@ -0,0 +1,71 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import queue
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from app import crud, main, models, pcm, transcription
+from app.model_registry import ModelRegistry
+from app.main import app, get_db
+from app.jobs import JobScheduler
+from app.progress import progress_bus
+from benchmarks import fixtures
+
+def test_batch_upload_creates_and_queues_every_file(session_factory, tmp_path, monkeypatch):
+    app.dependency_overrides[get_db] = lambda: session_factory()
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("uploads")
+    try:
+        files = [("files", (f"lecture{i}.wav", f"RIFF{i}".encode() * 100, "audio/wav")) for i in range(3)]
+        response = TestClient(app).post("/upload/batch", files=files, data={"num_questions": "2"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert [a["filename"] for a in response.json()] == ["lecture0.wav", "lecture1.wav", "lecture2.wav"]
+    assert {a["processing_stage"] for a in response.json()} == {"queued"}
+    db = session_factory()
+    assert db.query(models.Job).filter(models.Job.num_questions == 2).count() == 3
+    assert sorted(os.listdir("uploads")) == sorted(a.storage_key for a in db.query(models.AudioFile))
+
+def test_uploads_without_a_length_or_over_the_batch_cap_are_refused_unread(monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH_BYTES", 1024 * 1024)
+    client = TestClient(app)
+    chunked = client.post("/upload", content=iter([b"--x\r\n"]), headers={"content-type": "multipart/form-data; boundary=x"})
+    assert chunked.status_code == 411
+    oversized = client.post("/upload/batch", content=b"", headers={"content-type": "multipart/form-data; boundary=x", "content-length": str(2 * 1024 * 1024)})
+    assert oversized.status_code == 413
+
+def test_short_jobs_are_taken_together_from_the_queue_head():
+    scheduler = JobScheduler(session_factory=None)
+    q = scheduler._queues["transcription"]
+    for job_id, cost in enumerate([10, 20, 25, 45]):
+        q.put((cost, job_id, job_id))
+    cost, _, job_id = q.get()
+    assert scheduler._take_short_jobs(q, cost) == [1, 2]
+    assert q.get_nowait()[0] == 45
+    # Long files and files of unknown length are transcribed on their own
+    assert scheduler._take_short_jobs(q, 0) == []
+    assert scheduler._take_short_jobs(queue.PriorityQueue(), 120) == []
+
+def test_unreadable_file_fails_alone_in_its_batch(db, monkeypatch):
+    ok, gone = crud.create_audio_file(db, "ok.wav"), crud.create_audio_file(db, "gone.wav")
+
+    def load(path):
+        if path == "gone.wav":
+            raise RuntimeError("ffmpeg failed: No such file or directory")
+        return fixtures.recording(5, speech_ratio=1.0)
+    monkeypatch.setattr(pcm, "load", load)
+    monkeypatch.setattr(transcription, "registry", ModelRegistry(idle_timeout=0, memory_limit_mb=0, loader=lambda key: None))
+    monkeypatch.setattr(transcription, "get_backend", lambda name: SimpleNamespace(
+        transcribe_batch=lambda model, clips, compute_type: [("Bonjour à tous.", "fr")] * len(clips)))
+    monkeypatch.setattr(transcription, "_decode_upload", lambda db, audio_id, path: None)
+
+    try:
+        outcomes = transcription.run_batch_transcription_stage(db, [(ok.id, "ok.wav"), (gone.id, "gone.wav")])
+    finally:
+        for audio in (ok, gone):
+            progress_bus.forget(audio.id)
+    assert outcomes == {ok.id: "done", gone.id: "failed"}
+    assert crud.get_audio_file(db, ok.id).transcription == "Bonjour à tous."
+    assert crud.get_audio_file(db, gone.id).processing_stage == "error"
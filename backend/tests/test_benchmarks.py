@@ -0,0 +1,30 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import json
+from benchmarks import compare, fixtures
+from benchmarks.fake_ollama import FakeOllama
+from app import vad
+from app.ollama_client import OllamaClient
+
+def test_fake_ollama_streams_and_answers_structured_requests():
+    with FakeOllama(latency=0, tokens_per_second=0, response_tokens=5) as fake:
+        client = OllamaClient(base_url=fake.url, max_retries=0)
+        try:
+            assert len(client.generate("m", "bonjour")["response"].split()) == 5
+            analysis = json.loads(client.generate("m", "texte", format="json")["response"])
+            assert analysis["summary"] and analysis["questions"]
+        finally:
+            client.close()
+        assert fake.stats["generations"] == 2 and fake.loaded == {"m"}
+
+def test_synthetic_recording_has_pauses_for_vad():
+    audio = fixtures.recording(30, speech_ratio=0.5)
+    assert len(audio) == 30 * fixtures.SAMPLE_RATE
+    assert 0.2 < vad.strip_silence(audio, fixtures.SAMPLE_RATE)[1].skipped_ratio < 0.6
+
+def test_compare_flags_regressions_by_metric_direction():
+    old = {"scenarios": {"upload": {"files_per_second": 10.0, "latency": {"p50_ms": 100.0, "max_ms": 100.0, "count": 5}}}}
+    new = {"scenarios": {"upload": {"files_per_second": 12.0, "latency": {"p50_ms": 150.0, "max_ms": 900.0, "count": 9}}}}
+    verdicts = {metric: verdict for metric, _, _, _, verdict in compare.compare(old, new)}
+    assert verdicts == {"upload.files_per_second": "improved", "upload.latency.p50_ms": "REGRESSION"}
@@ -0,0 +1,37 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app import cancellation
+from app.cancellation import CancellationRegistry, JobCancelled
+
+def test_cancel_runs_callbacks_and_stops_checkpoints():
+    registry = CancellationRegistry()
+    token = registry.token(1)
+    closed = []
+    token.on_cancel(lambda: closed.append("stream"))
+    unregister = token.on_cancel(lambda: closed.append("never"))
+    unregister()
+
+    with cancellation.scope(token):
+        cancellation.checkpoint()
+        assert registry.cancel(1, "Cancelled by user")
+        with pytest.raises(JobCancelled, match="Cancelled by user"):
+            cancellation.checkpoint()
+    assert closed == ["stream"]
+    assert registry.is_cancelled(1)
+
+    # Outside the job's scope nothing is cancelled, and unknown ids report no work in flight
+    cancellation.checkpoint()
+    assert not registry.cancel(2)
+    registry.release(1)
+    assert not registry.is_cancelled(1)
+
+def test_bind_carries_the_token_into_worker_threads():
+    token = CancellationRegistry().token(1)
+    token.cancel()
+    with cancellation.scope(token), ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(cancellation.current).result() is None
+        with pytest.raises(JobCancelled):
+            pool.submit(cancellation.bind(cancellation.checkpoint)).result()
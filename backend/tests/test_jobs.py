@@ -0,0 +1,54 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from app import crud, jobs
+from app.jobs import JobScheduler
+from app.progress import progress_bus
+
+def test_shortest_job_first_and_resume(session_factory):
+    db = session_factory()
+    for name, duration in [("long.wav", 3600), ("short.wav", 30), ("mid.wav", 600)]:
+        audio = crud.create_audio_file(db, filename=name)
+        crud.create_job(db, audio.id, __file__, estimated_cost=duration)
+    db.close()
+
+    scheduler = JobScheduler(session_factory=session_factory, transcription_workers=1, llm_workers=1)
+    scheduler.resume_pending()
+
+    q = scheduler._queues["transcription"]
+    order = [q.get()[0] for _ in range(q.qsize())]
+    assert order == [30, 600, 3600]
+
+def test_cancel_while_the_job_is_being_started_stops_it(session_factory, monkeypatch):
+    db = session_factory()
+    audio = crud.create_audio_file(db, filename="talk.wav")
+    job = crud.create_job(db, audio.id, __file__, estimated_cost=30)
+
+    update_job = crud.update_job
+    def cancel_as_it_starts(db, job_id, **fields):
+        if fields.get("status") == "running":
+            # /cancel lands between the worker reading the queued job and marking it running
+            crud.cancel_processing(session_factory(), audio.id)
+        return update_job(db, job_id, **fields)
+    monkeypatch.setattr(crud, "update_job", cancel_as_it_starts)
+    monkeypatch.setattr(jobs, "run_transcription_stage", lambda db, audio_id, path: True)
+
+    JobScheduler(session_factory=session_factory)._run(job.id)
+    db.expire_all()
+    assert crud.get_job(db, job.id).status == "cancelled"
+    assert crud.get_audio_file(db, audio.id).processing_stage == "cancelled"
+    progress_bus.forget(audio.id)
+
+def test_crashed_job_is_marked_failed_instead_of_left_running(session_factory, monkeypatch):
+    db = session_factory()
+    audio = crud.create_audio_file(db, filename="talk.wav")
+    job = crud.create_job(db, audio.id, __file__, estimated_cost=30)
+    def crash(db, audio_id, path):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(jobs, "run_transcription_stage", crash)
+
+    JobScheduler(session_factory=session_factory)._run(job.id)
+    db.expire_all()
+    assert (crud.get_job(db, job.id).status, crud.get_job(db, job.id).error) == ("failed", "disk full")
+    assert crud.get_audio_file(db, audio.id).processing_stage == "error"
+    progress_bus.forget(audio.id)
@@ -0,0 +1,36 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from datetime import datetime, timedelta
+from sqlalchemy import inspect
+from app import crud, models
+
+def test_cursor_pages_newest_first_without_large_columns(db):
+    start = datetime(2024, 1, 1)
+    for i in range(5):
+        db.add(models.AudioFile(filename=f"talk{i}.wav", uploaded_at=start + timedelta(minutes=i // 2),
+                                transcription="word " * 1000, processing_stage="complete" if i % 2 else "queued"))
+    db.commit()
+
+    seen = []
+    after = None
+    while True:
+        page = crud.list_audio_files(db, limit=2, after=after)
+        seen += [a.filename for a in page]
+        if len(page) < 2:
+            break
+        after = (page[-1].uploaded_at, page[-1].id)
+    assert seen == ["talk4.wav", "talk3.wav", "talk2.wav", "talk1.wav", "talk0.wav"]
+
+    db.expunge_all()
+    queued = crud.list_audio_files(db, stages=["queued"], uploaded_after=start + timedelta(minutes=1))
+    assert [a.filename for a in queued] == ["talk4.wav", "talk2.wav"]
+    assert "blobs" in inspect(queued[0]).unloaded
+
+def test_progress_stream_replays_only_unfinished_files(db):
+    from app.main import _initial_progress
+    for stage in ("complete", "error", "cancelled", "transcribing", "queued"):
+        db.add(models.AudioFile(filename=f"{stage}.wav", processing_stage=stage, progress_percentage=10))
+    db.commit()
+
+    assert sorted(event["processing_stage"] for event in _initial_progress(db)) == ["queued", "transcribing"]
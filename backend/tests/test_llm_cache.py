@@ -0,0 +1,99 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import asyncio
+import threading
+import time
+import pytest
+from app.cancellation import JobCancelled
+from app.llm_cache import LLMResponseCache
+
+def test_identical_requests_generate_once(session_factory):
+    cache = LLMResponseCache(session_factory, ttl=0, max_entries=100, memory_entries=10)
+    calls = []
+    def generate():
+        calls.append(1)
+        time.sleep(0.1)
+        return "réponse"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_generate("m", "p", {}, generate))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["réponse"] * 5
+    assert len(calls) == 1
+    assert cache.get_or_generate("m", "p", {}, generate) == "réponse"
+    assert len(calls) == 1
+
+def test_bypass_and_persistence(session_factory):
+    cache = LLMResponseCache(session_factory, ttl=0, max_entries=100, memory_entries=10)
+    cache.get_or_generate("m", "p", {"temperature": 0.3}, lambda: "a")
+    assert cache.get_or_generate("m", "p", {"temperature": 0.3}, lambda: "b", bypass=True) == "b"
+    cache._memory.clear()
+    assert cache.get_or_generate("m", "p", {"temperature": 0.3}, lambda: "c") == "b"
+    assert cache.stats()["db_hits"] == 1
+
+def test_cancelled_owner_hands_the_generation_to_a_waiter(session_factory):
+    cache = LLMResponseCache(session_factory, ttl=0, max_entries=100, memory_entries=10)
+    started, waiting = threading.Event(), threading.Event()
+    def cancelled():
+        started.set()
+        waiting.wait(1)
+        raise JobCancelled("file deleted")
+
+    results = []
+    def own():
+        with pytest.raises(JobCancelled):
+            cache.get_or_generate("m", "p", {}, cancelled)
+        results.append("cancelled")
+    owner = threading.Thread(target=own)
+    owner.start()
+    started.wait(1)
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_generate("m", "p", {}, lambda: "réponse")))
+    waiter.start()
+    while cache.stats()["coalesced"] == 0:
+        time.sleep(0.01)
+    waiting.set()
+    owner.join()
+    waiter.join()
+    assert sorted(results) == ["cancelled", "réponse"]
+
+    # A real generation error still reaches the callers waiting on it
+    def broken():
+        time.sleep(0.1)
+        raise RuntimeError("Ollama down")
+    errors = []
+    def call():
+        try:
+            cache.get_or_generate("m", "other", {}, broken)
+        except RuntimeError as e:
+            errors.append(e)
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 3 and len({id(e) for e in errors}) == 1
+
+def test_cancelled_async_waiter_leaves_the_others_waiting(session_factory):
+    cache = LLMResponseCache(session_factory, ttl=0, max_entries=100, memory_entries=10)
+
+    async def scenario():
+        release = asyncio.Event()
+        async def agenerate():
+            await release.wait()
+            return "réponse"
+        leader = asyncio.ensure_future(cache.aget_or_generate("m", "p", {}, agenerate))
+        await asyncio.sleep(0.01)
+        leaving = asyncio.ensure_future(cache.aget_or_generate("m", "p", {}, agenerate))
+        staying = asyncio.ensure_future(cache.aget_or_generate("m", "p", {}, agenerate))
+        await asyncio.sleep(0.01)
+        # e.g. a client disconnecting while coalesced on the same prompt
+        leaving.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(leader, staying), 1), leaving.cancelled()
+
+    assert asyncio.run(scenario()) == (["réponse", "réponse"], True)
@@ -0,0 +1,42 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from app import crud, metrics, cancellation, schemas
+from app.main import app
+
+def test_spans_are_collected_per_job_including_worker_threads():
+    @metrics.span("summary")
+    def summarize():
+        metrics.observe_llm("test-model", 0.5, {"prompt_eval_count": 300, "eval_count": 40})
+
+    with metrics.record_timings() as timings:
+        with metrics.span("decode"):
+            pass
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for future in [pool.submit(cancellation.bind(summarize)) for _ in range(2)]:
+                future.result()
+    recorded = timings.as_dict()
+    assert set(recorded) == {"decode", "summary", "llm"}
+    assert recorded["llm"] == 1.0
+
+    # Outside a job spans still feed the histograms, without anywhere to store timings
+    with metrics.span("decode"):
+        pass
+
+def test_stage_timings_accumulate_on_the_file(db):
+    audio = crud.create_audio_file(db, filename="a.wav")
+    crud.add_stage_timings(db, audio.id, {"transcription": 2.0, "queue_wait_transcription": 1.0})
+    crud.add_stage_timings(db, audio.id, {"analysis": 3.0, "transcription": 0.5})
+    timings = schemas.AudioFile.model_validate(crud.get_audio_file(db, audio.id)).stage_timings
+    assert timings == {"transcription": 2.5, "queue_wait_transcription": 1.0, "analysis": 3.0}
+
+def test_metrics_endpoint_exposes_histograms():
+    metrics.observe_transcription(60, 6)
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("audio_stage_duration_seconds_bucket", "transcription_real_time_factor_count",
+                 "llm_prompt_tokens_bucket", "audio_transcribed_seconds_total", "job_queue_wait_seconds"):
+        assert name in response.text
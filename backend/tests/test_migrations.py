@@ -0,0 +1,71 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app import crud, search_index
+from app.migrations import run_migrations, MIGRATIONS
+
+def test_upgrades_a_first_release_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE audio_files (id INTEGER PRIMARY KEY, filename VARCHAR, uploaded_at DATETIME, "
+                          "transcription VARCHAR, language VARCHAR, summary VARCHAR, questions VARCHAR, word_count INTEGER, "
+                          "processing_stage VARCHAR, progress_percentage INTEGER, file_size BIGINT, audio_duration FLOAT, "
+                          "selected_model VARCHAR)"))
+        conn.execute(text("INSERT INTO audio_files (filename, processing_stage) VALUES ('talk.mp3', 'complete')"))
+
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+
+    inspector = inspect(engine)
+    assert "jobs" in inspector.get_table_names()
+    indexes = {i["name"] for i in inspector.get_indexes("audio_files")}
+    assert {"ix_audio_files_processing_stage", "ix_audio_files_uploaded_at", "ix_audio_files_storage_key"} <= indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT storage_key FROM audio_files")).scalar() == "talk.mp3"
+
+def test_inline_transcripts_move_to_compressed_blobs(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    transcript = "Bonjour à tous, aujourd'hui nous parlons de thermodynamique. " * 200
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE audio_files (id INTEGER PRIMARY KEY, filename VARCHAR, uploaded_at DATETIME, "
+                          "transcription VARCHAR, language VARCHAR, summary VARCHAR, questions VARCHAR, word_count INTEGER, "
+                          "processing_stage VARCHAR, progress_percentage INTEGER, file_size BIGINT, audio_duration FLOAT, "
+                          "selected_model VARCHAR, segments VARCHAR)"))
+        conn.execute(text("INSERT INTO audio_files (filename, processing_stage, transcription, segments) "
+                          "VALUES ('talk.mp3', 'complete', :text, '[]')"), {"text": transcript})
+
+    run_migrations(engine)
+
+    db = sessionmaker(bind=engine)()
+    audio = crud.get_audio_file(db, 1)
+    assert audio.transcription == transcript and audio.segments == "[]"
+    assert len(audio.blobs["transcription"].data) < len(transcript) / 10
+    assert "transcription" not in {c["name"] for c in inspect(engine).get_columns("audio_files")}
+    assert [hit["id"] for hit in search_index.search(db, "thermodynamique")] == [1]
+
+def test_cached_transcripts_are_compressed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE transcription_cache (id INTEGER PRIMARY KEY, audio_hash VARCHAR, whisper_model VARCHAR, "
+                          "llm_model VARCHAR, transcription VARCHAR, segments VARCHAR, language VARCHAR, summary VARCHAR, "
+                          "questions VARCHAR, hit_count INTEGER, created_at DATETIME, last_hit_at DATETIME)"))
+        conn.execute(text("INSERT INTO transcription_cache (audio_hash, whisper_model, llm_model, transcription) "
+                          "VALUES ('abc', 'base', 'm', 'Bonjour à tous')"))
+
+    run_migrations(engine)
+
+    db = sessionmaker(bind=engine)()
+    assert crud.get_cached_transcription(db, "abc", "base", "m").transcription == "Bonjour à tous"
+    assert "transcription" not in {c["name"] for c in inspect(engine).get_columns("transcription_cache")}
+
+def test_fresh_database_matches_the_models(tmp_path):
+    from app import models
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    run_migrations(engine)
+
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        assert {c["name"] for c in inspector.get_columns(table.name)} == {c.name for c in table.columns}
+        assert {i["name"] for i in inspector.get_indexes(table.name)} == {i.name for i in table.indexes}
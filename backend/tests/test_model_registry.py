@@ -0,0 +1,42 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from app.model_registry import ModelRegistry
+from app.transcription_backends import WhisperConfig
+
+BASE_CPU = WhisperConfig("openai-whisper", "base", "cpu", "int8")
+
+class FakeModel:
+    def parameters(self):
+        return []
+    def buffers(self):
+        return []
+
+def test_model_loaded_once():
+    loads = []
+    registry = ModelRegistry(idle_timeout=0, memory_limit_mb=0, loader=lambda key: loads.append(key) or FakeModel())
+    with registry.use(BASE_CPU):
+        pass
+    with registry.use(BASE_CPU):
+        pass
+    assert loads == [BASE_CPU]
+    assert registry.status()[0]["model_size"] == "base"
+
+def test_idle_models_evicted():
+    registry = ModelRegistry(idle_timeout=1, memory_limit_mb=0, loader=lambda key: FakeModel())
+    with registry.use(BASE_CPU):
+        assert registry.evict_idle() == []
+    registry._models[BASE_CPU].last_used_at -= 5
+    assert registry.evict_idle() == [BASE_CPU]
+    assert registry.status() == []
+
+def test_faster_whisper_models_count_against_the_memory_limit():
+    # CTranslate2 models expose no parameters, so their size is estimated from the name and compute type
+    small, base = WhisperConfig("faster-whisper", "small", "cpu", "int8"), WhisperConfig("faster-whisper", "base", "cpu", "int8")
+    registry = ModelRegistry(idle_timeout=0, memory_limit_mb=300, loader=lambda key: object())
+    with registry.use(small):
+        pass
+    assert registry.status()[0]["memory_mb"] == round(244e6 / 1024 / 1024, 1)
+    with registry.use(base):
+        pass
+    assert [m["model_size"] for m in registry.status()] == ["base"]
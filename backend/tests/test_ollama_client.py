@@ -0,0 +1,118 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import asyncio
+import threading
+import time
+import httpx
+import pytest
+from app import ollama_client
+from app.ollama_client import OllamaClient, OllamaError
+
+def make_client(handler, **kwargs):
+    client = OllamaClient(base_url="http://ollama", **kwargs)
+    client._client = httpx.Client(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+def test_overload_and_connection_failures_are_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(ollama_client, "OLLAMA_RETRY_BACKOFF", 0.5)
+    monkeypatch.setattr(ollama_client.time, "sleep", delays.append)
+    answers = iter([httpx.Response(503), httpx.ConnectError("refused"), httpx.Response(200, json={"response": "ok"})])
+    def handler(request):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    client = make_client(handler, max_retries=2)
+    assert client.generate("m", "p")["response"] == "ok"
+    # Full jitter: each delay is at most the doubling backoff of its attempt
+    assert len(delays) == 2 and 0 <= delays[0] <= 0.5 and 0 <= delays[1] <= 1.0
+
+def test_client_errors_and_exhausted_retries_are_raised(monkeypatch):
+    monkeypatch.setattr(ollama_client.time, "sleep", lambda delay: None)
+    calls = []
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(404 if request.url.path == "/api/show" else 503, text="busy")
+
+    client = make_client(handler, max_retries=2)
+    with pytest.raises(OllamaError) as missing:
+        client.request("POST", "/api/show")
+    assert missing.value.status_code == 404 and calls == ["/api/show"]
+    with pytest.raises(OllamaError) as busy:
+        client.generate("m", "p")
+    assert busy.value.status_code == 503 and calls.count("/api/generate") == 3
+
+    # A read timeout means Ollama is busy generating, so it is not retried
+    def timeout(request):
+        calls.append("timeout")
+        raise httpx.ReadTimeout("slow")
+    with pytest.raises(httpx.ReadTimeout):
+        make_client(timeout, max_retries=2).generate("m", "p")
+    assert calls.count("timeout") == 1
+
+def test_generations_per_model_are_capped():
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+    def handler(request):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+        return httpx.Response(200, json={"response": "ok"})
+
+    client = make_client(handler, max_inflight_per_model=2)
+    threads = [threading.Thread(target=client.generate, args=("m", "p")) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert running["max"] == 2
+
+def test_model_slots_are_granted_in_arrival_order_to_sync_and_async_callers():
+    client = OllamaClient(max_inflight_per_model=1)
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with client.model_slot("m"):
+            release.wait(1)
+    def sync_caller():
+        with client.model_slot("m"):
+            order.append("sync")
+    async def async_caller():
+        async with client.amodel_slot("m"):
+            order.append("async")
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    time.sleep(0.05)
+    waiting = threading.Thread(target=asyncio.run, args=(async_caller(),))
+    waiting.start()
+    time.sleep(0.05)
+    late = threading.Thread(target=sync_caller)
+    late.start()
+    time.sleep(0.05)
+    release.set()
+    for t in (holder, waiting, late):
+        t.join(2)
+    assert order == ["async", "sync"]
+
+def test_cancelled_async_waiter_leaves_the_line():
+    client = OllamaClient(max_inflight_per_model=1)
+
+    async def scenario():
+        async with client.amodel_slot("m"):
+            waiter = asyncio.ensure_future(client.amodel_slot("m").__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        # The slot was returned, not handed to the cancelled waiter
+        async with client.amodel_slot("m"):
+            return True
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 1))
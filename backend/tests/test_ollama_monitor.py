@@ -0,0 +1,65 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import ollama_monitor
+from app.cancellation import JobCancelled
+
+class FakeOllama:
+    def __init__(self):
+        self.models = ["llama3.2:1b"]
+        self.pulls = 0
+        self.lock = threading.Lock()
+
+    def tags(self, timeout=None):
+        return [{"name": name} for name in self.models]
+
+    def request(self, method, path, **kwargs):
+        raise ollama_monitor.OllamaError(404)
+
+    def pull(self, model, timeout=None):
+        with self.lock:
+            self.pulls += 1
+        time.sleep(0.1)
+        self.models.append(f"{model}:latest")
+
+def test_concurrent_pulls_are_deduplicated(monkeypatch):
+    fake = FakeOllama()
+    monkeypatch.setattr(ollama_monitor, "ollama", fake)
+    monitor = ollama_monitor.OllamaMonitor(interval=60)
+    assert monitor.is_reachable()
+    assert monitor.is_pulled("llama3.2:1b")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(monitor.ensure_pulled, ["smollm"] * 4))
+    assert results == [True] * 4
+    assert fake.pulls == 1
+
+def test_cancelled_pull_is_taken_over_by_a_waiting_job(monkeypatch):
+    fake = FakeOllama()
+    monkeypatch.setattr(ollama_monitor, "ollama", fake)
+    monitor = ollama_monitor.OllamaMonitor(interval=60)
+    started, cancel = threading.Event(), threading.Event()
+
+    def cancelled_pull():
+        started.set()
+        cancel.wait(1)
+        raise JobCancelled("file deleted")
+
+    def own():
+        try:
+            monitor._once(("pull", "smollm"), cancelled_pull)
+        except JobCancelled:
+            return "cancelled"
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        owner = pool.submit(own)
+        started.wait(1)
+        waiter = pool.submit(monitor.ensure_pulled, "smollm")
+        time.sleep(0.05)
+        cancel.set()
+        assert owner.result() == "cancelled"
+        assert waiter.result() is True
+    assert fake.pulls == 1
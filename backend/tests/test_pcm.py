@@ -0,0 +1,30 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import shutil
+import wave
+import numpy as np
+import pytest
+from app import pcm
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_decodes_once_to_a_memory_mapped_cache(tmp_path):
+    path = str(tmp_path / "tone.wav")
+    rate = 44100
+    tone = (np.sin(2 * np.pi * 440 * np.arange(rate * 2) / rate) * 10000).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(np.repeat(tone, 2).tobytes())
+
+    cache = pcm.decode(path)
+    mtime = os.path.getmtime(cache)
+    audio = pcm.open_pcm(cache)
+    assert isinstance(audio, np.memmap) and audio.dtype == np.float32
+    assert len(audio) == 2 * pcm.SAMPLE_RATE
+    assert pcm.cached_duration(path) == pytest.approx(2.0)
+    assert pcm.decode(path) == cache and os.path.getmtime(cache) == mtime
+
+    pcm.remove(path)
+    assert not os.path.exists(cache)
@@ -0,0 +1,35 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import asyncio
+import threading
+from app import crud
+from app.progress import ProgressBus, progress_bus
+
+def test_subscribers_receive_events_published_from_worker_threads():
+    bus = ProgressBus()
+
+    async def listen():
+        async with bus.subscribe(audio_id=1) as queue:
+            worker = threading.Thread(target=lambda: [bus.publish(i, "transcribing", 25) for i in (2, 1)])
+            worker.start()
+            event = await asyncio.wait_for(queue.get(), timeout=1)
+            worker.join()
+            return event, queue.qsize()
+
+    event, remaining = asyncio.run(listen())
+    assert event["id"] == 1 and event["processing_stage"] == "transcribing"
+    assert remaining == 0
+    assert bus.latest(2)["progress_percentage"] == 25
+
+def test_progress_ticks_only_write_the_row_on_stage_changes(db):
+    audio = crud.create_audio_file(db, filename="talk.wav")
+
+    assert crud.update_progress(db, audio.id, "transcribing", 25) is not None
+    assert crud.update_progress(db, audio.id, "transcribing", 60) is None
+
+    db.expire_all()
+    stored = crud.get_audio_file(db, audio.id)
+    assert stored.progress_percentage == 25
+    assert progress_bus.latest(audio.id)["progress_percentage"] == 60
+    progress_bus.forget(audio.id)
@@ -0,0 +1,77 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import asyncio
+from fastapi.testclient import TestClient
+from benchmarks.fake_ollama import FakeOllama
+from app import analytics, crud, qa_sessions
+from app.ollama_client import OllamaClient
+from app.qa_sessions import QASessionStore
+from app import main
+from app.main import app, get_db
+
+TRANSCRIPT = "La photosynthèse transforme la lumière en énergie chimique. " * 50
+
+def test_follow_up_questions_only_send_the_new_question(monkeypatch):
+    async def conversation(store, client):
+        monkeypatch.setattr(analytics, "ollama", client)
+        try:
+            session = store.open(1, TRANSCRIPT, "m")
+            first = await store.ask(session, "Qu'est-ce que la photosynthèse ?")
+            second = await store.ask(session, "Et la respiration ?")
+        finally:
+            await client.aclose()
+        return session, first, second
+
+    with FakeOllama(latency=0, tokens_per_second=0, response_tokens=10) as fake:
+        store = QASessionStore(idle_timeout=60, memory_mb=1)
+        session, first, second = asyncio.run(conversation(store, OllamaClient(base_url=fake.url, max_retries=0)))
+
+    assert first["turn"] == 1 and second["turn"] == 2 and second["answer"]
+    assert first["prompt_tokens"] > len(TRANSCRIPT) // 4 > 10 * second["prompt_tokens"]
+    assert len(session.context) == fake.stats["prompt_tokens"] + fake.stats["generated_tokens"]
+
+def test_long_transcripts_answer_each_question_from_its_own_passages(monkeypatch):
+    prompts = []
+    async def generate(prompt, model, context, keep_alive):
+        prompts.append(prompt)
+        return {"response": "Réponse", "context": (context or []) + [1] * 50}
+    monkeypatch.setattr(qa_sessions, "agenerate_in_context", generate)
+    passages = {"Qu'est-ce que la mitose ?": "La mitose divise la cellule.", "Et la méiose ?": "La méiose produit les gamètes."}
+
+    store = QASessionStore(idle_timeout=60, memory_mb=1)
+    session = store.open(1, "", "m", retrieve=passages.get)
+    for question in passages:
+        asyncio.run(store.ask(session, question))
+
+    assert session.describe()["mode"] == "retrieval" and session.turns == 2
+    assert "La mitose divise la cellule." in prompts[0] and "méiose" not in prompts[0]
+    assert "La méiose produit les gamètes." in prompts[1] and "mitose" not in prompts[1]
+
+def test_sessions_expire_and_stay_under_the_memory_budget():
+    store = QASessionStore(idle_timeout=60, memory_mb=0.01)
+    old = store.open(1, "a" * 6000, "m")
+    new = store.open(2, "b" * 6000, "m")
+    # Over the ~10 KB budget, the least recently used session goes
+    assert store.get(old.id) is None and store.get(new.id) is new
+    new.last_used_at -= 120
+    assert store.get(new.id) is None
+    assert store.stats()["sessions"] == 0
+
+def test_session_endpoints(session_factory, db, monkeypatch):
+    audio = crud.create_audio_file(db, filename="cours.wav")
+    pending = crud.create_audio_file(db, filename="pending.wav")
+    crud.update_transcription(db, audio.id, TRANSCRIPT, None, "fr")
+    app.dependency_overrides[get_db] = lambda: session_factory()
+    try:
+        client = TestClient(app)
+        assert client.post(f"/files/{pending.id}/sessions").status_code == 404
+        session = client.post(f"/files/{audio.id}/sessions").json()
+        assert session["audio_id"] == audio.id and session["turns"] == 0 and session["mode"] == "transcript"
+        monkeypatch.setattr(main, "transcript_token_budget", lambda: 100)
+        assert client.post(f"/files/{audio.id}/sessions").json()["mode"] == "retrieval"
+        assert client.delete(f"/sessions/{session['session_id']}").status_code == 200
+        assert client.post(f"/sessions/{session['session_id']}/ask", data={"question": "Pourquoi ?"}).status_code == 404
+        assert client.delete(f"/sessions/{session['session_id']}").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
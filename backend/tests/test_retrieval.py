@@ -0,0 +1,34 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from collections import Counter
+from app import crud, retrieval
+
+def test_bm25_ranks_matching_passage_first():
+    documents = [
+        retrieval.tokenize("Introduction générale au cours et au plan de la session."),
+        retrieval.tokenize("La photosynthèse transforme la lumière en énergie chimique."),
+        retrieval.tokenize("Rappels sur les examens et la remise des travaux."),
+    ]
+    scores = retrieval.bm25_scores(retrieval.tokenize("Qu'est-ce que la photosynthese ?"),
+                                   [Counter(d) for d in documents], [len(d) for d in documents])
+    assert scores.argmax() == 1
+
+def test_questions_are_scored_against_the_terms_stored_at_indexing(db, monkeypatch):
+    audio = crud.create_audio_file(db, filename="cours.wav")
+    topics = ["cellule", "photosynthèse", "mitose", "génétique", "évolution", "écologie"]
+    crud.update_transcription(db, audio.id, " ".join(f"{topic} " * 150 for topic in topics))
+    assert retrieval.index_transcript(db, audio.id) > retrieval.RETRIEVAL_TOP_K
+
+    calls = []
+    monkeypatch.setattr(retrieval, "tokenize", lambda text, tokenize=retrieval.tokenize: calls.append(text) or tokenize(text))
+    passages = retrieval.search(db, audio.id, "Qu'est-ce que la mitose ?", top_k=1)
+    assert calls == ["Qu'est-ce que la mitose ?"]
+    assert "mitose" in passages[0].text
+
+def test_split_passages_keeps_timestamps():
+    segments = [{"start": float(i), "end": float(i + 1), "text": "mot " * 10} for i in range(30)]
+    passages = retrieval.split_passages("", segments)
+    assert passages[0]["start"] == 0.0
+    assert passages[-1]["end"] == 30.0
+    assert all(len(p["text"].split()) <= retrieval.PASSAGE_WORDS for p in passages)
@@ -0,0 +1,35 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from app import crud, search_index
+
+def test_analysis_is_searchable_with_ranked_highlighted_results(db):
+    lectures = {
+        "bio.wav": ("La photosynthèse transforme la lumière en énergie chimique.", "Cours sur la photosynthèse"),
+        "history.wav": ("The French revolution began in 1789. Photosynthesis is unrelated.", "A history lecture"),
+        "math.wav": ("Integrals and derivatives.", "Calculus basics"),
+    }
+    for name, (transcription, summary) in lectures.items():
+        audio = crud.create_audio_file(db, filename=name)
+        crud.update_analysis(db, audio.id, transcription=transcription, summary=summary, questions="1. Why?")
+
+    results = search_index.search(db, "photosynthese")
+    assert [r["filename"] for r in results] == ["bio.wav"]
+    assert "<mark>" in results[0]["snippet"]
+
+    # Prefix match on the last word, and punctuation is not parsed as query syntax
+    assert [r["filename"] for r in search_index.search(db, 'revol"ution-')] == []
+    assert [r["filename"] for r in search_index.search(db, "french revol")] == ["history.wav"]
+
+    math = search_index.search(db, "calculus")[0]
+    crud.delete_audio_file(db, math["id"])
+    assert search_index.search(db, "calculus") == []
+
+def test_snippets_escape_the_indexed_text(db):
+    audio = crud.create_audio_file(db, filename="xss.wav")
+    crud.update_analysis(db, audio.id, transcription="<img src=x onerror=alert(1)> photosynthesis & co",
+                         summary="Summary", questions="1. Why?")
+
+    snippet = search_index.search(db, "photosynthesis")[0]["snippet"]
+    assert "<img" not in snippet
+    assert "&lt;img src=x onerror=alert(1)&gt; <mark>photosynthesis</mark> &amp; co" in snippet
@@ -0,0 +1,53 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app import crud, transcription
+from app.segmentation import split_at_silence
+
+SR = 16000
+
+def tone(seconds):
+    return 0.3 * np.sin(2 * np.pi * 220 * np.arange(int(seconds * SR)) / SR).astype(np.float32)
+
+def test_cuts_fall_in_the_silence_nearest_each_boundary():
+    # Pauses at 62-63 s and 121-122 s, both within 10 s of the 60 s targets
+    audio = np.concatenate([tone(62), np.zeros(SR, dtype=np.float32), tone(58), np.zeros(SR, dtype=np.float32), tone(60)])
+    pieces = split_at_silence(audio, SR, target_seconds=60, search_seconds=10)
+
+    assert len(pieces) == 3
+    assert pieces[0][0] == 0 and pieces[-1][1] == len(audio)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(pieces, pieces[1:]))
+    assert 62 * SR <= pieces[0][1] <= 63 * SR
+    assert 121 * SR <= pieces[1][1] <= 122 * SR
+
+def test_short_audio_stays_in_one_piece():
+    assert split_at_silence(tone(65), SR, target_seconds=60, search_seconds=10) == [(0, 65 * SR)]
+
+def test_parallel_pieces_are_stitched_in_time_order(monkeypatch):
+    audio = tone(200)
+    pieces = split_at_silence(audio, SR, target_seconds=60, search_seconds=10)
+    assert len(pieces) > 2
+
+    def transcribe_segment(cache_path, start, end, config):
+        # Later pieces finish first
+        time.sleep(0.1 * (len(audio) - start) / len(audio))
+        offset = start / SR
+        return {"segments": [{"start": offset, "end": offset + 1, "text": f"at {start // SR}"},
+                             {"start": offset + 1, "end": offset + 2, "text": ""}], "language": "fr"}
+
+    progress = []
+    monkeypatch.setattr(transcription, "PARALLEL_SEGMENT_SECONDS", 60)
+    monkeypatch.setattr(transcription, "_get_segment_pool", lambda: ThreadPoolExecutor(max_workers=len(pieces)))
+    monkeypatch.setattr(transcription, "_transcribe_segment", transcribe_segment)
+    monkeypatch.setattr(transcription, "whisper_config", lambda: None)
+    monkeypatch.setattr(crud, "update_progress", lambda db, audio_id, stage, percent: progress.append(percent))
+
+    result = transcription._transcribe_parallel("talk.pcm", audio, None, 1)
+    starts = [start // SR for start, _ in pieces]
+    assert [seg["text"] for seg in result["segments"]] == [f"at {s}" for s in starts]
+    assert result["text"] == " ".join(f"at {s}" for s in starts)
+    assert result["language"] == "fr"
+    assert progress == sorted(progress) and progress[-1] == 75
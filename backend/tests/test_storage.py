@@ -0,0 +1,32 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import hashlib
+import io
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.main import app
+from app.storage import save_upload, UploadTooLarge
+
+def test_save_upload_hashes_while_streaming(tmp_path):
+    data = os.urandom(10_000)
+    dest = tmp_path / "a.wav"
+    size, digest = save_upload(io.BytesIO(data), str(dest), max_bytes=0, chunk_size=1024)
+    assert size == len(data)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert dest.read_bytes() == data
+
+def test_save_upload_rejects_oversized(tmp_path):
+    dest = tmp_path / "big.wav"
+    with pytest.raises(UploadTooLarge):
+        save_upload(io.BytesIO(b"x" * 5000), str(dest), max_bytes=4096, chunk_size=1024)
+    assert not dest.exists()
+
+def test_uploads_without_a_length_or_over_the_limit_are_refused_unread(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 1024 * 1024)
+    client = TestClient(app)
+    chunked = client.post("/upload", content=iter([b"--x\r\n"]), headers={"content-type": "multipart/form-data; boundary=x"})
+    assert chunked.status_code == 411
+    oversized = client.post("/upload", content=b"", headers={"content-type": "multipart/form-data; boundary=x", "content-length": str(2 * 1024 * 1024)})
+    assert oversized.status_code == 413
@@ -0,0 +1,48 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import asyncio
+import json
+from app import main
+
+def parse(frames: list) -> list:
+    """(event, data) of each Server-Sent Event, checking the framing on the way"""
+    events = []
+    for frame in frames:
+        assert frame.endswith("\n\n") and frame.count("\n") == 3
+        event, data = frame.rstrip("\n").split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def collect(stream) -> list:
+    async def run():
+        return [frame async for frame in stream]
+    return asyncio.run(run())
+
+def test_tokens_are_relayed_then_done_carries_the_full_text(monkeypatch):
+    async def astream(prompt, model, use_cache=True):
+        for token in [" La", " cellule", "\nest vivante. "]:
+            yield token
+    monkeypatch.setattr(main, "astream_ollama", astream)
+    saved = []
+
+    events = parse(collect(main._stream_tokens("prompt", "m", True, saved.append)))
+    assert events == [
+        ("token", {"token": " La"}),
+        ("token", {"token": " cellule"}),
+        ("token", {"token": "\nest vivante. "}),
+        ("done", {"text": "La cellule\nest vivante."}),
+    ]
+    assert saved == ["La cellule\nest vivante."]
+
+def test_failed_generation_ends_with_an_error_event(monkeypatch):
+    async def astream(prompt, model, use_cache=True):
+        yield "Une"
+        raise RuntimeError("Ollama API error 503")
+    monkeypatch.setattr(main, "astream_ollama", astream)
+    saved = []
+
+    events = parse(collect(main._stream_tokens("prompt", "m", True, saved.append)))
+    assert events == [("token", {"token": "Une"}), ("error", {"detail": "Ollama API error 503"})]
+    assert saved == []
@@ -0,0 +1,43 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import json
+from sqlalchemy import inspect
+from app import blobs, crud, models, schemas
+
+def test_transcripts_are_compressed_and_loaded_only_when_read(db):
+    audio = crud.create_audio_file(db, filename="a.wav")
+    text = "la cellule est l'unité de base du vivant " * 500
+    segments = json.dumps([{"start": 0.0, "end": 2.5, "text": "la cellule"}])
+    crud.update_transcription(db, audio.id, text, segments, "fr")
+
+    blob = db.get(models.TranscriptBlob, (audio.id, "transcription"))
+    assert blob.codec == "zstd" and blob.size == len(text) and len(blob.data) < len(text) / 20
+    db.expunge_all()
+
+    # Progress ticks touch the row without pulling the transcript
+    audio = crud.update_progress(db, audio.id, "analyzing", 85)
+    assert "blobs" in inspect(audio).unloaded
+    output = schemas.AudioFile.model_validate(crud.get_audio_file(db, audio.id))
+    assert output.transcription == text and output.segments[0]["text"] == "la cellule"
+
+    crud.update_transcription(db, audio.id, "court", None, "fr")
+    assert crud.get_audio_file(db, audio.id).segments is None
+    crud.delete_audio_file(db, audio.id)
+    assert db.query(models.TranscriptBlob).count() == 0
+
+def test_zlib_is_used_without_zstandard(monkeypatch):
+    monkeypatch.setattr(blobs, "zstandard", None)
+    codec, data = blobs.pack("é" * 100)
+    assert codec == "zlib" and blobs.unpack(codec, data) == "é" * 100
+
+def test_transcription_cache_keeps_transcripts_compressed(db):
+    audio = crud.create_audio_file(db, filename="a.wav")
+    audio.content_hash = "abc"
+    text = "le cycle de Krebs produit de l'énergie " * 300
+    crud.update_transcription(db, audio.id, text, "[]", "fr")
+    crud.save_cached_transcription(db, audio, "base", "m")
+
+    entry = crud.get_cached_transcription(db, "abc", "base", "m")
+    assert entry.transcription_codec == "zstd" and len(entry.transcription_data) < len(text) / 20
+    assert entry.transcription == text and entry.segments == "[]"
@@ -0,0 +1,49 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app import transcription_backends
+from app.transcription_backends import FasterWhisperBackend, OpenAIWhisperBackend, WhisperConfig, resolve_config
+
+def test_auto_config_follows_installed_backend_and_hardware(monkeypatch):
+    monkeypatch.setattr(FasterWhisperBackend, "available", lambda self: True)
+    monkeypatch.setattr(transcription_backends, "detect_device", lambda: "cpu")
+    assert resolve_config("auto", "base", "auto", "auto") == WhisperConfig("faster-whisper", "base", "cpu", "int8")
+
+    monkeypatch.setattr(FasterWhisperBackend, "available", lambda self: False)
+    assert resolve_config("auto", "base", "auto", "auto") == WhisperConfig("openai-whisper", "base", "cpu", "float32")
+
+    # GPUs stay on openai-whisper unless faster-whisper, which needs cuDNN/cuBLAS, is asked for
+    monkeypatch.setattr(FasterWhisperBackend, "available", lambda self: True)
+    monkeypatch.setattr(transcription_backends, "detect_device", lambda: "cuda")
+    assert resolve_config("auto", "base", "auto", "auto") == WhisperConfig("openai-whisper", "base", "cuda", "float16")
+    assert resolve_config("faster-whisper", "base", "auto", "auto") == WhisperConfig("faster-whisper", "base", "cuda", "float16")
+
+    # Explicit settings are kept as they are
+    assert resolve_config("faster-whisper", "tiny", "cpu", "int8_float32") == WhisperConfig("faster-whisper", "tiny", "cpu", "int8_float32")
+    with pytest.raises(ValueError):
+        resolve_config("whisper.cpp", "base", "cpu", "int8")
+
+def test_cached_transcripts_are_keyed_by_backend():
+    assert WhisperConfig("openai-whisper", "base", "cpu", "float32").cache_key == "base"
+    assert WhisperConfig("faster-whisper", "base", "cpu", "int8").cache_key == "faster-whisper:base"
+
+class FakeCTranslate2Model:
+    def transcribe(self, audio):
+        assert audio.dtype == np.float32
+        pieces = (SimpleNamespace(start=i * 2.0, end=i * 2.0 + 2.0, text=f" part {i}") for i in range(2))
+        return pieces, SimpleNamespace(language="fr")
+
+def test_faster_whisper_results_look_like_openai_ones():
+    backend = FasterWhisperBackend()
+    result = backend.transcribe(FakeCTranslate2Model(), np.zeros(16000), "int8")
+    assert result == {
+        "text": " part 0 part 1",
+        "segments": [{"start": 0.0, "end": 2.0, "text": " part 0"}, {"start": 2.0, "end": 4.0, "text": " part 1"}],
+        "language": "fr",
+    }
+    # Without batched decoding, clips are transcribed one after the other
+    assert backend.transcribe_batch(FakeCTranslate2Model(), [np.zeros(100)] * 2, "int8") == [("part 0 part 1", "fr")] * 2
+    assert OpenAIWhisperBackend().default_compute_type("cuda") == "float16"
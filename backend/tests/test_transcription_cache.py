@@ -0,0 +1,50 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import hashlib
+from fastapi.testclient import TestClient
+from app import crud, main, transcription_cache
+from app.main import app, get_db
+from app.progress import progress_bus
+from app.transcription_backends import whisper_config
+
+AUDIO = b"RIFF" + b"lecture" * 200
+
+def test_identical_upload_is_served_from_the_cache_until_purged(session_factory, db, tmp_path, monkeypatch):
+    original = crud.create_audio_file(db, filename="cours.wav")
+    original.content_hash = hashlib.sha256(AUDIO).hexdigest()
+    crud.update_audio_duration(db, original.id, 42.0)
+    crud.update_transcription(db, original.id, "la cellule est l'unité du vivant", "[]", "fr", vad_skipped_ratio=0.25)
+    crud.update_analysis(db, original.id, transcription="la cellule est l'unité du vivant",
+                         summary="Biologie cellulaire", questions='["Qu\'est-ce qu\'une cellule ?"]')
+    transcription_cache.store(db, original.id, whisper_config().cache_key, main.DEFAULT_MODEL)
+
+    queued = []
+    monkeypatch.setattr(main.scheduler, "submit", lambda db, audio, *args: queued.append(audio.filename))
+    app.dependency_overrides[get_db] = lambda: session_factory()
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("uploads")
+    client = TestClient(app)
+    uploaded = []
+    try:
+        # Hit: completed from the cache, with the duration of the earlier copy, and the upload is not kept
+        hit = client.post("/upload", files={"file": ("copie.wav", AUDIO, "audio/wav")}).json()
+        uploaded.append(hit["id"])
+        assert hit["processing_stage"] == "complete" and hit["summary"] == "Biologie cellulaire"
+        assert hit["transcription"] == "la cellule est l'unité du vivant"
+        assert hit["audio_duration"] == 42.0
+        assert crud.get_audio_file(session_factory(), hit["id"]).vad_skipped_ratio == 0.25
+        assert os.listdir("uploads") == [] and queued == []
+
+        # Miss: different audio goes through the pipeline
+        uploaded.append(client.post("/upload", files={"file": ("autre.wav", AUDIO + b"!", "audio/wav")}).json()["id"])
+        assert queued == ["autre.wav"]
+
+        # Purge: the same audio is processed again
+        assert client.delete("/cache/transcriptions", params={"audio_hash": original.content_hash}).json() == {"deleted": 1}
+        uploaded.append(client.post("/upload", files={"file": ("copie2.wav", AUDIO, "audio/wav")}).json()["id"])
+        assert queued == ["autre.wav", "copie2.wav"]
+    finally:
+        app.dependency_overrides.clear()
+        for audio_id in [original.id] + uploaded:
+            progress_bus.forget(audio_id)
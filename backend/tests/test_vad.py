@@ -0,0 +1,33 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+
+import numpy as np
+import pytest
+from app import vad
+
+SR = 16000
+
+def tone(seconds):
+    return 0.3 * np.sin(2 * np.pi * 220 * np.arange(int(seconds * SR)) / SR).astype(np.float32)
+
+def test_strips_long_silence_and_maps_timestamps_back():
+    rng = np.random.default_rng(0)
+    silence = (rng.standard_normal(10 * SR) * 1e-4).astype(np.float32)
+    audio = np.concatenate([tone(2), silence, tone(2)])
+
+    speech, speech_map = vad.strip_silence(audio, SR)
+    pad = vad.VAD_PAD_MS / 1000
+    assert len(speech_map.regions) == 2
+    assert len(speech) == pytest.approx((4 + 2 * pad) * SR, abs=SR * 0.05)
+    assert speech_map.skipped_ratio == pytest.approx((10 - 2 * pad) / 14, abs=0.01)
+
+    # 0.2 s into the second region of the speech-only audio is 0.2 s into that region in the original
+    second_region_start = speech_map.regions[1][0] / SR
+    assert speech_map.to_original(2 + pad + 0.2) == pytest.approx(second_region_start + 0.2, abs=0.05)
+    assert speech_map.to_original(1.0) == pytest.approx(1.0)
+
+def test_continuous_speech_is_passed_through_without_copy():
+    audio = tone(5)
+    speech, speech_map = vad.strip_silence(audio, SR)
+    assert speech is audio
+    assert speech_map.is_identity and speech_map.skipped_ratio == 0
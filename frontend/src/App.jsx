@@ -35,6 +35,35 @@ function AskQuestionSection({ audioId }) {
   const [answer, setAnswer] = useState("");
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  // Conversation on the server, so follow-up questions don't resend the transcript
+  const sessionId = useRef(null);
+
+  useEffect(() => {
+    sessionId.current = null;
+    return () => {
+      if (sessionId.current) {
+        fetch(`http://localhost:8000/sessions/${sessionId.current}`, { method: "DELETE" }).catch(() => {});
+        sessionId.current = null;
+      }
+    };
+  }, [audioId]);
+
+  const openSession = async () => {
+    const res = await fetch(`http://localhost:8000/files/${audioId}/sessions`, { method: "POST" });
+    if (!res.ok) {
+      throw new Error("Failed to start session");
+    }
+    sessionId.current = (await res.json()).session_id;
+  };
+
+  const askInSession = () => {
+    const form = new FormData();
+    form.append("question", question);
+    return fetch(`http://localhost:8000/sessions/${sessionId.current}/ask`, {
+      method: "POST",
+      body: form,
+    });
+  };
 
   const handleAsk = async (e) => {
     e.preventDefault();
@@ -42,12 +71,15 @@ function AskQuestionSection({ audioId }) {
     setError("");
     setAnswer("");
     try {
-      const form = new FormData();
-      form.append("question", question);
-      const res = await fetch(`http://localhost:8000/files/${audioId}/ask`, {
-        method: "POST",
-        body: form,
-      });
+      if (!sessionId.current) {
+        await openSession();
+      }
+      let res = await askInSession();
+      if (res.status === 404) {
+        // The session expired on the server; start a new one
+        await openSession();
+        res = await askInSession();
+      }
       if (!res.ok) {
         throw new Error("Failed to get answer");
       }
@@ -96,6 +128,8 @@ function AskQuestionSection({ audioId }) {
 export default function App() {
   // State for files and related
   const [file, setFile] = useState(null);
+  // Every selected file; more than one is sent to /upload/batch in a single request
+  const [batch, setBatch] = useState([]);
   const [files, setFiles] = useState([]);
   const [selected, setSelected] = useState(null);
   const [isProcessing, setIsProcessing] = useState(false);
@@ -107,7 +141,7 @@ export default function App() {
     return saved ? Number(saved) : 3;
   });
   const [autoGenerateQuestions, setAutoGenerateQuestions] = useState(localStorage.getItem("autoGenerateQuestions") === "true");
-  const pollIntervalRef = useRef(null);
+  const progressStreamRef = useRef(null);
   const fileInputRef = useRef(null);
   const selectedRef = useRef(null);
 
@@ -156,23 +190,31 @@ export default function App() {
 
   const fetchFiles = useCallback(async () => {
     try {
-      const res = await fetch("http://localhost:8000/files");
-      const data = await res.json();
+      // /files is paginated, so follow X-Next-Cursor until every file is loaded
+      let data = [];
+      let url = "http://localhost:8000/files?limit=500";
+      while (url) {
+        const res = await fetch(url);
+        data = data.concat(await res.json());
+        const cursor = res.headers.get("X-Next-Cursor");
+        url = cursor ? `http://localhost:8000/files?limit=500&cursor=${encodeURIComponent(cursor)}` : null;
+      }
       const currentSelected = selectedRef.current;
       setFiles(data);
 
-      // Update selected file if it exists and ensure it's always the latest data
+      // The list has no transcripts, so refresh the selected file from its own endpoint
       if (currentSelected) {
         const updatedSelected = data.find((d) => d.id === currentSelected.id);
         if (updatedSelected) {
-          setSelected(updatedSelected);
+          setSelected((prev) => prev && { ...prev, ...updatedSelected });
+          fetchFileDetails(currentSelected.id);
         }
       }
 
       // Check if there are any files still processing OR if selected file is still processing
       const hasProcessingFiles = data.some(
         (f) =>
-          f.processing_stage !== "complete" && f.processing_stage !== "error"
+          f.processing_stage !== "complete" && f.processing_stage !== "error" && f.processing_stage !== "cancelled"
       );
       const selectedFileProcessing =
         currentSelected &&
@@ -180,26 +222,40 @@ export default function App() {
           (f) =>
             f.id === currentSelected.id &&
             f.processing_stage !== "complete" &&
-            f.processing_stage !== "error"
+            f.processing_stage !== "error" &&
+            f.processing_stage !== "cancelled"
         );
 
       if (
         (hasProcessingFiles || selectedFileProcessing) &&
-        !pollIntervalRef.current
+        !progressStreamRef.current
       ) {
-        startPolling();
+        startProgressStream();
       } else if (
         !hasProcessingFiles &&
         !selectedFileProcessing &&
-        pollIntervalRef.current
+        progressStreamRef.current
       ) {
-        stopPolling();
+        stopProgressStream();
       }
     } catch (error) {
       console.error("Error fetching files:", error);
     }
   }, []);
 
+  const fetchFileDetails = async (id) => {
+    try {
+      const res = await fetch(`http://localhost:8000/files/${id}`);
+      if (!res.ok) return;
+      const data = await res.json();
+      if (selectedRef.current && selectedRef.current.id === id) {
+        setSelected(data);
+      }
+    } catch (error) {
+      console.error("Error fetching file details:", error);
+    }
+  };
+
   const fetchModels = async () => {
     try {
       const res = await fetch("http://localhost:8000/models");
@@ -213,18 +269,46 @@ export default function App() {
     }
   };
 
-  const startPolling = useCallback(() => {
-    if (pollIntervalRef.current) return;
-    pollIntervalRef.current = setInterval(fetchFiles, 2000);
+  // Progress is pushed by the backend; the full record is only refetched when a file finishes
+  const applyProgress = (event) => {
+    const update = JSON.parse(event.data);
+    const { processing_stage, progress_percentage } = update;
+    if (processing_stage === "deleted") {
+      fetchFiles();
+      return;
+    }
+    setFiles((prev) =>
+      prev.map((f) =>
+        f.id === update.id ? { ...f, processing_stage, progress_percentage } : f
+      )
+    );
+    if (selectedRef.current && selectedRef.current.id === update.id) {
+      setSelected((prev) => prev && { ...prev, processing_stage, progress_percentage });
+    }
+    if (["complete", "error", "cancelled"].includes(processing_stage)) {
+      fetchFiles();
+    }
+  };
+
+  const startProgressStream = useCallback(() => {
+    if (progressStreamRef.current) return;
+    const source = new EventSource("http://localhost:8000/progress/stream");
+    source.addEventListener("progress", applyProgress);
+    progressStreamRef.current = source;
   }, [fetchFiles]);
 
-  const stopPolling = () => {
-    if (pollIntervalRef.current) {
-      clearInterval(pollIntervalRef.current);
-      pollIntervalRef.current = null;
+  const stopProgressStream = () => {
+    if (progressStreamRef.current) {
+      progressStreamRef.current.close();
+      progressStreamRef.current = null;
     }
   };
 
+  const selectFiles = (selectedFiles) => {
+    setBatch(selectedFiles);
+    setFile(selectedFiles[0] || null);
+  };
+
   const handleUpload = async () => {
     if (!file) {
       console.warn("No file selected for upload");
@@ -233,7 +317,11 @@ export default function App() {
     setIsProcessing(true);
     try {
       const form = new FormData();
-      form.append("file", file);
+      if (batch.length > 1) {
+        batch.forEach((f) => form.append("files", f));
+      } else {
+        form.append("file", file);
+      }
       if (selectedModel) {
         form.append("selected_model", selectedModel);
       }
@@ -241,13 +329,16 @@ export default function App() {
         form.append("num_questions", 3); // Default to 3 if auto-generate is enabled
       }
       form.append("auto_generate_questions", autoGenerateQuestions ? "true" : "false");
-      await fetch("http://localhost:8000/upload", {
-        method: "POST",
-        body: form,
-      });
-      setFile(null);
+      await fetch(
+        batch.length > 1 ? "http://localhost:8000/upload/batch" : "http://localhost:8000/upload",
+        {
+          method: "POST",
+          body: form,
+        }
+      );
+      selectFiles([]);
       await fetchFiles();
-      startPolling();
+      startProgressStream();
     } catch (error) {
       console.error("Error uploading file:", error);
     } finally {
@@ -271,9 +362,11 @@ export default function App() {
     setDragActive(false);
 
     if (e.dataTransfer.files && e.dataTransfer.files[0]) {
-      const droppedFile = e.dataTransfer.files[0];
-      if (droppedFile.type.startsWith("audio/")) {
-        setFile(droppedFile);
+      const droppedFiles = Array.from(e.dataTransfer.files).filter((f) =>
+        f.type.startsWith("audio/")
+      );
+      if (droppedFiles.length) {
+        selectFiles(droppedFiles);
       }
     }
   };
@@ -283,7 +376,7 @@ export default function App() {
     fetchModels();
 
     return () => {
-      stopPolling();
+      stopProgressStream();
     };
   }, []);
 
@@ -292,15 +385,16 @@ export default function App() {
     selectedRef.current = selected;
   }, [selected]);
 
-  // Start polling when a processing file is selected
+  // Follow progress when a processing file is selected
   useEffect(() => {
     if (
       selected &&
       selected.processing_stage !== "complete" &&
-      selected.processing_stage !== "error"
+      selected.processing_stage !== "error" &&
+      selected.processing_stage !== "cancelled"
     ) {
-      if (!pollIntervalRef.current) {
-        startPolling();
+      if (!progressStreamRef.current) {
+        startProgressStream();
       }
     }
   }, [selected]);
@@ -348,12 +442,13 @@ export default function App() {
 
       <main className="container mx-auto px-6 py-8 space-y-8">
         {/* Processing Status*/}
-        {pollIntervalRef.current &&
+        {progressStreamRef.current &&
           (() => {
             const processingFiles = files.filter(
               (f) =>
                 f.processing_stage !== "complete" &&
-                f.processing_stage !== "error"
+                f.processing_stage !== "error" &&
+                f.processing_stage !== "cancelled"
             );
 
             // Only consider files that are not complete for progress
@@ -385,6 +480,7 @@ export default function App() {
                 const file = processingFiles[0];
                 const stageText =
                   {
+                    queued: "Waiting in queue",
                     downloading_model: "Downloading AI model",
                     transcribing: "Transcribing audio",
                     analyzing: "Analyzing content",
@@ -401,6 +497,7 @@ export default function App() {
                 ([stage, count]) => {
                   const stageText =
                     {
+                      queued: "queued",
                       downloading_model: "downloading model",
                       transcribing: "transcribing",
                       analyzing: "analyzing",
@@ -556,7 +653,8 @@ export default function App() {
                     ref={fileInputRef}
                     type="file"
                     accept="audio/*"
-                    onChange={(e) => setFile(e.target.files[0])}
+                    multiple
+                    onChange={(e) => selectFiles(Array.from(e.target.files))}
                     className="hidden"
                     disabled={isProcessing}
                   />
@@ -568,7 +666,7 @@ export default function App() {
                         <button
                           onClick={(e) => {
                             e.stopPropagation();
-                            setFile(null);
+                            selectFiles([]);
                           }}
                           className="absolute -top-2 -right-2 w-6 h-6 bg-red-500 hover:bg-red-600 text-white rounded-full flex items-center justify-center transition-colors shadow-md hover:shadow-lg cursor-pointer"
                           title="Remove file"
@@ -580,6 +678,7 @@ export default function App() {
                       <div>
                         <span className="font-medium">
                           {(() => {
+                            if (batch.length > 1) return `${batch.length} files`;
                             // Truncate file name in the middle, keep extension
                             const name = file.name;
                             const maxLen = 28;
@@ -596,7 +695,7 @@ export default function App() {
                             );
                           })()}
                         </span>
-                        <span className="text-sm text-muted-foreground"> - {(file.size / 1024 / 1024).toFixed(2)} MB</span>
+                        <span className="text-sm text-muted-foreground"> - {(batch.reduce((total, f) => total + f.size, 0) / 1024 / 1024).toFixed(2)} MB</span>
                       </div>
                       <Button
                         onClick={(e) => {
@@ -623,7 +722,7 @@ export default function App() {
                         ) : (
                           <>
                             <Upload className="h-4 w-4 mr-2" />
-                            Upload File
+                            {batch.length > 1 ? "Upload Files" : "Upload File"}
                           </>
                         )}
                       </Button>
@@ -638,7 +737,7 @@ export default function App() {
                       <Upload className="h-12 w-12 mx-auto text-muted-foreground" />
                       <div>
                         <p className="text-lg font-medium">
-                          Drop your audio file here
+                          Drop your audio files here
                         </p>
                         <p className="text-sm text-muted-foreground">
                           Or click to browse files • Supports MP3, WAV, M4A
@@ -717,6 +816,8 @@ export default function App() {
                       switch (stage) {
                         case "uploading":
                           return "Uploading";
+                        case "queued":
+                          return "Queued";
                         case "downloading_model":
                           return "Downloading Model";
                         case "transcribing":
@@ -727,6 +828,8 @@ export default function App() {
                           return "Complete";
                         case "error":
                           return "Error";
+                        case "cancelled":
+                          return "Cancelled";
                         default:
                           return "Processing";
                       }
@@ -755,7 +858,10 @@ export default function App() {
                             : "border border-border hover:border-primary/60 hover:shadow-xl bg-background dark:bg-background"
                         )}
                         onClick={() => {
-                          setSelected(selected?.id === f.id ? null : f);
+                          const next = selected?.id === f.id ? null : f;
+                          selectedRef.current = next;
+                          setSelected(next);
+                          if (next) fetchFileDetails(f.id);
                         }}
                         style={{
                           cursor: "pointer",
@@ -803,7 +909,8 @@ export default function App() {
                         <CardContent className="space-y-3">
                           {/* Progress Bar */}
                           {f.processing_stage !== "complete" &&
-                            f.processing_stage !== "error" && (
+                            f.processing_stage !== "error" &&
+                            f.processing_stage !== "cancelled" && (
                               <div className="flex items-center space-x-2 text-xs text-foreground">
                                 <span>{getStageText(f.processing_stage)}</span>
                                 <Progress
@@ -867,7 +974,8 @@ export default function App() {
                             </div>
                             {/* Show Trash2 only if not processing */}
                             {(f.processing_stage === "complete" ||
-                              f.processing_stage === "error") && (
+                              f.processing_stage === "error" ||
+                              f.processing_stage === "cancelled") && (
                                 <button
                                   onClick={(e) => {
                                     e.stopPropagation();